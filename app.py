@@ -3,35 +3,153 @@ Main Flask application entry point for the Library Management System.
 
 This module provides the application factory pattern for creating Flask app instances.
 Routes are organized in separate blueprint modules in the routes package.
+Running this file starts the development server; production serving goes
+through wsgi.py and gunicorn.conf.py.
 """
 
+import atexit
+import time
+
+# Imports below are timed for the startup report
+_IMPORTS_STARTED = time.perf_counter()
+
 from flask import Flask
-from database import init_database, add_sample_data
+from flask.json.provider import DefaultJSONProvider
+from commands import register_commands
+from database import (
+    init_database, add_sample_data, configure_database, enable_group_commit, enable_wal
+)
+from records import Record
 from routes import register_blueprints
+from services.catalog_replica import enable_catalog_replica
+from services.suggest_index import build_suggest_index
+from services.task_executor import DEFAULT_MAX_QUEUE, DEFAULT_WORKERS, task_executor
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORTS_STARTED
+
+
+class LibraryJSONProvider(DefaultJSONProvider):
+    """JSON provider that also serializes Book/Loan row records."""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o._asdict()
+        return DefaultJSONProvider.default(o)
 
 
-def create_app():
+def create_app(config=None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        config: Optional settings that override the defaults and the environment,
+                e.g. {'DATABASE': ':memory:'}
+    
+    A breakdown of how long each startup step took, in milliseconds, is kept
+    in app.extensions['startup_timings'] (see `flask startup-report`).
+    
     Returns:
         Flask: Configured Flask application instance
     """
+    started = time.perf_counter()
+    timings = {'imports': round(_IMPORT_SECONDS * 1000, 2)}
+    step_started = started
+    
+    def step_done(name):
+        nonlocal step_started
+        now = time.perf_counter()
+        timings[name] = round((now - step_started) * 1000, 2)
+        step_started = now
+    
     app = Flask(__name__)
+    app.json = LibraryJSONProvider(app)
     app.secret_key = "super secret key"
     
-    # Initialize the database
+    # Optional settings, e.g. FLASK_CATALOG_REPLICA=true in the environment
+    app.config['CATALOG_REPLICA'] = False
+    app.config['GROUP_COMMIT'] = False
+    # Database file (None keeps the current one, library.db by default) and how to open it:
+    # 'file', 'memory' (a private in-memory database) or 'temp' (a throwaway copy of the file)
+    app.config['DATABASE'] = None
+    app.config['DATABASE_MODE'] = 'file'
+    # Insert the demo books into an empty catalog (python app.py turns this on)
+    app.config['SEED_SAMPLE_DATA'] = False
+    # Write-ahead logging, needed when several worker processes share the database (wsgi.py)
+    app.config['SQLITE_WAL'] = False
+    # Background task threads (0 runs tasks inline) and how many tasks may wait for them
+    app.config['TASK_WORKERS'] = DEFAULT_WORKERS
+    app.config['TASK_QUEUE_SIZE'] = DEFAULT_MAX_QUEUE
+    # Start those threads in each forked worker instead of this process, for
+    # servers that fork workers from a preloaded app (gunicorn.conf.py)
+    app.config['TASK_WORKERS_AFTER_FORK'] = False
+    # Availability event streams served at once on request threads (each holds one
+    # for up to 25 s); more are told to retry in a minute. asgi.py isn't limited.
+    app.config['WSGI_EVENT_STREAMS'] = 1
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
+    
+    # Point the database helpers at the configured database
+    if app.config['DATABASE'] is not None or app.config['DATABASE_MODE'] != 'file':
+        configure_database(app.config['DATABASE'], app.config['DATABASE_MODE'])
+    
+    step_done('config')
+    
+    # Initialize the database (no DDL when the schema is already current)
     init_database()
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Add sample data for testing and demonstration, only when asked for
+    if app.config['SEED_SAMPLE_DATA']:
+        add_sample_data()
+    
+    # Let readers and the writer work concurrently across processes
+    if app.config['SQLITE_WAL']:
+        enable_wal()
+    
+    # Batch concurrent writes into shared commits when configured
+    if app.config['GROUP_COMMIT']:
+        enable_group_commit()
+    step_done('database_init')
+    
+    # Serve catalog reads from memory when enabled. The replica only sees this
+    # process's writes, so it is refused where several worker processes write
+    if app.config['CATALOG_REPLICA']:
+        if app.config['SQLITE_WAL'] or app.config['TASK_WORKERS_AFTER_FORK']:
+            raise ValueError('CATALOG_REPLICA needs a single writer process; '
+                             'it cannot be combined with SQLITE_WAL or forked workers')
+        enable_catalog_replica()
+    
+    # Load titles and authors into the in-memory autocomplete index
+    build_suggest_index()
+    step_done('indexes')
+    
+    # Start the background task workers; queued tasks get to finish when the process exits
+    task_executor.configure(workers=app.config['TASK_WORKERS'], max_queue=app.config['TASK_QUEUE_SIZE'])
+    if app.config['TASK_WORKERS_AFTER_FORK']:
+        task_executor.start_after_fork()
+    else:
+        task_executor.start()
+    atexit.unregister(task_executor.shutdown)
+    atexit.register(task_executor.shutdown)
+    
+    # Build the fuzzy search index and count new circulation into the stats off the request path
+    task_executor.submit('warm_fuzzy_index')
+    task_executor.submit('refresh_circulation_stats')
+    step_done('tasks')
     
     # Register all route blueprints
     register_blueprints(app)
     
+    # Register maintenance commands on the flask CLI
+    register_commands(app)
+    step_done('blueprints')
+    
+    timings['create_app'] = round((time.perf_counter() - started) * 1000, 2)
+    app.extensions['startup_timings'] = timings
     return app
 
 
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app({'SEED_SAMPLE_DATA': True})
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,126 @@
+"""
+ASGI entry point for the Library Management System.
+
+Serve it with an ASGI server, e.g.:
+    uvicorn asgi:app --workers 4
+or, as the Docker image does, on gunicorn's uvicorn workers:
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+The payment routes (routes/payment_routes.py) and the availability event stream
+(routes/events_routes.py) run natively on the event loop, so one process can
+have hundreds of payments waiting on the gateway, or thousands of catalog pages
+listening for availability changes, at once.
+Every other route is the Flask app, run on a thread pool through asgiref's
+WsgiToAsgi adapter.
+"""
+
+import asyncio
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from database import disable_group_commit
+from routes.events_routes import ASGI_STREAM_SECONDS, AVAILABILITY_STREAM_PATH, STREAM_HEADERS
+from routes.payment_routes import match_async_route
+from services.availability_stream import availability_broadcaster
+from services import async_db
+from services.task_executor import task_executor
+
+
+def create_asgi_app(flask_app):
+    """Wrap a Flask app in an ASGI app that serves the payment routes and event streams on the event loop."""
+    wsgi_app = WsgiToAsgi(flask_app)
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await _lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == AVAILABILITY_STREAM_PATH:
+            await _send_availability_stream(scope, receive, send)
+            return
+        route = match_async_route(scope['method'], scope['path']) if scope['type'] == 'http' else None
+        if route is None:
+            await wsgi_app(scope, receive, send)
+            return
+
+        handler, params = route
+        data = dict(params)
+        if scope['method'] == 'POST':
+            try:
+                body = json.loads(await _read_body(receive) or b'null')
+            except ValueError:
+                body = None
+            if not isinstance(body, dict):
+                await _send_json(send, {'error': 'JSON object body is required'}, 400)
+                return
+            data.update(body)
+        payload, status = await handler(data)
+        await _send_json(send, payload, status)
+
+    return app
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_json(send, payload, status: int) -> None:
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_availability_stream(scope, receive, send) -> None:
+    headers = dict(scope.get('headers') or [])
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or None
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8')] +
+                       [(name.lower().encode(), value.encode()) for name, value in STREAM_HEADERS.items()]
+        })
+        async for chunk in availability_broadcaster.stream_async(last_event_id, ASGI_STREAM_SECONDS, disconnected):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        # The client went away mid-write
+        pass
+    finally:
+        watcher.cancel()
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Finish queued database work before the process exits
+            async_db.shutdown()
+            task_executor.shutdown()
+            disable_group_commit()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# Several processes may share the database files, so use write-ahead logging
+app = create_asgi_app(create_app({'SQLITE_WAL': True}))
@@ -0,0 +1,134 @@
+"""
+Benchmark for circulation stats from running totals against ad hoc queries.
+
+Loads --history returned loans spread over two years (and their circulation
+events) into a temporary database. It then times each stats query two ways:
+computed ad hoc over the loan history, and read from the totals kept by
+services/analytics.py. It also times the one-off count of the whole log, a
+refresh after --new borrows, and the full recount done by rebuild-stats.
+
+Usage:
+    python benchmarks/bench_analytics.py [--history 1000000] [--books 10000] [--new 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from services import analytics
+
+AD_HOC_QUERIES = {
+    'top 10 by loans': '''
+        SELECT book_id, COUNT(*) AS loans FROM (
+            SELECT book_id FROM borrow_history UNION ALL SELECT book_id FROM borrow_records
+        ) GROUP BY book_id ORDER BY loans DESC LIMIT 10
+    ''',
+    'top 10 by utilization': '''
+        SELECT l.book_id, l.loans * 1.0 / b.total_copies AS utilization FROM (
+            SELECT book_id, COUNT(*) AS loans FROM (
+                SELECT book_id FROM borrow_history UNION ALL SELECT book_id FROM borrow_records
+            ) GROUP BY book_id
+        ) l JOIN books b ON b.id = l.book_id ORDER BY utilization DESC LIMIT 10
+    ''',
+    'top 10 by overdue rate': '''
+        SELECT book_id, AVG(return_date > due_date) AS rate FROM borrow_history
+        GROUP BY book_id ORDER BY rate DESC LIMIT 10
+    ''',
+    'summary': '''
+        SELECT COUNT(*), AVG(return_date - borrow_date), AVG(return_date > due_date) FROM borrow_history
+    ''',
+    'daily timeline, 90 days': '''
+        SELECT return_date / 86400 AS day, COUNT(*), AVG(return_date - borrow_date), AVG(return_date > due_date)
+        FROM borrow_history WHERE return_date >= ? GROUP BY day
+    ''',
+}
+
+SERVED_QUERIES = {
+    'top 10 by loans': lambda: analytics.get_top_books('loans', 10),
+    'top 10 by utilization': lambda: analytics.get_top_books('utilization', 10),
+    'top 10 by overdue rate': lambda: analytics.get_top_books('overdue_rate', 10),
+    'summary': analytics.get_stats_summary,
+    'daily timeline, 90 days': lambda: analytics.get_stats_timeline('day', 90),
+}
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=1000000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--new', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.configure_database(os.path.join(directory, 'bench.db'))
+        database.init_database()
+        rng = random.Random(1)
+        now = database.to_epoch(datetime.now())
+        start = now - 2 * 365 * 86400
+        conn = database.get_db_connection()
+        conn.executemany('INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+                         ((f'Title {n}', f'Author {n}', f'{9790000000000 + n}', 1 + n % 5, 1 + n % 5)
+                          for n in range(args.books)))
+        loans = []
+        for n in range(args.history):
+            borrowed = start + n * (now - start - 40 * 86400) // args.history
+            # A few popular titles, and a long tail
+            book_id = min(int(rng.paretovariate(1.2)), args.books)
+            loans.append((f'{100000 + n % 50000}', book_id, borrowed, borrowed + 14 * 86400,
+                          borrowed + rng.randint(1, 30) * 86400))
+        conn.executemany('''
+            INSERT INTO borrow_history (loan_id, patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (0, ?, ?, ?, ?, ?)
+        ''', loans)
+        conn.executemany('''
+            INSERT INTO circulation_events (event, occurred_at, patron_id, book_id, due_date) VALUES ('borrow', ?, ?, ?, ?)
+        ''', ((borrowed, patron, book, due) for patron, book, borrowed, due, returned in loans))
+        conn.executemany('''
+            INSERT INTO circulation_events (event, occurred_at, patron_id, book_id, borrow_date, due_date)
+            VALUES ('return', ?, ?, ?, ?, ?)
+        ''', ((returned, patron, book, borrowed, due) for patron, book, borrowed, due, returned in loans))
+        conn.commit()
+        conn.close()
+
+        started = time.perf_counter()
+        applied = analytics.refresh_stats()
+        print(f'first count of the log ({applied} events): {time.perf_counter() - started:.1f} s')
+
+        print(f"{'query':<26}{'ad hoc':>12}{'running totals':>18}")
+        since = now - 90 * 86400
+        for name, sql in AD_HOC_QUERIES.items():
+            def ad_hoc():
+                conn = database.get_db_connection()
+                conn.execute(sql, (since,) if '?' in sql else ()).fetchall()
+                conn.close()
+            print(f'{name:<26}{timed(ad_hoc, 3):>9.1f} ms{timed(SERVED_QUERIES[name], 50):>15.2f} ms')
+
+        when = datetime.now()
+        for n in range(args.new):
+            database.insert_borrow_record(f'{200000 + n}', n % args.books + 1, when, when + timedelta(days=14))
+        started = time.perf_counter()
+        analytics.refresh_stats()
+        print(f'refresh after {args.new} new borrows: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        started = time.perf_counter()
+        differences = analytics.rebuild_stats(fix=False)
+        print(f'rebuild-stats --check: {time.perf_counter() - started:.1f} s, {len(differences)} differences')
+        database.configure_database()
+
+
+if __name__ == '__main__':
+    main()
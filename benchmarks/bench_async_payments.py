@@ -0,0 +1,100 @@
+"""
+Benchmark for concurrent pending payments: thread-per-request WSGI vs ASGI.
+
+Sends the same burst of late fee payments (POST /api/payments/late_fees) to
+the app two ways, in process on a temporary database: through the Flask
+app's WSGI interface from a fixed pool of request threads, as a threaded WSGI
+server would, and through asgi.py on one event loop. The simulated gateway
+waits PAYMENT_LATENCY_SECONDS x --latency-scale per payment. Reports the wall
+time and payments per second of each.
+
+Usage:
+    python benchmarks/bench_async_payments.py [--payments 500] [--threads 16] [--latency-scale 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+import routes.payment_routes as payment_routes
+from app import create_app
+from services.payment_service import AsyncPaymentGateway, PAYMENT_LATENCY_SECONDS
+
+PAYMENT = {'patron_id': '654321', 'book_id': 1}
+
+
+def run_wsgi(app, payments, threads):
+    client = app.test_client()
+
+    def pay(_):
+        return client.post('/api/payments/late_fees', json=PAYMENT).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(pay, range(payments)))
+    return time.perf_counter() - started, statuses
+
+
+async def _asgi_payment(app):
+    body = json.dumps(PAYMENT).encode()
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/payments/late_fees', 'headers': []}
+    await app(scope, receive, send)
+    return sent[0]['status']
+
+
+def run_asgi(app, payments):
+    async def burst():
+        return await asyncio.gather(*(_asgi_payment(app) for _ in range(payments)))
+
+    started = time.perf_counter()
+    statuses = asyncio.run(burst())
+    return time.perf_counter() - started, statuses
+
+
+def report(label, payments, elapsed, statuses):
+    failed = sum(status != 200 for status in statuses)
+    print(f'{label:>28}: {elapsed:7.2f} s, {payments / elapsed:8.0f} payments/s ({failed} failed)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--payments', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=16, help='WSGI request threads')
+    parser.add_argument('--latency-scale', type=float, default=0.2, help='multiplier for gateway latency')
+    args = parser.parse_args()
+
+    payment_routes.payment_gateway = AsyncPaymentGateway(latency_scale=args.latency_scale)
+    print(f'gateway latency {PAYMENT_LATENCY_SECONDS * args.latency_scale * 1000:.0f} ms, '
+          f'{args.payments} payments')
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE': os.path.join(directory, 'bench.db'), 'SEED_SAMPLE_DATA': True,
+                          'SQLITE_WAL': True})
+        now = datetime.now()
+        database.insert_borrow_record('654321', 1, now - timedelta(days=24), now - timedelta(days=10))
+
+        report(f'WSGI, {args.threads} threads', args.payments, *run_wsgi(app, args.payments, args.threads))
+
+        from asgi import create_asgi_app
+        report('ASGI, one event loop', args.payments, *run_asgi(create_asgi_app(app), args.payments))
+        database.configure_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark for the availability event stream against reloading the catalog.
+
+Opens --clients event streams on one event loop through asgi.py, on a
+temporary database, then makes --changes borrow/return changes. For each
+change it reports how long it took to reach every client. For comparison it
+times rendering /catalog, the request each of those clients would otherwise
+repeat to see the change.
+
+Usage:
+    python benchmarks/bench_availability_stream.py [--clients 1000] [--changes 50] [--books 500]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from app import create_app
+from services.async_db import run_blocking
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+
+async def run_streams(asgi_app, clients, changes):
+    disconnected = asyncio.Event()
+    counts = [0] * clients
+    delivered = asyncio.Event()
+    expected = 0
+
+    async def listen(index):
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal expected
+            if message['type'] == 'http.response.body':
+                counts[index] += message['body'].count(b'event: availability')
+                if counts[index] >= expected and all(count >= expected for count in counts):
+                    delivered.set()
+
+        await asgi_app({'type': 'http', 'method': 'GET', 'path': '/events/availability', 'headers': []},
+                       receive, send)
+
+    tasks = [asyncio.ensure_future(listen(index)) for index in range(clients)]
+    await asyncio.sleep(0.5)
+
+    latencies = []
+    for change in range(changes):
+        expected += 1
+        delivered.clear()
+        started = time.perf_counter()
+        if change % 2 == 0:
+            await run_blocking(borrow_book_by_patron, '222222', 1)
+        else:
+            await run_blocking(return_book_by_patron, '222222', 1)
+        await asyncio.wait_for(delivered.wait(), 10)
+        latencies.append(time.perf_counter() - started)
+
+    disconnected.set()
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--changes', type=int, default=50)
+    parser.add_argument('--books', type=int, default=500, help='catalog size for the page render')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE': os.path.join(directory, 'bench.db'), 'SEED_SAMPLE_DATA': True,
+                          'SQLITE_WAL': True})
+        conn = database.get_db_connection()
+        conn.executemany('INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, 3, 3)',
+                         ((f'Title {n}', f'Author {n}', f'{9790000000000 + n}') for n in range(args.books)))
+        conn.commit()
+        conn.close()
+
+        client = app.test_client()
+        renders = 50
+        started = time.perf_counter()
+        for _ in range(renders):
+            page = client.get('/catalog')
+        render = (time.perf_counter() - started) / renders
+        print(f'catalog render ({args.books + 3} books): {render * 1000:.2f} ms, {len(page.data) / 1024:.0f} KiB; '
+              f'{args.clients} clients reloading once per change: {render * args.clients * 1000:.0f} ms '
+              f'and {len(page.data) * args.clients / 1024 / 1024:.1f} MiB per change')
+
+        from asgi import create_asgi_app
+        started = time.process_time()
+        latencies = asyncio.run(run_streams(create_asgi_app(app), args.clients, args.changes))
+        cpu = time.process_time() - started
+        latencies.sort()
+        print(f'event stream, {args.clients} clients: change reaches all clients in '
+              f'p50 {statistics.median(latencies) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms; '
+              f'{cpu / args.changes * 1000:.1f} ms CPU per change (including connects)')
+        database.configure_database()
+
+
+if __name__ == '__main__':
+    main()
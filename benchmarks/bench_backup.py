@@ -0,0 +1,106 @@
+"""
+Benchmark for write latency while an online backup runs.
+
+Fills a temporary database with N books (200,000 by default), then measures
+the latency of concurrent update_book_availability writes for a few seconds
+with no backup, and again while create_snapshot copies the database back to
+back, and reports p50/p99 for both.
+
+Usage:
+    python benchmarks/bench_backup.py [--books 200000] [--threads 4] [--pages 256] [--pause-ms 5]
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from services.backup import create_snapshot
+
+# Seconds of write load measured with and without backups running
+WINDOW_SECONDS = 3.0
+
+
+def fill(books):
+    database.init_database()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((f'Title {i:07d} ' + 'x' * 60, f'Author {i % 5000}', f'{9780000000000 + i}', 10 ** 6, 10 ** 6)
+          for i in range(books)))
+    conn.commit()
+    conn.close()
+
+
+def write_load(books, stop, latencies, index):
+    i = index
+    while not stop.is_set():
+        started = time.perf_counter()
+        database.update_book_availability(i % books + 1, -1)
+        latencies.append(time.perf_counter() - started)
+        i += 7919
+        time.sleep(0.001)
+
+
+def measure(label, books, threads, during):
+    stop = threading.Event()
+    latencies = []
+    workers = [threading.Thread(target=write_load, args=(books, stop, latencies, index)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    result = during()
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f'{label:>16}: {len(latencies):6d} writes, p50 {p50:6.2f} ms, p99 {p99:7.2f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=200_000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=256)
+    parser.add_argument('--pause-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.DATABASE = os.path.join(directory, 'bench.db')
+        fill(args.books)
+        # Writers only carry on during a backup in WAL mode, as wsgi.py runs the app
+        database.enable_wal()
+        print(f'database: {os.path.getsize(database.DATABASE) / 1e6:.1f} MB')
+
+        def back_to_back_backups():
+            # Snapshot repeatedly for the same window so both runs see as many writes
+            snapshots = []
+            started = time.perf_counter()
+            while time.perf_counter() - started < WINDOW_SECONDS:
+                snapshots.append(create_snapshot(os.path.join(directory, 'backups'), keep=1, pages=args.pages,
+                                                 pause=args.pause_ms / 1000, now=lambda: next(stamps)))
+            return snapshots
+
+        stamps = (datetime(2000, 1, 1) + timedelta(seconds=i) for i in itertools.count())
+        measure('no backup', args.books, args.threads, lambda: time.sleep(WINDOW_SECONDS))
+        snapshots = measure('during backups', args.books, args.threads, back_to_back_backups)
+
+        results = [snapshot['files']['bench.db'] for snapshot in snapshots]
+        print(f'{len(snapshots)} backups, {statistics.mean(s["seconds"] for s in snapshots):.2f} s each, '
+              f'{statistics.mean(result["steps"] for result in results):.0f} steps each')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark for the in-memory catalog replica.
+
+Fills a temporary SQLite database with N synthetic books (100,000 by default),
+then compares catalog reads from SQLite with reads from the replica and prints
+the replica's memory footprint per 100,000 books.
+
+Usage:
+    python benchmarks/bench_catalog_replica.py [--books 100000] [--lookups 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from services.catalog_replica import CatalogReplica
+
+
+def fill(books):
+    database.init_database()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((f'Title {i:07d} of the collection', f'Author {i % 5000}', f'{9780000000000 + i}', 3, 3)
+          for i in range(books)))
+    conn.commit()
+    conn.close()
+
+
+def timed(label, fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f'{label:>34}: {elapsed * 1000:9.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.DATABASE = os.path.join(directory, 'bench.db')
+        fill(args.books)
+        rng = random.Random(327)
+        ids = [rng.randint(1, args.books) for _ in range(args.lookups)]
+
+        timed('get_all_books (SQLite)', database.get_all_books, repeat=3)
+        timed(f'{args.lookups} x get_book_by_id (SQLite)', lambda: [database.get_book_by_id(i) for i in ids])
+
+        tracemalloc.start()
+        as_dicts = database.get_all_books()
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del as_dicts
+
+        replica = CatalogReplica()
+        replica.load(database.get_all_books())
+        database.attach_catalog_replica(replica)
+
+        timed('get_all_books (replica)', database.get_all_books, repeat=3)
+        timed(f'{args.lookups} x get_book_by_id (replica)', lambda: [database.get_book_by_id(i) for i in ids])
+
+        report = replica.memory_report()
+        print(f'replica memory: {report["bytes_per_100k_books"] / 1e6:.1f} MB per 100k books '
+              f'(list of dicts: {dict_bytes * 100_000 / args.books / 1e6:.1f} MB per 100k books)')
+        for part, size in report['breakdown'].items():
+            print(f'  {part:>16}: {size * 100_000 / args.books / 1e6:.1f} MB per 100k books')
+        database.attach_catalog_replica(None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark for app cold start.
+
+Starts a fresh Python interpreter per run that imports the app and calls
+create_app() on a temporary database, and reports the median time of each
+startup step (from app.extensions['startup_timings']) plus the whole process
+start. Scenarios: a brand-new database file (schema DDL and migrations run),
+an existing database at the current schema with and without seeding, and the
+same with `requests` imported up front, which is what every start paid for
+when payment_service imported it at module level.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 15]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+{preload}
+from app import create_app
+app = create_app(json.loads(sys.argv[1]))
+timings = dict(app.extensions['startup_timings'])
+timings['process'] = round((time.perf_counter() - started) * 1000, 2)
+print(json.dumps(timings))
+'''
+
+STEPS = ('imports', 'database_init', 'indexes', 'blueprints', 'create_app', 'process')
+
+
+def start(config, preload=''):
+    result = subprocess.run([sys.executable, '-c', CHILD.format(preload=preload), json.dumps(config)],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(label, runs, make_config, preload=''):
+    samples = [start(make_config(index), preload) for index in range(runs)]
+    medians = {step: statistics.median(sample[step] for sample in samples) for step in STEPS}
+    print(f'{label:>32}: ' + '  '.join(f'{step} {medians[step]:6.1f}' for step in STEPS))
+    return medians
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=15, help='interpreter starts per scenario')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        existing = os.path.join(directory, 'existing.db')
+        start({'DATABASE': existing, 'SEED_SAMPLE_DATA': True})
+
+        print('median milliseconds per step')
+        run('new database file', args.runs,
+            lambda index: {'DATABASE': os.path.join(directory, f'new{index}.db'), 'SEED_SAMPLE_DATA': True})
+        run('current schema, seeding', args.runs, lambda index: {'DATABASE': existing, 'SEED_SAMPLE_DATA': True})
+        run('current schema', args.runs, lambda index: {'DATABASE': existing})
+        run('current schema, requests loaded', args.runs, lambda index: {'DATABASE': existing},
+            preload='import requests')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for typo-tolerant search on a synthetic catalog.
+
+Builds a FuzzyIndex over N generated titles/authors (1,000,000 by default)
+and times queries containing one or two typos.
+
+Usage:
+    python benchmarks/bench_fuzzy_search.py [--books 1000000] [--queries 500]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.fuzzy_index import FuzzyIndex
+
+
+def make_word(rng):
+    syllables = ['ar', 'be', 'con', 'de', 'el', 'fi', 'gor', 'har', 'in', 'jo', 'ka', 'lo',
+                 'mar', 'ne', 'or', 'per', 'qui', 'ro', 'sta', 'ton', 'ul', 'ver', 'wel', 'zan']
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+
+def add_typo(rng, word):
+    position = rng.randrange(len(word))
+    letter = rng.choice(string.ascii_lowercase)
+    edit = rng.choice(['replace', 'delete', 'insert', 'swap'])
+    if edit == 'replace':
+        return word[:position] + letter + word[position + 1:]
+    if edit == 'delete':
+        return word[:position] + word[position + 1:]
+    if edit == 'insert':
+        return word[:position] + letter + word[position:]
+    position = min(position, len(word) - 2)
+    return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=327)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [make_word(rng) for _ in range(max(1000, args.books // 5))]
+    surnames = [make_word(rng).capitalize() for _ in range(max(100, args.books // 20))]
+
+    books = [
+        {'id': book_id,
+         'title': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 5))).title(),
+         'author': f'{rng.choice(surnames)} {rng.choice(surnames)}'}
+        for book_id in range(1, args.books + 1)
+    ]
+
+    index = FuzzyIndex()
+    started = time.perf_counter()
+    index.build(books)
+    print(f'built index over {args.books:,} books ({len(index):,} distinct words) '
+          f'in {time.perf_counter() - started:.1f}s')
+
+    for label, pick in [('author surname', lambda: rng.choice(surnames).lower()),
+                        ('title word', lambda: rng.choice(vocabulary))]:
+        timings, hits = [], 0
+        for _ in range(args.queries):
+            target = pick()
+            query = add_typo(rng, target)
+            started = time.perf_counter()
+            ranked = index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += bool(ranked)
+        timings.sort()
+        print(f'{label:>14}: p50 {percentile(timings, 0.50):.2f} ms, p95 {percentile(timings, 0.95):.2f} ms, '
+              f'p99 {percentile(timings, 0.99):.2f} ms, queries with results {hits}/{args.queries}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for group commit against one commit per write.
+
+Runs concurrent threads that each perform borrow-style writes through the
+database helpers (insert_borrow_record followed by update_book_availability)
+on a fresh temporary database, first committing every statement separately
+and then with group commit enabled, and reports writes per second.
+
+Usage:
+    python benchmarks/bench_group_commit.py [--threads 16] [--writes 500] [--window-ms 2]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+
+BOOKS = 100
+
+
+def fill():
+    database.init_database()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((f'Title {i:05d}', f'Author {i % 50}', f'{9780000000000 + i}', 10 ** 6, 10 ** 6) for i in range(BOOKS)))
+    conn.commit()
+    conn.close()
+
+
+def writer(thread_index, writes, failures):
+    now = datetime.now()
+    for i in range(writes // 2):
+        patron_id = f'{thread_index:03d}{i % 1000:03d}'
+        book_id = i % BOOKS + 1
+        if not database.insert_borrow_record(patron_id, book_id, now, now + timedelta(days=14)):
+            failures.append(patron_id)
+        if not database.update_book_availability(book_id, -1):
+            failures.append(patron_id)
+
+
+def run(label, threads, writes):
+    with tempfile.TemporaryDirectory() as directory:
+        database.DATABASE = os.path.join(directory, 'bench.db')
+        fill()
+
+        failures = []
+        workers = [threading.Thread(target=writer, args=(index, writes, failures)) for index in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        stats = database.group_commit_stats()
+        database.disable_group_commit()
+    total = threads * (writes // 2) * 2
+    batches = sum(writer_stats['batches'] for writer_stats in stats.values())
+    batch_note = f', {total / batches:.1f} writes per commit' if batches else ''
+    print(f'{label:>22}: {total / elapsed:9.0f} writes/s ({len(failures)} failures{batch_note})')
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--writes', type=int, default=500, help='writes per thread')
+    parser.add_argument('--window-ms', type=float, default=2.0, help='group commit window')
+    args = parser.parse_args()
+
+    direct = run('commit per write', args.threads, args.writes)
+    database.enable_group_commit(window=args.window_ms / 1000)
+    grouped = run('group commit', args.threads, args.writes)
+    print(f'{"speedup":>22}: {grouped / direct:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark for the hold queue on a popular title.
+
+Fills one book's hold queue with --holds patrons on a temporary database,
+then times looking up a patron's position (GET /api/holds/<patron_id> does
+the same query) at the front, middle and back of the queue, and returns that
+lend the copy to the next holder.
+
+Usage:
+    python benchmarks/bench_holds.py [--holds 10000] [--lookups 2000] [--returns 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from services.library_service import get_hold_positions, return_book_by_patron
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--holds', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--returns', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.configure_database(os.path.join(directory, 'bench.db'))
+        database.init_database()
+        now = datetime.now()
+        conn = database.get_db_connection()
+        conn.execute("INSERT INTO books VALUES (1, 'Popular', 'Author', '9780000000001', 1, 0)")
+        conn.execute('INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, 1, ?, ?)',
+                     ('100000', database.to_epoch(now), database.to_epoch(now + timedelta(days=14))))
+        conn.executemany('INSERT INTO holds (patron_id, book_id, placed_at) VALUES (?, 1, ?)',
+                         ((f'{200000 + n}', database.to_epoch(now)) for n in range(args.holds)))
+        conn.commit()
+        conn.close()
+
+        for label, index in (('front', 0), ('middle', args.holds // 2), ('back', args.holds - 1)):
+            patron_id = f'{200000 + index}'
+            started = time.perf_counter()
+            for _ in range(args.lookups):
+                get_hold_positions(patron_id)
+            elapsed = time.perf_counter() - started
+            print(f'position lookup ({label:>6}): {elapsed / args.lookups * 1e6:8.1f} us')
+
+        # Each holder returns the copy they were lent, which passes it to the next holder
+        borrower = '100000'
+        started = time.perf_counter()
+        for n in range(args.returns):
+            success, message = return_book_by_patron(borrower, 1)
+            assert success and 'hold' in message, message
+            borrower = f'{200000 + n}'
+        elapsed = time.perf_counter() - started
+        print(f'return + lend to next holder: {elapsed / args.returns * 1000:8.3f} ms')
+        database.configure_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark for analysing the loan history from a columnar export against the live database.
+
+Loads --history returned loans into a temporary database and exports them with
+services/loan_export.py. It then runs one analysis (average loan length and
+overdue rate per patron) two ways: a SELECT of every loan from the database, and
+a scan of the memory-mapped export. For each it reports the time and the peak
+Python memory allocated. It also times how long a borrow waits while an
+export is running.
+
+Usage:
+    python benchmarks/bench_loan_export.py [--history 1000000] [--patrons 50000] [--borrows 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from services.loan_export import export_loans, open_export
+
+
+def analyse(rows):
+    """Total loan seconds, loans and late returns per patron."""
+    totals = {}
+    for patron, borrowed, due, returned in rows:
+        total = totals.setdefault(patron, [0, 0, 0])
+        total[0] += returned - borrowed
+        total[1] += 1
+        total[2] += returned > due
+    return totals
+
+
+def from_database():
+    conn = database.get_db_connection()
+    rows = conn.execute('SELECT patron_id, borrow_date, due_date, return_date FROM borrow_history').fetchall()
+    conn.close()
+    return analyse(rows)
+
+
+def from_export(path):
+    with open_export(path) as export:
+        columns = [export.column(name) for name in ('patron', 'borrow_date', 'due_date', 'return_date')]
+        totals = analyse(zip(*columns))
+        del columns
+        return totals
+
+
+def measured(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=1000000)
+    parser.add_argument('--patrons', type=int, default=50000)
+    parser.add_argument('--borrows', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.configure_database(os.path.join(directory, 'bench.db'))
+        database.init_database()
+        database.add_sample_data()
+        rng = random.Random(1)
+        now = database.to_epoch(datetime.now())
+        start = now - 2 * 365 * 86400
+        conn = database.get_db_connection()
+        conn.executemany('''
+            INSERT INTO borrow_history (loan_id, patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (0, ?, ?, ?, ?, ?)
+        ''', ((f'{100000 + rng.randrange(args.patrons)}', rng.randint(1, 3), borrowed, borrowed + 14 * 86400,
+               borrowed + rng.randint(1, 30) * 86400)
+              for borrowed in (start + n * (now - start) // args.history for n in range(args.history))))
+        conn.commit()
+        conn.close()
+
+        started = time.perf_counter()
+        manifest = export_loans(os.path.join(directory, 'exports'))
+        size = sum(os.path.getsize(os.path.join(manifest['path'], name)) for name in os.listdir(manifest['path']))
+        print(f"export of {manifest['rows']} loans: {time.perf_counter() - started:.1f} s, "
+              f'{size / 1e6:.1f} MB on disk')
+
+        queried, query_seconds, query_peak = measured(from_database)
+        mapped, map_seconds, map_peak = measured(from_export, manifest['path'])
+        assert len(queried) == len(mapped)
+        print(f"{'analysis':<24}{'time':>10}{'peak memory':>16}")
+        print(f"{'SELECT from database':<24}{query_seconds:>8.2f} s{query_peak / 1e6:>13.1f} MB")
+        print(f"{'memory-mapped export':<24}{map_seconds:>8.2f} s{map_peak / 1e6:>13.1f} MB")
+
+        # Borrows while an export runs: each read batch is a short transaction of its own
+        waits = []
+        running = threading.Thread(target=export_loans, args=(os.path.join(directory, 'exports'),))
+        running.start()
+        when = datetime.now()
+        for n in range(args.borrows):
+            started = time.perf_counter()
+            database.insert_borrow_record(f'{200000 + n}', 1, when, when + timedelta(days=14))
+            waits.append(time.perf_counter() - started)
+        running.join()
+        waits.sort()
+        print(f'borrow during an export: p50 {waits[len(waits) // 2] * 1000:.2f} ms, '
+              f'max {waits[-1] * 1000:.2f} ms')
+        database.configure_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark for slotted row records against dict(row) conversions.
+
+Fills a temporary SQLite database with N books and N open loans (100,000 by
+default), then measures time and peak allocations for materializing them as
+dicts (the previous implementation) and as Book/Loan records.
+
+Usage:
+    python benchmarks/bench_row_records.py [--rows 100000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+
+
+def fill(rows):
+    database.init_database()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((f'Title {i:07d}', f'Author {i % 5000}', f'{9780000000000 + i}', 3, 2) for i in range(rows)))
+    start = database.to_epoch(datetime.now() - timedelta(days=20))
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES (?, ?, ?, ?)
+    ''', (('123456', i + 1, start + i, start + 14 * 86400 + i) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def books_as_dicts():
+    conn = database.get_db_connection()
+    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    conn.close()
+    return [dict(book) for book in books]
+
+
+def loans_as_dicts(patron_id):
+    # Previous implementation: a fresh dict per row, dates converted three times
+    # and datetime.now() called once per row
+    conn = database.get_db_connection()
+    records = conn.execute('''
+        SELECT br.*, b.title, b.author 
+        FROM borrow_records br 
+        JOIN books b ON br.book_id = b.id 
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+        ORDER BY br.borrow_date
+    ''', (patron_id,)).fetchall()
+    conn.close()
+    return [{
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': database.from_epoch(record['borrow_date']),
+        'due_date': database.from_epoch(record['due_date']),
+        'is_overdue': datetime.now() > database.from_epoch(record['due_date'])
+    } for record in records]
+
+
+def measure(label, fn, use=lambda rows: None):
+    # Time without tracing, then trace a second run for peak allocations
+    started = time.perf_counter()
+    use(fn())
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    use(fn())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:>44}: {elapsed * 1000:8.1f} ms, peak {peak / 1e6:7.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.DATABASE = os.path.join(directory, 'bench.db')
+        fill(args.rows)
+
+        measure('books: dict(row)', books_as_dicts)
+        measure('books: Book records', database.get_all_books)
+        measure('loans: dicts, dates parsed eagerly', lambda: loans_as_dicts('123456'))
+        measure('loans: Loan records, dates never read', lambda: database.get_patron_borrowed_books('123456'))
+        measure('loans: Loan records, due_date read',
+                lambda: database.get_patron_borrowed_books('123456'),
+                lambda loans: [loan['due_date'] for loan in loans])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark for moving post-commit work off the request path.
+
+Runs a burst of simulated post-commit tasks (each sleeping --task-ms, like a
+notification or cache refresh) two ways on a temporary database: inline, as
+if the request did the work before responding, and submitted to the
+background task executor. Reports the time the caller spent per task, how
+long the workers took to drain the queue, and how many tasks spilled to the
+task_retries table because the queue was full.
+
+Usage:
+    python benchmarks/bench_task_executor.py [--tasks 500] [--task-ms 5] [--workers 4] [--queue-size 100]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import database
+from services.task_executor import TaskExecutor, register_task
+
+TASK_SECONDS = 0.005
+
+
+@register_task('bench_post_commit')
+def _post_commit(book_id):
+    time.sleep(TASK_SECONDS)
+
+
+def main():
+    global TASK_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--task-ms', type=float, default=5.0, help='time each task takes')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=100)
+    args = parser.parse_args()
+    TASK_SECONDS = args.task_ms / 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        database.configure_database(os.path.join(directory, 'bench.db'))
+        database.init_database()
+
+        started = time.perf_counter()
+        for book_id in range(args.tasks):
+            _post_commit(book_id)
+        inline = time.perf_counter() - started
+        print(f'{"inline":>12}: {inline / args.tasks * 1000:8.3f} ms per request, {inline:6.2f} s total')
+
+        executor = TaskExecutor(workers=args.workers, max_queue=args.queue_size)
+        executor.start()
+        started = time.perf_counter()
+        for book_id in range(args.tasks):
+            executor.submit('bench_post_commit', book_id=book_id)
+        submitted = time.perf_counter() - started
+        executor.shutdown(timeout=60)
+        drained = time.perf_counter() - started
+        stats = executor.stats()
+        print(f'{"background":>12}: {submitted / args.tasks * 1000:8.3f} ms per request, '
+              f'drained in {drained:6.2f} s, {stats["spilled"]} spilled to task_retries, '
+              f'wait p95 {stats["wait_ms"]["p95"]:.1f} ms')
+        database.configure_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark for requests per second by number of gunicorn worker processes.
+
+Fills a temporary WAL database with synthetic books, serves it with
+`gunicorn -c gunicorn.conf.py wsgi:app` at each worker count, and drives it
+from several client processes over keep-alive connections for a fixed time.
+The load is catalog pages, API searches and late fee lookups, plus a share of
+bulk borrow/return pairs so that workers also write to the shared database.
+Each server is stopped with SIGTERM, the same graceful drain as `docker stop`.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--clients 8] [--seconds 5]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+import database
+
+BOOKS = 200
+PORT = 5077
+
+
+def fill(path):
+    database.configure_database(path)
+    database.init_database()
+    database.enable_wal()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((f'Title {i:05d}', f'Author {i % 50}', f'{9780000000000 + i}', 10 ** 6, 10 ** 6) for i in range(BOOKS)))
+    conn.commit()
+    conn.close()
+
+
+def request(conn, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status < 500
+
+
+def client(index, seconds, write_percent, results):
+    rng = random.Random(index)
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=30)
+    done, errors = 0, 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        roll = rng.random() * 100
+        book_id = rng.randint(1, BOOKS)
+        if roll < write_percent:
+            loan = {'patron_id': f'{index:03d}{rng.randint(0, 999):03d}', 'book_ids': [book_id]}
+            ok = request(conn, 'POST', '/api/bulk_borrow', loan) and request(conn, 'POST', '/api/bulk_return', loan)
+        elif roll < 40:
+            ok = request(conn, 'GET', '/catalog')
+        elif roll < 80:
+            ok = request(conn, 'GET', f'/api/search?q=title+{book_id % 20:02d}&type=title')
+        else:
+            ok = request(conn, 'GET', f'/api/late_fee/123456/{book_id}')
+        done += 1
+        errors += not ok
+    conn.close()
+    results.put((done, errors))
+
+
+def wait_until_ready(server):
+    for _ in range(200):
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=1)
+            ready = request(conn, 'GET', '/api/metrics')
+            conn.close()
+            if ready:
+                return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError('gunicorn did not start')
+
+
+def run(path, workers, clients, seconds, write_percent):
+    env = dict(os.environ, FLASK_DATABASE=path, WEB_CONCURRENCY=str(workers), BIND=f'127.0.0.1:{PORT}')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', os.devnull,
+                               'wsgi:app'], cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(server)
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = [context.Process(target=client, args=(index, seconds, write_percent, results))
+                     for index in range(clients)]
+        for process in processes:
+            process.start()
+        totals = [results.get(timeout=seconds + 60) for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    done = sum(count for count, _ in totals)
+    errors = sum(count for _, count in totals)
+    print(f'{workers:>3} workers: {done / seconds:8.0f} requests/s ({errors} errors)')
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help='client processes')
+    parser.add_argument('--seconds', type=float, default=5.0, help='load duration per worker count')
+    parser.add_argument('--write-percent', type=float, default=10.0,
+                        help='share of requests that are bulk borrow/return pairs')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs, {args.clients} client processes')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        fill(path)
+        baseline = None
+        for workers in args.workers:
+            rate = run(path, workers, args.clients, args.seconds, args.write_percent)
+            baseline = baseline or rate
+            print(f'{"":>12}{rate / baseline:8.2f}x the first worker count')
+
+
+if __name__ == '__main__':
+    main()
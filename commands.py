@@ -0,0 +1,112 @@
+"""
+Maintenance commands for the Library Management System.
+
+Registered on the Flask CLI by create_app, e.g.:
+    flask --app app reconcile-counters
+    flask --app app backup --compress
+    flask --app app rebuild-stats --check
+    flask --app app export-loans --dir exports
+"""
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from database import add_sample_data, reconcile_patron_counters
+from services.analytics import rebuild_stats
+from services.backup import DEFAULT_KEEP, DEFAULT_PAGES_PER_STEP, DEFAULT_STEP_PAUSE_SECONDS, create_snapshot
+from services.loan_export import DEFAULT_BATCH_SIZE, export_loans
+
+
+@click.command('reconcile-counters')
+@click.option('--fix', is_flag=True, help='Rewrite mismatched counters with the recounted values.')
+def reconcile_counters_command(fix):
+    """Verify the patron counters against the open loans and the circulation log."""
+    mismatches = reconcile_patron_counters(fix=fix)
+    for mismatch in mismatches:
+        click.echo(f"{mismatch['patron_id']}: active_loans {mismatch['active_loans']}, "
+                   f"actual {mismatch['actual']}; outstanding_fees {mismatch['outstanding_fees']}, "
+                   f"actual {mismatch['actual_fees']}")
+    if not mismatches:
+        click.echo('All patron counters match.')
+    elif fix:
+        click.echo(f'Fixed {len(mismatches)} patron counter(s).')
+    else:
+        raise SystemExit(1)
+
+
+@click.command('rebuild-stats')
+@click.option('--check', is_flag=True, help='Only report differences; leave the running totals alone.')
+def rebuild_stats_command(check):
+    """Recount the circulation stats from the loan tables and replace the running totals."""
+    differences = rebuild_stats(fix=not check)
+    for difference in differences[:50]:
+        changed = ', '.join(f"{column} {difference['stored'][column]} -> {value}"
+                            for column, value in difference['actual'].items()
+                            if difference['stored'][column] != value)
+        click.echo(f"{difference['scope']} {difference['key']}: {changed}")
+    if len(differences) > 50:
+        click.echo(f'... and {len(differences) - 50} more')
+    if not differences:
+        click.echo('Circulation stats match the loan tables.')
+    elif not check:
+        click.echo(f'Rebuilt circulation stats ({len(differences)} difference(s) fixed).')
+    else:
+        raise SystemExit(1)
+
+
+@click.command('backup')
+@click.option('--dir', 'directory', default='backups', show_default=True, help='Snapshot directory.')
+@click.option('--compress', is_flag=True, help='Gzip the snapshot files.')
+@click.option('--keep', default=DEFAULT_KEEP, show_default=True, help='Snapshots to keep (0 keeps all).')
+@click.option('--pages', default=DEFAULT_PAGES_PER_STEP, show_default=True, help='Pages copied per step.')
+@click.option('--pause-ms', default=DEFAULT_STEP_PAUSE_SECONDS * 1000, show_default=True,
+              help='Pause between steps, in milliseconds.')
+def backup_command(directory, compress, keep, pages, pause_ms):
+    """Take an online snapshot of the database while the app keeps running."""
+    snapshot = create_snapshot(directory, compress=compress, keep=keep or None,
+                               pages=pages, pause=pause_ms / 1000)
+    for name, result in snapshot['files'].items():
+        held = '' if result['paused'] else ' (rollback journal: writers waited)'
+        click.echo(f"{name}: {result['bytes']} bytes in {result['steps']} steps{held}")
+    click.echo(f"Snapshot {snapshot['path']} written in {snapshot['seconds']} s")
+    for path in snapshot['removed']:
+        click.echo(f'Removed old snapshot {path}')
+
+
+@click.command('export-loans')
+@click.option('--dir', 'directory', default='exports', show_default=True, help='Export directory.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Loans read per batch.')
+def export_loans_command(directory, batch_size):
+    """Export every loan to memory-mappable .npy column files for offline analysis."""
+    export = export_loans(directory, batch_size=batch_size)
+    size = sum(os.path.getsize(os.path.join(export['path'], name)) for name in os.listdir(export['path']))
+    click.echo(f"Exported {export['rows']} loans ({export['patron_ids']['count']} patrons) "
+               f"to {export['path']}, {size} bytes")
+
+
+@click.command('seed-sample-data')
+def seed_sample_data_command():
+    """Insert the demo books (and one loan) if the catalog is empty."""
+    add_sample_data()
+    click.echo('Sample data is in place.')
+
+
+@click.command('startup-report')
+@with_appcontext
+def startup_report_command():
+    """Show how long each step of app startup took."""
+    for step, milliseconds in current_app.extensions['startup_timings'].items():
+        click.echo(f'{step:<14}{milliseconds:>10.2f} ms')
+
+
+def register_commands(app):
+    """Register all maintenance commands with the Flask app."""
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(backup_command)
+    app.cli.add_command(export_loans_command)
+    app.cli.add_command(seed_sample_data_command)
+    app.cli.add_command(startup_report_command)
@@ -3,50 +3,635 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import os
+import shutil
 import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from records import Book, Loan
+from services.group_commit import DEFAULT_MAX_BATCH, DEFAULT_WINDOW_SECONDS, GroupCommitWriter
+from services.single_flight import coalesced
 
 # Database configuration
-DATABASE = 'library.db'
+DEFAULT_DATABASE = 'library.db'
+DATABASE = DEFAULT_DATABASE
 
-def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+# Ways configure_database() can provide the database
+DATABASE_MODES = ('file', 'memory', 'temp')
+
+# Callbacks told about committed changes, e.g. to keep in-memory indexes current
+_change_listeners = []
+
+def add_change_listener(callback) -> None:
+    """
+    Register callback(event, data) to run after a change is committed.
+    Events: 'book_added' (data: the new book's columns),
+    'availability_changed' (data: 'book_id' and the 'change' in available copies),
+    'hold_filled' (data: 'book_id' and the 'patron_id' a returned copy was lent to) and
+    'reset' (data: the new 'database'), sent when configure_database() switches databases.
+    """
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+def _notify_change(event: str, data: Dict) -> None:
+    """Pass a committed change on to every registered listener."""
+    for callback in list(_change_listeners):
+        callback(event, data)
+
+# Optional in-memory copy of the books table that serves book reads (services/catalog_replica.py)
+_catalog_replica = None
+
+def attach_catalog_replica(replica) -> None:
+    """Serve get_all_books/get_book_by_id/get_book_by_isbn from replica (None to detach)."""
+    global _catalog_replica
+    _catalog_replica = replica
+
+def _connect(path: str):
+    """Open a connection to one database file."""
+    # URI filenames are needed for shared in-memory databases; plain paths are unaffected
+    conn = sqlite3.connect(path, uri=True)
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
+def get_db_connection():
+    """Get a database connection."""
+    return _connect(DATABASE)
+
+@contextmanager
+def _write_transaction(conn):
+    """Run the block as one write transaction on conn, then close it."""
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+@contextmanager
+def transaction():
+    """
+    Open a connection and run everything in the block as one write transaction.
+    Commits on success and rolls back if the block raises.
+    """
+    with _write_transaction(get_db_connection()) as conn:
+        yield conn
+
+# Group Commit
+#
+# When enabled, run_write() hands write operations to one writer thread per
+# database file (services/group_commit.py). Writes that arrive together share
+# a transaction and a single commit instead of paying for one each.
+
+_group_commit: Optional[Dict] = None
+_writers: Dict[str, GroupCommitWriter] = {}
+_writers_lock = threading.Lock()
+
+def enable_group_commit(window: float = DEFAULT_WINDOW_SECONDS, max_batch: int = DEFAULT_MAX_BATCH) -> None:
+    """Send run_write() operations through batching writer threads."""
+    global _group_commit
+    disable_group_commit()
+    with _writers_lock:
+        _group_commit = {'window': window, 'max_batch': max_batch}
+
+def disable_group_commit() -> None:
+    """Commit anything queued, stop the writer threads and write directly again."""
+    global _group_commit
+    with _writers_lock:
+        _group_commit = None
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+def _writer_for(path: str) -> Optional[GroupCommitWriter]:
+    """The batching writer for path, or None when group commit is off."""
+    with _writers_lock:
+        config = _group_commit
+        if config is None:
+            return None
+        writer = _writers.get(path)
+        if writer is None:
+            writer = GroupCommitWriter(lambda: _connect(path),
+                                       name=f'group-commit:{database_label(path)}', **config)
+            _writers[path] = writer
+        return writer
+
+def run_write(operation):
+    """
+    Run operation(conn) as a committed write and return its result.
+
+    With group commit enabled the operation is batched with other writers'
+    operations on the same file; otherwise it runs in its own transaction.
+    Either way, an exception from the operation rolls back only its own changes
+    and is raised here.
+    """
+    writer = _writer_for(DATABASE)
+    if writer is not None:
+        try:
+            future = writer.submit(operation)
+        except RuntimeError:
+            # Group commit was disabled after the writer was looked up
+            pass
+        else:
+            return future.result()
+    with transaction() as conn:
+        return operation(conn)
+
+def _reset_writers_after_fork() -> None:
+    """In a forked worker: forget the parent's writers, whose threads don't exist in the child."""
+    global _writers_lock
+    _writers_lock = threading.Lock()
+    _writers.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_writers_after_fork)
+
+def group_commit_stats() -> Dict:
+    """Batching counters per database file, empty when group commit is off."""
+    with _writers_lock:
+        writers = dict(_writers)
+    return {database_label(path): writer.stats() for path, writer in writers.items()}
+
+def enable_wal() -> None:
+    """
+    Switch the database file to write-ahead logging (in-memory databases are skipped).
+    Readers then don't block the writer or each other, which matters once
+    several worker processes share the file. The setting is stored in the file.
+    """
+    if not _is_memory(DATABASE):
+        conn = _connect(DATABASE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+
+# Database Location
+#
+# DATABASE is a file path by default. configure_database() can point it at a
+# different file, a private in-memory database or a throwaway copy of a file,
+# so tests and separate app instances don't share library.db.
+
+# Open connections that keep shared in-memory databases alive
+_anchors: Dict[str, sqlite3.Connection] = {}
+
+# Directory holding the current 'temp' mode copy, removed on reconfiguration
+_temp_directory: Optional[str] = None
+
+def _is_memory(path: str) -> bool:
+    return path.startswith('file:') and 'mode=memory' in path
+
+def database_label(path: str) -> str:
+    """Short name for a database path or URI, e.g. 'library.db'."""
+    name = path.split('?', 1)[0]
+    if name.startswith('file:'):
+        name = name[len('file:'):]
+    return os.path.basename(name)
+
+def _release_database() -> None:
+    """Drop the in-memory databases and temp copy left by the previous configuration."""
+    global _temp_directory
+    for conn in _anchors.values():
+        conn.close()
+    _anchors.clear()
+    if _temp_directory is not None:
+        shutil.rmtree(_temp_directory, ignore_errors=True)
+        _temp_directory = None
+
+def configure_database(path: Optional[str] = None, mode: str = 'file') -> str:
+    """
+    Choose the database every helper in this module uses.
+
+    Args:
+        path: Database file (DEFAULT_DATABASE if omitted); ':memory:' means mode 'memory'
+        mode: 'file' uses path directly, 'memory' a fresh shared-cache in-memory
+              database, 'temp' a copy of path (or an empty file) in a new temporary
+              directory that is deleted when the database is reconfigured
+
+    Group commit and the catalog replica are switched off, and change
+    listeners get a 'reset' event so in-memory caches drop the old database's data.
+    The caller initializes the new database (init_database) as usual.
+
+    Returns:
+        str: the new DATABASE path or URI
+    """
+    global DATABASE, _temp_directory
+    if path == ':memory:':
+        mode = 'memory'
+    if mode not in DATABASE_MODES:
+        raise ValueError(f"Unknown database mode {mode!r}; expected one of {', '.join(DATABASE_MODES)}")
+    source = path or DEFAULT_DATABASE
+
+    disable_group_commit()
+    attach_catalog_replica(None)
+    _release_database()
+
+    if mode == 'memory':
+        # A unique name keeps each configuration separate; the anchor keeps it alive
+        DATABASE = f'file:library-{uuid.uuid4().hex}.db?mode=memory&cache=shared'
+        _anchors[DATABASE] = _connect(DATABASE)
+    elif mode == 'temp':
+        _temp_directory = tempfile.mkdtemp(prefix='library-db-')
+        DATABASE = os.path.join(_temp_directory, os.path.basename(source))
+        if os.path.exists(source):
+            original, copy = _connect(source), _connect(DATABASE)
+            original.backup(copy)
+            copy.close()
+            original.close()
+    else:
+        DATABASE = source
+
+    _notify_change('reset', {'database': DATABASE})
+    return DATABASE
+
 def init_database():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
+    """
+    Initialize the database with required tables and bring its schema up to date.
+    Files already at SCHEMA_VERSION are left alone, so a warm start runs no DDL.
+    """
+    if not _schema_is_current(DATABASE):
+        conn = _connect(DATABASE)
+        
+        # Create books table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                isbn TEXT UNIQUE NOT NULL,
+                total_copies INTEGER NOT NULL,
+                available_copies INTEGER NOT NULL
+            )
+        ''')
+        
+        conn.commit()
+        
+        # Create borrow_records table (original layout, upgraded by the migrations below)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS borrow_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patron_id TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                borrow_date TEXT NOT NULL,
+                due_date TEXT NOT NULL,
+                return_date TEXT,
+                FOREIGN KEY (book_id) REFERENCES books (id)
+            )
+        ''')
+        
+        conn.commit()
+        conn.close()
+        
+        migrate_database()
+
+# Schema Migrations
+#
+# PRAGMA user_version records how many migrations a database file has had.
+# Each migration runs in its own transaction together with its version bump.
+
+def _migrate_epoch_dates(conn) -> None:
+    """Store borrow_records dates as integer epoch seconds instead of ISO strings."""
+    conn.execute('''
+        CREATE TABLE borrow_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
     
-    # Create books table
+    def convert(value):
+        if value is None or isinstance(value, int):
+            return value
+        return to_epoch(datetime.fromisoformat(value))
+    
+    rows = conn.execute('''
+        SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_records
+    ''')
+    conn.executemany('''
+        INSERT INTO borrow_records_new (id, patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ((row['id'], row['patron_id'], row['book_id'], convert(row['borrow_date']),
+           convert(row['due_date']), convert(row['return_date'])) for row in rows.fetchall()))
+    
+    conn.execute('DROP TABLE borrow_records')
+    conn.execute('ALTER TABLE borrow_records_new RENAME TO borrow_records')
+    
+    # Open loans by patron, and open loans by due date for overdue range queries
+    conn.execute('''
+        CREATE INDEX idx_borrow_records_open_patron 
+        ON borrow_records (patron_id, borrow_date) WHERE return_date IS NULL
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_borrow_records_open_due 
+        ON borrow_records (due_date) WHERE return_date IS NULL
+    ''')
+
+def _migrate_patron_counters(conn) -> None:
+    """
+    Add the patrons table with per-patron active_loans and outstanding_fees counters.
+    Triggers on borrow_records keep active_loans in step with every insert, return and delete.
+    """
+    conn.execute('''
+        CREATE TABLE patrons (
+            patron_id TEXT PRIMARY KEY,
+            active_loans INTEGER NOT NULL DEFAULT 0,
+            outstanding_fees REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO patrons (patron_id, active_loans)
+        SELECT patron_id, SUM(return_date IS NULL) FROM borrow_records GROUP BY patron_id
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER trg_borrow_records_open AFTER INSERT ON borrow_records
+        WHEN NEW.return_date IS NULL
+        BEGIN
+            INSERT OR IGNORE INTO patrons (patron_id) VALUES (NEW.patron_id);
+            UPDATE patrons SET active_loans = active_loans + 1 WHERE patron_id = NEW.patron_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_borrow_records_return AFTER UPDATE OF return_date ON borrow_records
+        WHEN OLD.return_date IS NULL AND NEW.return_date IS NOT NULL
+        BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1 WHERE patron_id = NEW.patron_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_borrow_records_delete AFTER DELETE ON borrow_records
+        WHEN OLD.return_date IS NULL
+        BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1 WHERE patron_id = OLD.patron_id;
+        END
+    ''')
+
+def _migrate_loan_history(conn) -> None:
+    """
+    Split returned loans out of borrow_records into the append-only borrow_history table.
+
+    borrow_records keeps only open loans, so active-loan queries and indexes stay
+    small. Setting a loan's return_date archives it: the return trigger copies the
+    row into borrow_history (in return order) and deletes it from borrow_records.
+    """
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS books (
+        CREATE TABLE borrow_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            isbn TEXT UNIQUE NOT NULL,
-            total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
+            loan_id INTEGER NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER NOT NULL
         )
     ''')
+    conn.execute('''
+        CREATE INDEX idx_borrow_history_patron ON borrow_history (patron_id, id)
+    ''')
     
-    # Create borrow_records table
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
+        INSERT INTO borrow_history (loan_id, patron_id, book_id, borrow_date, due_date, return_date)
+        SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_records
+        WHERE return_date IS NOT NULL
+        ORDER BY return_date, id
+    ''')
+    conn.execute('DELETE FROM borrow_records WHERE return_date IS NOT NULL')
+    
+    conn.execute('DROP TRIGGER trg_borrow_records_return')
+    conn.execute('''
+        CREATE TRIGGER trg_borrow_records_return AFTER UPDATE OF return_date ON borrow_records
+        WHEN OLD.return_date IS NULL AND NEW.return_date IS NOT NULL
+        BEGIN
+            UPDATE patrons SET active_loans = active_loans - 1 WHERE patron_id = NEW.patron_id;
+            INSERT INTO borrow_history (loan_id, patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (NEW.id, NEW.patron_id, NEW.book_id, NEW.borrow_date, NEW.due_date, NEW.return_date);
+            DELETE FROM borrow_records WHERE id = NEW.id;
+        END
+    ''')
+
+def _migrate_task_retries(conn) -> None:
+    """
+    Add the task_retries table, where background tasks that failed (or found the
+    task queue full) wait to be run again, and tasks that kept failing are kept as 'dead'.
+    """
+    conn.execute('''
+        CREATE TABLE task_retries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            last_error TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_task_retries_due ON task_retries (run_after) WHERE status = 'pending'
+    ''')
+
+def _migrate_holds(conn) -> None:
+    """
+    Add the holds table: patrons waiting for a copy of a book, served in the
+    order the holds were placed (ID order).
+    """
+    conn.execute('''
+        CREATE TABLE holds (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patron_id TEXT NOT NULL,
             book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
+            placed_at INTEGER NOT NULL,
+            UNIQUE (patron_id, book_id),
             FOREIGN KEY (book_id) REFERENCES books (id)
         )
     ''')
+    # Each book's queue in order: the next hold is one index seek
+    conn.execute('CREATE INDEX idx_holds_queue ON holds (book_id, id)')
     
-    conn.commit()
+    # Per-book queue length, and a version that changes with every hold placed or removed
+    conn.execute('''
+        CREATE TABLE hold_queues (
+            book_id INTEGER PRIMARY KEY,
+            length INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_holds_insert AFTER INSERT ON holds
+        BEGIN
+            INSERT OR IGNORE INTO hold_queues (book_id) VALUES (NEW.book_id);
+            UPDATE hold_queues SET length = length + 1, version = version + 1 WHERE book_id = NEW.book_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_holds_delete AFTER DELETE ON holds
+        BEGIN
+            UPDATE hold_queues SET length = length - 1, version = version + 1 WHERE book_id = OLD.book_id;
+        END
+    ''')
+
+# Most recent availability changes kept for event stream clients catching up
+AVAILABILITY_CHANGES_KEPT = 10000
+
+def _migrate_availability_changes(conn) -> None:
+    """
+    Add the availability_changes table, which a trigger on books fills with every
+    change to available_copies, whichever process or code path made it. Only the
+    newest AVAILABILITY_CHANGES_KEPT rows are kept.
+    """
+    conn.execute('''
+        CREATE TABLE availability_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_books_availability AFTER UPDATE OF available_copies ON books
+        WHEN NEW.available_copies != OLD.available_copies
+        BEGIN
+            INSERT INTO availability_changes (book_id, available_copies) VALUES (NEW.id, NEW.available_copies);
+            DELETE FROM availability_changes
+            WHERE seq <= (SELECT MAX(seq) FROM availability_changes) - {AVAILABILITY_CHANGES_KEPT};
+        END
+    ''')
+
+def _migrate_circulation_events(conn) -> None:
+    """
+    Add the append-only circulation_events log and the circulation_offsets table
+    where its consumers record how far they have read. Existing books and loans
+    in this file are written to the log first, so a consumer starting from 0
+    sees the whole history.
+    """
+    conn.execute('''
+        CREATE TABLE circulation_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL,
+            occurred_at INTEGER NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            borrow_date INTEGER,
+            due_date INTEGER,
+            amount REAL,
+            reference TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE circulation_offsets (
+            consumer TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+    conn.execute('''
+        INSERT INTO circulation_events (event, occurred_at, book_id)
+        SELECT 'add_book', CAST(strftime('%s', 'now') AS INTEGER), id FROM books ORDER BY id
+    ''')
+    conn.execute('''
+        INSERT INTO circulation_events (event, occurred_at, patron_id, book_id, borrow_date, due_date)
+        SELECT event, occurred_at, patron_id, book_id, borrow_date, due_date FROM (
+            SELECT 'borrow' AS event, borrow_date AS occurred_at, patron_id, book_id, NULL AS borrow_date, due_date
+            FROM borrow_history
+            UNION ALL
+            SELECT 'return', return_date, patron_id, book_id, borrow_date, due_date FROM borrow_history
+            UNION ALL
+            SELECT 'borrow', borrow_date, patron_id, book_id, NULL, due_date FROM borrow_records
+        )
+        ORDER BY occurred_at, event
+    ''')
+    # Payments and refunds are looked up by their transaction or refund ID
+    conn.execute('''
+        CREATE INDEX idx_circulation_events_reference ON circulation_events (reference) WHERE reference IS NOT NULL
+    ''')
+
+    # Rows are never changed once written, so consumers can trust their offsets
+    for operation in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER trg_circulation_events_no_{operation.lower()} BEFORE {operation} ON circulation_events
+            BEGIN
+                SELECT RAISE(ABORT, 'circulation_events is append-only');
+            END
+        ''')
+
+def _migrate_circulation_stats(conn) -> None:
+    """
+    Add the circulation aggregates kept by services/analytics.py: loan counters
+    per book (book_stats) and per UTC day (daily_stats). They start empty and
+    are filled from the circulation event log.
+    """
+    counters = ', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in CIRCULATION_STATS)
+    conn.execute(f'CREATE TABLE book_stats (book_id INTEGER PRIMARY KEY, {counters})')
+    # Most-borrowed rankings read the top of this index
+    conn.execute('CREATE INDEX idx_book_stats_loans ON book_stats (loans DESC, book_id)')
+    conn.execute(f'CREATE TABLE daily_stats (day INTEGER PRIMARY KEY, {counters})')
+
+# Counters kept per book and per day by the circulation stats: loans started,
+# loans returned, total seconds the returned loans lasted, and returns after the due date
+CIRCULATION_STATS = ('loans', 'returns', 'loan_seconds', 'late_returns')
+
+# Migrations in order; a database at user_version N has had the first N applied
+_MIGRATIONS = [
+    _migrate_epoch_dates,
+    _migrate_patron_counters,
+    _migrate_loan_history,
+    _migrate_task_retries,
+    _migrate_holds,
+    _migrate_availability_changes,
+    _migrate_circulation_events,
+    _migrate_circulation_stats,
+]
+
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+def get_schema_version(conn) -> int:
+    """Number of migrations applied to the database behind conn."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def _schema_is_current(path: str) -> bool:
+    """Whether a database file has had every migration (a new, empty file has not)."""
+    conn = _connect(path)
+    try:
+        return get_schema_version(conn) == SCHEMA_VERSION
+    finally:
+        conn.close()
+
+def migrate_database() -> None:
+    """Apply any migrations the database has not had yet."""
+    conn = get_db_connection()
+    version = get_schema_version(conn)
     conn.close()
+    
+    while version < SCHEMA_VERSION:
+        with transaction() as conn:
+            # Re-check inside the write lock in case another process migrated first
+            version = get_schema_version(conn)
+            if version >= SCHEMA_VERSION:
+                break
+            _MIGRATIONS[version](conn)
+            version += 1
+            conn.execute(f'PRAGMA user_version = {version}')
+
+# Date Conversion Helpers
+#
+# borrow_records stores dates as integer seconds since the Unix epoch. Naive
+# datetimes are treated as local time, matching datetime.now().
+
+def to_epoch(value: datetime) -> int:
+    """Convert a datetime to integer epoch seconds."""
+    return int(value.timestamp())
+
+def from_epoch(value: int) -> datetime:
+    """Convert integer epoch seconds to a naive local datetime."""
+    return datetime.fromtimestamp(value)
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
@@ -61,19 +646,22 @@ def add_sample_data():
             ('1984', 'George Orwell', '9780451524935', 1)
         ]
         
+        now = to_epoch(datetime.now())
         for title, author, isbn, copies in sample_books:
-            conn.execute('''
+            book_id = conn.execute('''
                 INSERT INTO books (title, author, isbn, total_copies, available_copies)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
+            ''', (title, author, isbn, copies, copies)).lastrowid
+            _log_circulation_event(conn, 'add_book', now, book_id=book_id)
         
         # Make 1984 unavailable by adding a borrow record
+        borrow_date = to_epoch(datetime.now() - timedelta(days=5))
+        due_date = to_epoch(datetime.now() + timedelta(days=9))
         conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
+        ''', ('123456', 3, borrow_date, due_date))
+        _log_circulation_event(conn, 'borrow', borrow_date, '123456', 3, due_date=due_date)
         
         # Update available copies for 1984
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
@@ -84,32 +672,54 @@ def add_sample_data():
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
+@coalesced
+def get_all_books() -> List[Book]:
     """Get all books from the database."""
+    if _catalog_replica is not None:
+        return _catalog_replica.all_books()
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    books = conn.execute(f'SELECT {Book.COLUMNS} FROM books ORDER BY title').fetchall()
     conn.close()
-    return [dict(book) for book in books]
+    return [Book(*book) for book in books]
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
+def get_book_by_id(book_id: int) -> Optional[Book]:
     """Get a specific book by ID."""
+    if _catalog_replica is not None:
+        return _catalog_replica.get_by_id(book_id)
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    book = conn.execute(f'SELECT {Book.COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone()
     conn.close()
-    return dict(book) if book else None
+    return Book(*book) if book else None
 
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
+def get_books_by_ids(book_ids: List[int]) -> List[Book]:
+    """Get several books by ID, in the order the IDs were given (missing IDs are skipped)."""
+    if not book_ids:
+        return []
+    
+    conn = get_db_connection()
+    books = {}
+    for start in range(0, len(book_ids), 500):
+        chunk = book_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        for book in conn.execute(f'SELECT {Book.COLUMNS} FROM books WHERE id IN ({placeholders})', chunk):
+            books[book['id']] = Book(*book)
+    conn.close()
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
     """Get a specific book by ISBN."""
+    if _catalog_replica is not None:
+        return _catalog_replica.get_by_isbn(isbn)
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    book = conn.execute(f'SELECT {Book.COLUMNS} FROM books WHERE isbn = ?', (isbn,)).fetchone()
     conn.close()
-    return dict(book) if book else None
+    return Book(*book) if book else None
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
     records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+        SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date 
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ? AND br.return_date IS NULL
@@ -117,85 +727,918 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     ''', (patron_id,)).fetchall()
     conn.close()
     
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
+    now = to_epoch(datetime.now())
+    return [Loan(*record, now) for record in records]
+
+def get_borrowed_books_for_patrons(patron_ids: List[str]) -> Dict[str, List[Loan]]:
+    """
+    Get currently borrowed books for many patrons with set-based queries.
+    Returns a dict mapping each patron ID to a list shaped like get_patron_borrowed_books.
+    """
+    borrowed_books = {patron_id: [] for patron_id in patron_ids}
+    if not patron_ids:
+        return borrowed_books
+    
+    now = to_epoch(datetime.now())
+    conn = get_db_connection()
+    # Stay well below SQLite's limit on bound parameters per statement
+    for start in range(0, len(patron_ids), 500):
+        chunk = patron_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        records = conn.execute(f'''
+            SELECT br.patron_id, br.book_id, b.title, b.author, br.borrow_date, br.due_date 
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id IN ({placeholders}) AND br.return_date IS NULL
+            ORDER BY br.patron_id, br.borrow_date
+        ''', chunk).fetchall()
+        
+        for patron_id, *loan in records:
+            borrowed_books[patron_id].append(Loan(*loan, now))
+    conn.close()
     
     return borrowed_books
 
+def get_patron_history(patron_id: str, before_id: Optional[int] = None, limit: int = 20) -> List[Dict]:
+    """
+    Get one page of a patron's returned loans from borrow_history, most recent return first.
+
+    Pages are keyset-paginated on the history ID: pass the last 'id' of a page as
+    before_id to get the next one, so deep pages cost the same as the first.
+    """
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT bh.id, bh.book_id, b.title, b.author, bh.borrow_date, bh.due_date, bh.return_date 
+        FROM borrow_history bh 
+        JOIN books b ON bh.book_id = b.id 
+        WHERE bh.patron_id = ? AND bh.id < ?
+        ORDER BY bh.id DESC
+        LIMIT ?
+    ''', (patron_id, before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+    conn.close()
+    
+    return [{
+        'id': record['id'],
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': from_epoch(record['borrow_date']),
+        'due_date': from_epoch(record['due_date']),
+        'return_date': from_epoch(record['return_date'])
+    } for record in records]
+
+def get_existing_book_ids(book_ids: List[int]) -> Set[int]:
+    """Return the subset of the given book IDs that exist in the catalog."""
+    existing = set()
+    if not book_ids:
+        return existing
+    
+    conn = get_db_connection()
+    for start in range(0, len(book_ids), 500):
+        chunk = book_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        rows = conn.execute(f'SELECT id FROM books WHERE id IN ({placeholders})', chunk).fetchall()
+        existing.update(row['id'] for row in rows)
+    conn.close()
+    
+    return existing
+
+def get_patron_counters(patron_id: str) -> Dict:
+    """
+    Get a patron's maintained counters from the patrons table.
+    Patrons with no row yet have no loans and owe nothing.
+    """
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT active_loans, outstanding_fees FROM patrons WHERE patron_id = ?
+    ''', (patron_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return {'active_loans': 0, 'outstanding_fees': 0.0}
+    return {'active_loans': row['active_loans'], 'outstanding_fees': row['outstanding_fees']}
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
+    return get_patron_counters(patron_id)['active_loans']
+
+def _add_outstanding_fee(conn, patron_id: str, amount: float) -> None:
+    """
+    Add amount to the patron's outstanding_fees counter in conn's transaction:
+    a late fee assessed on return or a refund, or (negative) a payment.
+    """
+    if amount:
+        conn.execute('INSERT OR IGNORE INTO patrons (patron_id) VALUES (?)', (patron_id,))
+        conn.execute('''
+            UPDATE patrons SET outstanding_fees = ROUND(outstanding_fees + ?, 2) WHERE patron_id = ?
+        ''', (amount, patron_id))
+
+def _fees_from_log(conn) -> Dict[str, float]:
+    """
+    Each patron's outstanding fees recounted from the circulation log: fees
+    assessed on returns, less payments, plus refunds.
+    """
+    return {row['patron_id']: row['fees'] for row in conn.execute('''
+        SELECT patron_id, ROUND(SUM(CASE event WHEN 'payment' THEN -amount ELSE amount END), 2) AS fees
+        FROM circulation_events
+        WHERE event IN ('return', 'payment', 'refund') AND patron_id IS NOT NULL AND amount IS NOT NULL
+        GROUP BY patron_id
+    ''')}
+
+def reconcile_patron_counters(fix: bool = False) -> List[Dict]:
+    """
+    Check the patrons counters: active_loans against the open loans in
+    borrow_records, and outstanding_fees against the fees, payments and refunds
+    in the circulation log.
+
+    Args:
+        fix: Overwrite mismatched counters with the recounted values
+        
+    Returns:
+        list: one dict per mismatched patron with 'patron_id', 'active_loans'
+              and 'outstanding_fees' (the stored counters), and 'actual' and
+              'actual_fees' (the recounted values)
+    """
+    with transaction() as conn:
+        fees = _fees_from_log(conn)
+        stored = {row['patron_id']: (row['active_loans'], row['outstanding_fees']) for row in conn.execute(
+            'SELECT patron_id, active_loans, outstanding_fees FROM patrons')}
+        actual = {row['patron_id']: row['count'] for row in conn.execute('''
+            SELECT patron_id, COUNT(*) as count FROM borrow_records 
+            WHERE return_date IS NULL GROUP BY patron_id
+        ''')}
+        
+        mismatches = []
+        for patron_id in sorted(stored.keys() | actual.keys() | fees.keys()):
+            active_loans, outstanding_fees = stored.get(patron_id, (0, 0.0))
+            mismatch = {
+                'patron_id': patron_id, 'active_loans': active_loans, 'actual': actual.get(patron_id, 0),
+                'outstanding_fees': outstanding_fees, 'actual_fees': fees.get(patron_id, 0.0)
+            }
+            if (mismatch['active_loans'] != mismatch['actual']
+                    or round(mismatch['outstanding_fees'] - mismatch['actual_fees'], 2) != 0):
+                mismatches.append(mismatch)
+        
+        if fix:
+            for mismatch in mismatches:
+                conn.execute('INSERT OR IGNORE INTO patrons (patron_id) VALUES (?)', (mismatch['patron_id'],))
+                conn.execute('''
+                    UPDATE patrons SET active_loans = ?, outstanding_fees = ? WHERE patron_id = ?
+                ''', (mismatch['actual'], mismatch['actual_fees'], mismatch['patron_id']))
+    return mismatches
+
+# Availability Changes
+#
+# The availability_changes table (filled by a trigger on books) is the feed for
+# the availability event stream (services/availability_stream.py). seq orders
+# the changes across every process sharing the database.
+
+def get_availability_changes(after_seq: int, limit: int = 1000) -> List[Dict]:
+    """Up to limit availability changes after after_seq, oldest first: 'seq', 'book_id', 'available_copies'."""
     conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
+    rows = [dict(row) for row in conn.execute('''
+        SELECT seq, book_id, available_copies FROM availability_changes WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (after_seq, limit))]
     conn.close()
-    return count
+    return rows
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
+def latest_availability_change() -> int:
+    """seq of the newest availability change, or 0 if there are none."""
+    conn = get_db_connection()
+    seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM availability_changes').fetchone()[0]
+    conn.close()
+    return seq
+
+# Circulation Events
+#
+# circulation_events is an append-only log of borrows, returns, new books,
+# payments and refunds. Each event is written in the transaction that made the
+# change, so the log never disagrees with the tables. seq increases in commit
+# order (the log has a single writer at a time), so a
+# consumer that has read up to seq N only ever needs the events after N.
+
+CIRCULATION_EVENTS = ('borrow', 'return', 'add_book', 'payment', 'refund')
+
+_CIRCULATION_EVENT_COLUMNS = 'seq, event, occurred_at, patron_id, book_id, borrow_date, due_date, amount, reference'
+
+def _log_circulation_event(conn, event: str, occurred_at: int, patron_id: Optional[str] = None,
+                           book_id: Optional[int] = None, borrow_date: Optional[int] = None,
+                           due_date: Optional[int] = None, amount: Optional[float] = None,
+                           reference: Optional[str] = None) -> int:
+    """Append an event to the log in conn's transaction and return its seq. Dates are epoch seconds."""
+    return conn.execute('''
+        INSERT INTO circulation_events (event, occurred_at, patron_id, book_id, borrow_date, due_date, amount, reference)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (event, occurred_at, patron_id, book_id, borrow_date, due_date, amount, reference)).lastrowid
+
+def record_late_fee_payment(patron_id: str, book_id: int, amount: float, transaction_id: str) -> None:
+    """
+    Record a late fee paid at the gateway: log the payment and take it off the
+    patron's outstanding fees in one transaction. A transaction ID already
+    logged is skipped, so the write can be retried. Raises if the write fails.
+    """
+    def record(conn):
+        # A retried write whose first attempt did commit has nothing left to do
+        if conn.execute('''
+            SELECT 1 FROM circulation_events WHERE reference = ? AND event = 'payment'
+        ''', (transaction_id,)).fetchone() is not None:
+            return
+        _log_circulation_event(conn, 'payment', to_epoch(datetime.now()), patron_id, book_id,
+                               amount=amount, reference=transaction_id)
+        _add_outstanding_fee(conn, patron_id, -amount)
+    run_write(record)
+
+def record_late_fee_refund(transaction_id: str, amount: float, refund_id: str) -> None:
+    """
+    Record a refund of a late fee payment: log it against the payment's patron
+    and book and add it back to the patron's outstanding fees in one transaction.
+    A refund of a payment the log doesn't know is logged without a patron.
+
+    One payment can have several partial refunds, so each is logged under its
+    own refund_id, fixed before the first attempt. A refund_id already logged
+    is skipped, so the write can be retried. Raises if the write fails.
+    """
+    def record(conn):
+        # A retried write whose first attempt did commit has nothing left to do
+        if conn.execute('''
+            SELECT 1 FROM circulation_events WHERE reference = ? AND event = 'refund'
+        ''', (refund_id,)).fetchone() is not None:
+            return
+        payment = conn.execute('''
+            SELECT patron_id, book_id FROM circulation_events WHERE event = 'payment' AND reference = ?
+            ORDER BY seq LIMIT 1
+        ''', (transaction_id,)).fetchone()
+        patron_id, book_id = (payment['patron_id'], payment['book_id']) if payment else (None, None)
+        _log_circulation_event(conn, 'refund', to_epoch(datetime.now()), patron_id, book_id,
+                               amount=amount, reference=refund_id)
+        if patron_id is not None:
+            _add_outstanding_fee(conn, patron_id, amount)
+    run_write(record)
+
+def get_paid_late_fees(patron_id: str, book_id: int) -> float:
+    """Late fees paid, less refunds, on the patron's open loan of book_id (0 if there is none)."""
+    conn = get_db_connection()
+    paid = conn.execute('''
+        SELECT COALESCE(SUM(CASE event WHEN 'payment' THEN amount ELSE -amount END), 0)
+        FROM circulation_events
+        WHERE event IN ('payment', 'refund') AND patron_id = ? AND book_id = ? AND occurred_at >= (
+            SELECT MIN(borrow_date) FROM borrow_records
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        )
+    ''', (patron_id, book_id, patron_id, book_id)).fetchone()[0]
+    conn.close()
+    return round(paid, 2)
+
+def get_circulation_events(after_seq: int, limit: int = 1000, conn=None) -> List[Dict]:
+    """
+    Up to limit events after after_seq, oldest first. Dates are epoch seconds.
+    Pass conn to read inside an open transaction.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    rows = [dict(row) for row in conn.execute(f'''
+        SELECT {_CIRCULATION_EVENT_COLUMNS} FROM circulation_events WHERE seq > ? ORDER BY seq LIMIT ?
+    ''', (after_seq, limit))]
+    if own_conn:
+        conn.close()
+    return rows
+
+def latest_circulation_event() -> int:
+    """seq of the newest event in the log, or 0 if it is empty."""
+    conn = get_db_connection()
+    seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM circulation_events').fetchone()[0]
+    conn.close()
+    return seq
+
+def _books_added_between(conn, after_seq: int, latest: int) -> List[Book]:
+    return [Book(*row) for row in conn.execute(f'''
+        SELECT {', '.join(f'b.{column}' for column in Book.COLUMNS.split(', '))}
+        FROM circulation_events e JOIN books b ON b.id = e.book_id
+        WHERE e.seq > ? AND e.seq <= ? AND e.event = 'add_book'
+        ORDER BY e.seq
+    ''', (after_seq, latest))]
+
+def get_books_added_since(after_seq: int) -> Tuple[int, List[Book]]:
+    """
+    Books added, by any process, after event after_seq of the circulation log,
+    and the seq of the newest event read, to pass as after_seq next time.
+    In-memory indexes use this to pick up books added in other processes.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        latest = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM circulation_events').fetchone()[0]
+        books = _books_added_between(conn, after_seq, latest)
+        conn.commit()
+    finally:
+        conn.close()
+    return max(latest, after_seq), books
+
+def get_catalog_changes_since(after_seq: int) -> Tuple[int, List[Book], Set[int]]:
+    """
+    Like get_books_added_since, plus the IDs of books borrowed or returned, by
+    any process, after event after_seq. The search cache uses this to drop
+    results whose availability other processes have changed.
+    """
     conn = get_db_connection()
     try:
+        conn.execute('BEGIN')
+        latest = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM circulation_events').fetchone()[0]
+        books = _books_added_between(conn, after_seq, latest)
+        changed = {row[0] for row in conn.execute('''
+            SELECT DISTINCT book_id FROM circulation_events
+            WHERE seq > ? AND seq <= ? AND event IN ('borrow', 'return')
+        ''', (after_seq, latest))}
+        conn.commit()
+    finally:
+        conn.close()
+    return max(latest, after_seq), books, changed
+
+def get_consumer_offset(consumer: str, conn=None) -> int:
+    """seq of the last event the named consumer has processed (0 if it has not started)."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    row = conn.execute('SELECT last_seq FROM circulation_offsets WHERE consumer = ?', (consumer,)).fetchone()
+    if own_conn:
+        conn.close()
+    return row['last_seq'] if row else 0
+
+def save_consumer_offset(consumer: str, offset: int, conn=None) -> int:
+    """
+    Record that the named consumer has processed the log up to offset. Offsets
+    only move forward; returns the consumer's offset after the save. Pass conn
+    to save in the same transaction as the consumer's own writes.
+    """
+    def save(conn):
         conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
+            INSERT INTO circulation_offsets (consumer, last_seq, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (consumer) DO UPDATE SET
+                last_seq = MAX(last_seq, excluded.last_seq), updated_at = excluded.updated_at
+        ''', (consumer, offset, to_epoch(datetime.now())))
+        return conn.execute('SELECT last_seq FROM circulation_offsets WHERE consumer = ?', (consumer,)).fetchone()[0]
+
+    if conn is not None:
+        return save(conn)
+    return run_write(save)
+
+def delete_consumer_offset(consumer: str) -> bool:
+    """Forget the named consumer's offset; returns whether it had one."""
+    return run_write(lambda conn: conn.execute(
+        'DELETE FROM circulation_offsets WHERE consumer = ?', (consumer,)).rowcount > 0)
+
+def get_consumer_offsets() -> Dict[str, int]:
+    """Every consumer's saved offset, by name."""
+    conn = get_db_connection()
+    offsets = {row['consumer']: row['last_seq'] for row in conn.execute(
+        'SELECT consumer, last_seq FROM circulation_offsets ORDER BY consumer')}
+    conn.close()
+    return offsets
+
+# Circulation Stats
+#
+# book_stats and daily_stats hold running totals of CIRCULATION_STATS, kept up
+# to date from the circulation event log by services/analytics.py. A day is a
+# whole UTC day, numbered from the epoch (epoch seconds // SECONDS_PER_DAY).
+# Loans count on the day they started, returns on the day they ended.
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Sort expression and filter for each book ranking; rates need at least one return
+BOOK_STATS_RANKINGS = {
+    'loans': ('s.loans', '1'),
+    'utilization': ('s.loans * 1.0 / b.total_copies', '1'),
+    'loan_days': ('s.loan_seconds * 1.0 / s.returns', 's.returns > 0'),
+    'overdue_rate': ('s.late_returns * 1.0 / s.returns', 's.returns > 0'),
+}
+
+_BOOK_STATS_COLUMNS = 'b.id AS book_id, b.title, b.author, b.total_copies, ' + \
+    ', '.join(f'COALESCE(s.{column}, 0) AS {column}' for column in CIRCULATION_STATS)
+
+def add_circulation_stats(conn, by_book: Dict[int, List[int]], by_day: Dict[int, List[int]]) -> None:
+    """Add counter deltas (lists in CIRCULATION_STATS order) to book_stats and daily_stats in conn's transaction."""
+    columns = ', '.join(CIRCULATION_STATS)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in CIRCULATION_STATS)
+    for table, key, deltas in (('book_stats', 'book_id', by_book), ('daily_stats', 'day', by_day)):
+        conn.executemany(f'''
+            INSERT INTO {table} ({key}, {columns}) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT ({key}) DO UPDATE SET {updates}
+        ''', [(key_value, *counters) for key_value, counters in deltas.items()])
+
+def read_circulation_stats(conn) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+    """The stored counters by book ID and by day, as lists in CIRCULATION_STATS order."""
+    columns = ', '.join(CIRCULATION_STATS)
+    return tuple(
+        {row[0]: list(row[1:]) for row in conn.execute(f'SELECT {key}, {columns} FROM {table}')}
+        for table, key in (('book_stats', 'book_id'), ('daily_stats', 'day'))
+    )
+
+def replace_circulation_stats(conn, by_book: Dict[int, List[int]], by_day: Dict[int, List[int]]) -> None:
+    """Replace every stored counter with the given ones, in conn's transaction."""
+    conn.execute('DELETE FROM book_stats')
+    conn.execute('DELETE FROM daily_stats')
+    add_circulation_stats(conn, by_book, by_day)
+
+def compute_circulation_stats() -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Recount CIRCULATION_STATS by book ID and by day straight from the loan tables.
+    This reads the whole loan history.
+    """
+    by_book: Dict[int, List[int]] = {}
+    by_day: Dict[int, List[int]] = {}
+    conn = get_db_connection()
+    try:
+        for key, totals in (('book_id', by_book), (f'borrow_date / {SECONDS_PER_DAY}', by_day)):
+            for row in conn.execute(f'''
+                SELECT {key} AS k, COUNT(*) FROM (
+                    SELECT book_id, borrow_date FROM borrow_history
+                    UNION ALL
+                    SELECT book_id, borrow_date FROM borrow_records
+                ) GROUP BY k
+            '''):
+                totals.setdefault(row[0], [0, 0, 0, 0])[0] += row[1]
+        for key, totals in (('book_id', by_book), (f'return_date / {SECONDS_PER_DAY}', by_day)):
+            for row in conn.execute(f'''
+                SELECT {key} AS k, COUNT(*), SUM(return_date - borrow_date), SUM(return_date > due_date)
+                FROM borrow_history GROUP BY k
+            '''):
+                counters = totals.setdefault(row[0], [0, 0, 0, 0])
+                for index, value in enumerate(row[1:], start=1):
+                    counters[index] += value
+    finally:
+        conn.close()
+    return by_book, by_day
+
+def get_book_stats(book_id: int) -> Optional[Dict]:
+    """A book's title, author, total_copies and counters, or None if the book doesn't exist."""
+    conn = get_db_connection()
+    row = conn.execute(f'''
+        SELECT {_BOOK_STATS_COLUMNS} FROM books b LEFT JOIN book_stats s ON s.book_id = b.id WHERE b.id = ?
+    ''', (book_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_top_book_stats(ranking: str, limit: int) -> List[Dict]:
+    """The top limit books by one of BOOK_STATS_RANKINGS, highest first, with their counters."""
+    order, where = BOOK_STATS_RANKINGS[ranking]
+    conn = get_db_connection()
+    rows = [dict(row) for row in conn.execute(f'''
+        SELECT {_BOOK_STATS_COLUMNS} FROM book_stats s JOIN books b ON b.id = s.book_id
+        WHERE {where} ORDER BY {order} DESC, s.book_id LIMIT ?
+    ''', (limit,))]
+    conn.close()
+    return rows
+
+def get_daily_stats(first_day: int, last_day: int) -> Dict[int, Dict]:
+    """Counters for each day from first_day to last_day that had any circulation."""
+    conn = get_db_connection()
+    rows = {row['day']: dict(row) for row in conn.execute(f'''
+        SELECT day, {', '.join(CIRCULATION_STATS)} FROM daily_stats WHERE day BETWEEN ? AND ? ORDER BY day
+    ''', (first_day, last_day))}
+    conn.close()
+    return rows
+
+def get_stats_totals() -> Dict:
+    """Counters summed over every day."""
+    conn = get_db_connection()
+    row = conn.execute(f'''
+        SELECT {', '.join(f'COALESCE(SUM({column}), 0) AS {column}' for column in CIRCULATION_STATS)}
+        FROM daily_stats
+    ''').fetchone()
+    conn.close()
+    return dict(row)
+
+# Loan Export
+#
+# Bulk reads of the loan history for offline analysis (services/loan_export.py),
+# paced in short batches so they don't hold up writers.
+
+def iter_loan_batches(batch_size: int = 50000) -> Iterator[List[Tuple]]:
+    """
+    Yield every loan in batches of (patron_id, book_id, borrow_date, due_date,
+    return_date) tuples; return_date is None for open loans.
+
+    The loans are read as of one moment: the open loans and the newest history ID
+    are read together, then returned loans up to that ID in keyset-paginated
+    batches. Each batch is a short read of its own, so writers are never held
+    off for long, and loans returned meanwhile still appear once, as open.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM borrow_history').fetchone()[0]
+        open_loans = conn.execute('''
+            SELECT patron_id, book_id, borrow_date, due_date, NULL FROM borrow_records ORDER BY id
+        ''').fetchall()
+        conn.commit()
+
+        after_id = 0
+        while after_id < last_id:
+            rows = conn.execute('''
+                SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_history
+                WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+            ''', (after_id, last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            after_id = rows[-1]['id']
+            yield [tuple(row)[1:] for row in rows]
+        for start in range(0, len(open_loans), batch_size):
+            yield [tuple(row) for row in open_loans[start:start + batch_size]]
+    finally:
+        conn.close()
+
+# Task Retries
+#
+# Background tasks (services/task_executor.py) are persisted in task_retries
+# while they wait for another attempt. Payloads are JSON.
+
+def save_task_retry(task: str, payload: str, attempts: int, run_after: int,
+                    last_error: Optional[str] = None, status: str = 'pending',
+                    retry_id: Optional[int] = None) -> int:
+    """Insert a task retry, or overwrite retry_id's row; returns the row ID."""
+    with transaction() as conn:
+        cursor = conn.execute('''
+            INSERT OR REPLACE INTO task_retries (id, task, payload, attempts, run_after, status, last_error)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (retry_id, task, payload, attempts, run_after, status, last_error))
+        return cursor.lastrowid
+
+def has_due_task_retries(now: int) -> bool:
+    """Whether any pending retry is due by now; a read that takes no write lock."""
+    conn = get_db_connection()
+    due = conn.execute('''
+        SELECT 1 FROM task_retries WHERE status = 'pending' AND run_after <= ? LIMIT 1
+    ''', (now,)).fetchone() is not None
+    conn.close()
+    return due
+
+def claim_due_task_retries(now: int, limit: int, lease_until: int) -> List[Dict]:
+    """
+    Claim up to limit pending retries due by now, oldest first, by moving their
+    run_after to lease_until so other processes skip them. If the claiming
+    process stops before finishing one, it becomes due again at lease_until.
+    """
+    with transaction() as conn:
+        rows = [dict(row) for row in conn.execute('''
+            SELECT id, task, payload, attempts FROM task_retries
+            WHERE status = 'pending' AND run_after <= ? ORDER BY run_after, id LIMIT ?
+        ''', (now, limit))]
+        conn.executemany('UPDATE task_retries SET run_after = ? WHERE id = ?',
+                         ((lease_until, row['id']) for row in rows))
+        return rows
+
+def delete_task_retry(retry_id: int) -> None:
+    """Remove a retry whose task has now succeeded."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM task_retries WHERE id = ?', (retry_id,))
+
+def count_task_retries() -> Dict[str, int]:
+    """Number of task retries by status."""
+    conn = get_db_connection()
+    counts = {row['status']: row['count'] for row in conn.execute(
+        'SELECT status, COUNT(*) as count FROM task_retries GROUP BY status')}
+    conn.close()
+    return counts
+
+# Holds
+#
+# A patron can hold a book that has no copies available. The holds table is the
+# queue for each book, in the order holds were placed. return_books_bulk lends a
+# returned copy to the first holder who can take it, in the return's transaction.
+
+def insert_hold(patron_id: str, book_id: int, placed_at: datetime) -> bool:
+    """Add patron_id to the end of book_id's hold queue; False if they already hold it."""
+    def add_hold(conn):
+        return conn.execute('''
+            INSERT OR IGNORE INTO holds (patron_id, book_id, placed_at) VALUES (?, ?, ?)
+        ''', (patron_id, book_id, to_epoch(placed_at))).rowcount == 1
+    return run_write(add_hold)
+
+def delete_hold(patron_id: str, book_id: int) -> bool:
+    """Remove a patron's hold on a book; False if they had none."""
+    return run_write(lambda conn: conn.execute('''
+        DELETE FROM holds WHERE patron_id = ? AND book_id = ?
+    ''', (patron_id, book_id)).rowcount == 1)
+
+def get_patron_holds(patron_id: str) -> List[Dict]:
+    """
+    A patron's holds, oldest first: the hold 'id', 'book_id', 'title',
+    'placed_at', and the book's 'queue_length' and 'queue_version'.
+    services/hold_queue.py turns the hold ID into a position in the queue.
+    """
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT h.id, h.book_id, b.title, h.placed_at, q.length AS queue_length, q.version AS queue_version
+        FROM holds h
+        JOIN books b ON b.id = h.book_id
+        JOIN hold_queues q ON q.book_id = h.book_id
+        WHERE h.patron_id = ?
+        ORDER BY h.id
+    ''', (patron_id,)).fetchall()
+    conn.close()
+    
+    return [dict(record, placed_at=from_epoch(record['placed_at'])) for record in records]
+
+def get_hold_queue(book_id: int) -> Tuple[int, List[int]]:
+    """A book's queue version and its hold IDs in queue order, read from one snapshot."""
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN')
+        queue = conn.execute('SELECT version FROM hold_queues WHERE book_id = ?', (book_id,)).fetchone()
+        hold_ids = [row[0] for row in conn.execute('SELECT id FROM holds WHERE book_id = ? ORDER BY id', (book_id,))]
         conn.commit()
+    finally:
         conn.close()
-        return True
+    return (queue['version'] if queue else 0), hold_ids
+
+def _next_hold(conn, book_id: int, after_id: int = 0):
+    """The first hold on book_id placed after hold after_id, or None."""
+    return conn.execute('''
+        SELECT id, patron_id FROM holds WHERE book_id = ? AND id > ? ORDER BY id LIMIT 1
+    ''', (book_id, after_id)).fetchone()
+
+def _lend_to_holder(conn, hold, book_id: int, borrow_ts: int, due_ts: int, max_books: int) -> bool:
+    """
+    Lend a copy of book_id to the hold's patron and remove the hold, unless they
+    are at the borrowing limit. A hold on a book the patron has since borrowed
+    is dropped without lending another copy.
+    """
+    patron_id = hold['patron_id']
+    has_copy = conn.execute('''
+        SELECT 1 FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+    ''', (patron_id, book_id)).fetchone()
+    if has_copy:
+        conn.execute('DELETE FROM holds WHERE id = ?', (hold['id'],))
+        return False
+    
+    counters = conn.execute('SELECT active_loans FROM patrons WHERE patron_id = ?', (patron_id,)).fetchone()
+    if counters and counters['active_loans'] >= max_books:
+        return False
+    
+    conn.execute('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)
+    ''', (patron_id, book_id, borrow_ts, due_ts))
+    conn.execute('DELETE FROM holds WHERE id = ?', (hold['id'],))
+    _log_circulation_event(conn, 'borrow', borrow_ts, patron_id, book_id, due_date=due_ts)
+    return True
+
+def _fill_holds_in_transaction(conn, book_id: int, borrow_ts: int, due_ts: int,
+                               max_books: int) -> Optional[str]:
+    """
+    Walk book_id's queue in order for a holder who can take a returned copy and
+    lend it to them in conn's transaction.
+
+    Returns:
+        str: the patron the copy was lent to, or None
+    """
+    hold = _next_hold(conn, book_id)
+    while hold is not None:
+        if _lend_to_holder(conn, hold, book_id, borrow_ts, due_ts, max_books):
+            return hold['patron_id']
+        hold = _next_hold(conn, book_id, hold['id'])
+    return None
+
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
+    """Insert a new book into the database."""
+    def add(conn):
+        book_id = conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (title, author, isbn, total_copies, available_copies)).lastrowid
+        _log_circulation_event(conn, 'add_book', to_epoch(datetime.now()), book_id=book_id)
+        return book_id
+    
+    try:
+        book_id = run_write(add)
     except Exception as e:
-        conn.close()
         return False
+    
+    _notify_change('book_added', {
+        'id': book_id, 'title': title, 'author': author, 'isbn': isbn,
+        'total_copies': total_copies, 'available_copies': available_copies
+    })
+    return True
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
-    try:
+    def borrow(conn):
         conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
+        ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
+        _log_circulation_event(conn, 'borrow', to_epoch(borrow_date), patron_id, book_id,
+                               due_date=to_epoch(due_date))
+    
+    try:
+        run_write(borrow)
         return True
     except Exception as e:
-        conn.close()
         return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
+        run_write(lambda conn: conn.execute('''
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
-        return True
+        ''', (change, book_id)))
     except Exception as e:
-        conn.close()
         return False
+    
+    _notify_change('availability_changed', {'book_id': book_id, 'change': change})
+    return True
 
-def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
-    """Update the return date for a borrow record."""
-    conn = get_db_connection()
-    try:
+def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime,
+                                     late_fee: float = 0.0) -> bool:
+    """
+    Update the return date for a borrow record.
+    A late fee assessed for the return is added to the patron's outstanding fees
+    in the same transaction, if a loan was open to close.
+    """
+    def record_return(conn):
+        loans = conn.execute('''
+            SELECT borrow_date, due_date FROM borrow_records
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        ''', (patron_id, book_id)).fetchall()
         conn.execute('''
             UPDATE borrow_records 
             SET return_date = ? 
             WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
+        ''', (to_epoch(return_date), patron_id, book_id))
+        # The fee is charged once, with the first loan closed; nothing is charged if none was open
+        for index, loan in enumerate(loans):
+            fee = late_fee if index == 0 else None
+            _log_circulation_event(conn, 'return', to_epoch(return_date), patron_id, book_id,
+                                   loan['borrow_date'], loan['due_date'], fee)
+        if loans:
+            _add_outstanding_fee(conn, patron_id, late_fee)
+    
+    try:
+        run_write(record_return)
         return True
     except Exception as e:
-        conn.close()
         return False
+
+def iter_books_matching(search_term: str, search_type: str, after_id: int = 0,
+                        limit: Optional[int] = None, batch_size: int = 500) -> Iterator[Book]:
+    """
+    Yield books matching a search, in ID order, straight from the database cursor.
+
+    Title/author use case-insensitive partial matching, ISBN uses exact matching.
+    Rows are fetched in batches of ``batch_size`` so memory use does not grow
+    with the number of matches. ``after_id`` is the keyset cursor: only books
+    with a larger ID are returned.
+    """
+    column = {'title': 'title', 'author': 'author', 'isbn': 'isbn'}.get(search_type.lower())
+    if column is None:
+        return
+
+    if column == 'isbn':
+        where, term = 'isbn = ?', search_term
+    else:
+        where, term = f'instr(lower({column}), ?) > 0', search_term.lower()
+
+    query = f'SELECT {Book.COLUMNS} FROM books WHERE {where} AND id > ? ORDER BY id'
+    params = [term, after_id]
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield Book(*row)
+    finally:
+        conn.close()
+
+def borrow_books_bulk(patron_id: str, book_ids: List[int], borrow_date: datetime,
+                      due_date: datetime, max_books: int) -> List[Dict]:
+    """
+    Borrow several books for one patron in a single transaction.
+
+    The patron's loan count is read once and every item is checked against it,
+    so the borrowing limit holds for the whole batch. Returns one dict per book ID,
+    in order, with a 'status' of 'borrowed', 'not_found', 'unavailable' or 'limit'
+    and the book 'title' when the book exists.
+    """
+    results = []
+    with transaction() as conn:
+        counters = conn.execute('''
+            SELECT active_loans FROM patrons WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()
+        borrowed_count = counters['active_loans'] if counters else 0
+        
+        placeholders = ', '.join('?' * len(book_ids))
+        books = {
+            row['id']: dict(row) for row in conn.execute(
+                f'SELECT id, title, available_copies FROM books WHERE id IN ({placeholders})', book_ids)
+        }
+        
+        for book_id in book_ids:
+            book = books.get(book_id)
+            if book is None:
+                results.append({'book_id': book_id, 'status': 'not_found'})
+                continue
+            
+            if book['available_copies'] <= 0:
+                status = 'unavailable'
+            elif borrowed_count >= max_books:
+                status = 'limit'
+            else:
+                conn.execute('''
+                    INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                    VALUES (?, ?, ?, ?)
+                ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
+                conn.execute('''
+                    UPDATE books SET available_copies = available_copies - 1 WHERE id = ?
+                ''', (book_id,))
+                _log_circulation_event(conn, 'borrow', to_epoch(borrow_date), patron_id, book_id,
+                                       due_date=to_epoch(due_date))
+                book['available_copies'] -= 1
+                borrowed_count += 1
+                status = 'borrowed'
+            
+            results.append({'book_id': book_id, 'status': status, 'title': book['title']})
+    
+    for result in results:
+        if result['status'] == 'borrowed':
+            _notify_change('availability_changed', {'book_id': result['book_id'], 'change': -1})
+    return results
+
+def return_books_bulk(patron_id: str, book_ids: List[int], return_date: datetime,
+                      fee_for=None, hold_due_date: Optional[datetime] = None,
+                      max_books: Optional[int] = None) -> List[Dict]:
+    """
+    Return several books for one patron in a single transaction.
+
+    Each book ID closes the patron's oldest open loan for that book. Returns one
+    dict per book ID, in order, with a 'status' of 'returned', 'not_found' or
+    'not_borrowed', the book 'title' when it exists and the loan's due date
+    as epoch seconds ('due_ts') when it was returned. If fee_for(due_ts, return_ts)
+    is given, returned items also carry its 'late_fee', which is added to the
+    patron's outstanding fees in the same transaction.
+    
+    If hold_due_date is given, each returned copy is lent, in the same
+    transaction, to the first patron in the book's hold queue with fewer than
+    max_books loans, due at hold_due_date. Such items carry 'held_for', the
+    patron the copy went to; other returned copies become available.
+    """
+    results = []
+    with transaction() as conn:
+        placeholders = ', '.join('?' * len(book_ids))
+        titles = {
+            row['id']: row['title'] for row in conn.execute(
+                f'SELECT id, title FROM books WHERE id IN ({placeholders})', book_ids)
+        }
+        
+        for book_id in book_ids:
+            if book_id not in titles:
+                results.append({'book_id': book_id, 'status': 'not_found'})
+                continue
+            
+            record = conn.execute('''
+                SELECT id, borrow_date, due_date FROM borrow_records 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                ORDER BY borrow_date LIMIT 1
+            ''', (patron_id, book_id)).fetchone()
+            if record is None:
+                results.append({'book_id': book_id, 'status': 'not_borrowed', 'title': titles[book_id]})
+                continue
+            
+            conn.execute('''
+                UPDATE borrow_records SET return_date = ? WHERE id = ?
+            ''', (to_epoch(return_date), record['id']))
+            late_fee = fee_for(record['due_date'], to_epoch(return_date)) if fee_for is not None else None
+            _log_circulation_event(conn, 'return', to_epoch(return_date), patron_id, book_id,
+                                   record['borrow_date'], record['due_date'], late_fee)
+            result = {
+                'book_id': book_id,
+                'status': 'returned',
+                'title': titles[book_id],
+                'due_ts': record['due_date']
+            }
+            holder = None
+            if hold_due_date is not None:
+                holder = _fill_holds_in_transaction(
+                    conn, book_id, to_epoch(return_date), to_epoch(hold_due_date), max_books)
+            if holder is not None:
+                result['held_for'] = holder
+            else:
+                conn.execute('''
+                    UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+                ''', (book_id,))
+            if late_fee is not None:
+                result['late_fee'] = late_fee
+                _add_outstanding_fee(conn, patron_id, late_fee)
+            results.append(result)
+    
+    for result in results:
+        if result.get('held_for') is not None:
+            _notify_change('hold_filled', {'book_id': result['book_id'], 'patron_id': result['held_for']})
+        elif result['status'] == 'returned':
+            _notify_change('availability_changed', {'book_id': result['book_id'], 'change': 1})
+    return results
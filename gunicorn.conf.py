@@ -0,0 +1,40 @@
+"""
+Gunicorn settings for production serving. The Docker image runs the ASGI app
+on uvicorn workers:
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+The WSGI app on threaded workers serves only FLASK_WSGI_EVENT_STREAMS
+availability streams per worker at once:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+WEB_CONCURRENCY sets the number of worker processes, GUNICORN_THREADS the
+threads per threaded worker and BIND the listen address. App settings still
+come from FLASK_-prefixed environment variables.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Create the app once in the master, before forking; workers share its memory copy-on-write
+preload_app = True
+# No background task threads in the master: each worker starts its own after the fork
+os.environ.setdefault('FLASK_TASK_WORKERS_AFTER_FORK', 'true')
+
+# On SIGTERM, workers stop accepting connections and get this long to finish in-flight requests
+graceful_timeout = 30
+timeout = 30
+keepalive = 5
+
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    """Finish queued background tasks and group commit writes before the worker exits."""
+    from database import disable_group_commit
+    from services.task_executor import task_executor
+    task_executor.shutdown()
+    disable_group_commit()
@@ -0,0 +1,120 @@
+"""
+Record types for rows returned by the database helpers.
+
+Book and Loan use __slots__ instead of a per-row dict, and Loan converts its
+epoch-second dates to datetimes only when they are first read. Both behave
+like read-only dicts (book['title'], book.get('isbn'), dict(book), ==) so
+existing service code, templates and JSON responses keep working unchanged.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class Record:
+    """Read-only, dict-compatible base class for slotted row records."""
+
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, field) for field in self._fields]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self._fields]
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def _asdict(self) -> Dict:
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, Mapping)):
+            return self._asdict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{field}={getattr(self, field)!r}' for field in self._fields)
+        return f'{type(self).__name__}({fields})'
+
+
+Mapping.register(Record)
+
+
+class Book(Record):
+    """A row of the books table."""
+
+    __slots__ = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+    _fields = __slots__
+
+    # Column list matching the constructor's argument order
+    COLUMNS = 'id, title, author, isbn, total_copies, available_copies'
+
+    def __init__(self, id: int, title: str, author: str, isbn: str,
+                 total_copies: int, available_copies: int):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.total_copies = total_copies
+        self.available_copies = available_copies
+
+
+class Loan(Record):
+    """
+    A patron's open loan, as returned by get_patron_borrowed_books.
+    Dates are stored as the database's epoch seconds (borrow_ts, due_ts);
+    borrow_date and due_date are converted to datetimes the first time they are read.
+    """
+
+    __slots__ = ('book_id', 'title', 'author', 'borrow_ts', 'due_ts', '_now',
+                 '_borrow_date', '_due_date')
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date', 'borrow_ts', 'due_ts',
+               'is_overdue')
+
+    def __init__(self, book_id: int, title: str, author: str, borrow_ts: int, due_ts: int, now: int):
+        self.book_id = book_id
+        self.title = title
+        self.author = author
+        self.borrow_ts = borrow_ts
+        self.due_ts = due_ts
+        self._now = now
+        self._borrow_date: Optional[datetime] = None
+        self._due_date: Optional[datetime] = None
+
+    @property
+    def borrow_date(self) -> datetime:
+        if self._borrow_date is None:
+            self._borrow_date = datetime.fromtimestamp(self.borrow_ts)
+        return self._borrow_date
+
+    @property
+    def due_date(self) -> datetime:
+        if self._due_date is None:
+            self._due_date = datetime.fromtimestamp(self.due_ts)
+        return self._due_date
+
+    @property
+    def is_overdue(self) -> bool:
+        return self._now > self.due_ts
@@ -6,6 +6,9 @@ from .catalog_routes import catalog_bp
 from .borrowing_routes import borrowing_bp
 from .search_routes import search_bp
 from .api_routes import api_bp
+from .payment_routes import payment_bp
+from .events_routes import events_bp
+from .stats_routes import stats_bp
 
 def register_blueprints(app):
     """Register all route blueprints with the Flask app."""
@@ -13,3 +16,6 @@ def register_blueprints(app):
     app.register_blueprint(borrowing_bp)
     app.register_blueprint(search_bp)
     app.register_blueprint(api_bp)
+    app.register_blueprint(payment_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(stats_bp)
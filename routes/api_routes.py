@@ -2,11 +2,47 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+import json
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from database import (
+    get_circulation_events, get_consumer_offset, group_commit_stats, iter_books_matching, latest_circulation_event,
+    save_consumer_offset
+)
+from services.library_service import (
+    HISTORY_PAGE_SIZE, calculate_late_fee_for_book, calculate_late_fees_bulk, borrow_books_by_patron, cancel_hold,
+    get_hold_positions, get_patron_borrowing_history, place_hold, return_books_by_patron, search_books_in_catalog
+)
+from services.availability_stream import availability_broadcaster
+from services.catalog_replica import catalog_replica
+from services.circulation_log import log_stats
+from services.search_cache import cached_search, normalize_search, search_cache
+from services.single_flight import read_flights
+from services.suggest_index import suggest
+from services.task_executor import task_executor
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Largest page a client may request from the paginated search mode
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Search types the paginated and streaming modes support; they read books in ID
+# order, which doesn't fit fuzzy search's best-match-first ranking
+KEYSET_SEARCH_TYPES = ('title', 'author', 'isbn')
+
+# Most suggestions returned by the autocomplete endpoint
+MAX_SUGGESTIONS = 20
+
+# Largest number of pairs plus patrons accepted by one batch late fee request
+MAX_LATE_FEE_BATCH = 1000
+
+# Largest page a client may request from the borrowing history endpoint
+MAX_HISTORY_PAGE_SIZE = 100
+
+# Default and largest page of circulation events returned by the tail endpoint
+CIRCULATION_EVENTS_PAGE_SIZE = 100
+MAX_CIRCULATION_EVENTS_PAGE_SIZE = 1000
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
     """
@@ -16,11 +52,101 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/late_fees', methods=['POST'])
+def get_late_fees_bulk():
+    """
+    Calculate late fees for many patron/book pairs in one request.
+    Batch API endpoint for R5: Late Fee Calculation
+    
+    Expects a JSON body such as:
+        {"items": [{"patron_id": "123456", "book_id": 3}], "patron_ids": ["654321"]}
+    where "items" are individual loans and "patron_ids" are patrons whose
+    borrowed books should all be priced. Errors are reported per item.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON object body is required'}), 400
+    
+    items = data.get('items', [])
+    patron_ids = data.get('patron_ids', [])
+    if not isinstance(items, list) or not isinstance(patron_ids, list):
+        return jsonify({'error': 'items and patron_ids must be lists'}), 400
+    
+    if not items and not patron_ids:
+        return jsonify({'error': 'At least one item or patron ID is required'}), 400
+    
+    if len(items) + len(patron_ids) > MAX_LATE_FEE_BATCH:
+        return jsonify({'error': f'At most {MAX_LATE_FEE_BATCH} items and patrons per request'}), 400
+    
+    pairs = []
+    for item in items:
+        if (not isinstance(item, dict) or not isinstance(item.get('patron_id'), str)
+                or not isinstance(item.get('book_id'), int) or isinstance(item.get('book_id'), bool)):
+            return jsonify({'error': 'Each item needs a string patron_id and an integer book_id'}), 400
+        pairs.append((item['patron_id'], item['book_id']))
+    
+    # Use business logic function
+    results = calculate_late_fees_bulk(pairs, [str(patron_id) for patron_id in patron_ids])
+    
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'total_fee_amount': sum(result.get('fee_amount', 0.0) for result in results)
+    })
+
+@api_bp.route('/bulk_borrow', methods=['POST'])
+def bulk_borrow():
+    """
+    Borrow a stack of scanned books for one patron.
+    Bulk API endpoint for R3: Book Borrowing
+    
+    Expects a JSON body such as {"patron_id": "123456", "book_ids": [1, 2, 3]}.
+    """
+    return _bulk_circulation(borrow_books_by_patron)
+
+@api_bp.route('/bulk_return', methods=['POST'])
+def bulk_return():
+    """
+    Return a stack of scanned books for one patron.
+    Bulk API endpoint for R4: Book Return Processing
+    
+    Expects a JSON body such as {"patron_id": "123456", "book_ids": [1, 2, 3]}.
+    """
+    return _bulk_circulation(return_books_by_patron)
+
+def _bulk_circulation(process):
+    """Validate a bulk scan request body and run it through a bulk service function."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON object body is required'}), 400
+    
+    patron_id = data.get('patron_id', '')
+    book_ids = data.get('book_ids')
+    if (not isinstance(patron_id, str) or not isinstance(book_ids, list)
+            or not all(isinstance(book_id, int) and not isinstance(book_id, bool) for book_id in book_ids)):
+        return jsonify({'error': 'patron_id must be a string and book_ids a list of integers'}), 400
+    
+    # Use business logic function
+    success, message, results = process(patron_id.strip(), book_ids)
+    
+    return jsonify({
+        'success': success,
+        'message': message,
+        'results': results
+    }), 200 if success else 400
+
 @api_bp.route('/search')
 def search_books_api():
     """
     Search for books via API endpoint.
     Alternative API interface for R5: Book Search Functionality
+
+    Optional query parameters:
+        limit: page size for paginated results (1-100)
+        cursor: ID of the last book on the previous page
+        stream: when true, results are streamed as NDJSON (one book per line)
+
+    Paginated and streaming modes support the title, author and isbn types only.
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
@@ -28,8 +154,51 @@ def search_books_api():
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    try:
+        limit = _optional_int(request.args.get('limit', ''))
+        cursor = _optional_int(request.args.get('cursor', '')) or 0
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    
+    if limit is not None and not 1 <= limit <= MAX_SEARCH_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}'}), 400
+    
+    if cursor < 0:
+        return jsonify({'error': 'cursor must not be negative'}), 400
+    
+    # Searched and cached as the search compares them
+    term, kind = normalize_search(search_term, search_type)
+    
+    stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+    paginated = limit is not None or 'cursor' in request.args
+    if (stream or paginated) and kind not in KEYSET_SEARCH_TYPES:
+        return jsonify({'error': f'{search_type} search does not support limit, cursor or stream'}), 400
+    
+    # Streaming mode: one JSON object per line, read lazily from the database cursor
+    if stream:
+        books = iter_books_matching(term, kind, after_id=cursor, limit=limit)
+        lines = (json.dumps(book._asdict()) + '\n' for book in books)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    
+    # Paginated mode: keyset pagination on book ID
+    if paginated:
+        page_size = limit or MAX_SEARCH_PAGE_SIZE
+        books = cached_search(
+            term, kind,
+            lambda: list(iter_books_matching(term, kind, after_id=cursor, limit=page_size)),
+            page=(cursor, page_size)
+        )
+        next_cursor = books[-1]['id'] if len(books) == page_size else None
+        return jsonify({
+            'search_term': search_term,
+            'search_type': search_type,
+            'results': books,
+            'count': len(books),
+            'next_cursor': next_cursor
+        })
+    
+    # Use business logic function, answered from the result cache when possible
+    books = cached_search(term, kind, lambda: search_books_in_catalog(term, kind))
     
     return jsonify({
         'search_term': search_term,
@@ -37,3 +206,177 @@ def search_books_api():
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/suggest')
+def suggest_api():
+    """
+    Suggest titles and authors for a search box prefix.
+    Autocomplete companion to R6: Book Search Functionality
+    """
+    prefix = request.args.get('q', '').strip()
+    
+    try:
+        limit = _optional_int(request.args.get('limit', '')) or 10
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    return jsonify({
+        'query': prefix,
+        'suggestions': suggest(prefix, min(max(limit, 1), MAX_SUGGESTIONS))
+    })
+
+@api_bp.route('/patron/<patron_id>/history')
+def patron_history_api(patron_id):
+    """
+    Page through a patron's returned loans, most recent return first.
+    History section of R7: Patron Status Report
+
+    Optional query parameters:
+        limit: page size (1-100, default HISTORY_PAGE_SIZE)
+        cursor: 'next_cursor' from the previous page
+    """
+    try:
+        limit = _optional_int(request.args.get('limit', ''))
+        cursor = _optional_int(request.args.get('cursor', ''))
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    
+    if limit is None:
+        limit = HISTORY_PAGE_SIZE
+    if not 1 <= limit <= MAX_HISTORY_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_HISTORY_PAGE_SIZE}'}), 400
+    
+    # Use business logic function
+    success, message, page = get_patron_borrowing_history(patron_id, cursor, limit)
+    if not success:
+        return jsonify({'error': message}), 400
+    
+    return jsonify({
+        'patron_id': patron_id,
+        'history': page['history'],
+        'count': len(page['history']),
+        'next_cursor': page['next_cursor']
+    })
+
+@api_bp.route('/holds', methods=['POST'])
+def place_hold_api():
+    """
+    Put a patron in the hold queue for a book with no copies available.
+    The next copy returned is lent to the first patron in the queue.
+    
+    Expects a JSON body such as {"patron_id": "123456", "book_id": 3}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON object body is required'}), 400
+    
+    patron_id = data.get('patron_id', '')
+    book_id = data.get('book_id')
+    if not isinstance(patron_id, str) or not isinstance(book_id, int) or isinstance(book_id, bool):
+        return jsonify({'error': 'patron_id must be a string and book_id an integer'}), 400
+    
+    # Use business logic function
+    success, message = place_hold(patron_id.strip(), book_id)
+    
+    return jsonify({'success': success, 'message': message}), 201 if success else 400
+
+@api_bp.route('/holds/<patron_id>')
+def hold_positions_api(patron_id):
+    """
+    A patron's holds and their position in each queue, so clients can check
+    their place instead of retrying the borrow.
+    """
+    # Use business logic function
+    success, message, holds = get_hold_positions(patron_id)
+    if not success:
+        return jsonify({'error': message}), 400
+    
+    return jsonify({'patron_id': patron_id, 'holds': holds, 'count': len(holds)})
+
+@api_bp.route('/holds/<patron_id>/<int:book_id>', methods=['DELETE'])
+def cancel_hold_api(patron_id, book_id):
+    """Take a patron out of a book's hold queue."""
+    # Use business logic function
+    success, message = cancel_hold(patron_id, book_id)
+    
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400 if 'Invalid' in message else 404
+    return jsonify({'success': True, 'message': message})
+
+@api_bp.route('/circulation_events')
+def circulation_events_api():
+    """
+    Read the circulation event log from an offset, oldest event first.
+
+    Optional query parameters:
+        after: return events with a seq above this (default 0, or the consumer's saved offset)
+        consumer: a consumer name whose saved offset is used when 'after' is not given
+        limit: page size (1-1000, default 100)
+    
+    Pass 'next_offset' back as 'after' for the following page, and save it with
+    PUT /api/circulation_events/offsets/<consumer> once the events are processed.
+    """
+    try:
+        after = _optional_int(request.args.get('after', ''))
+        limit = _optional_int(request.args.get('limit', ''))
+    except ValueError:
+        return jsonify({'error': 'after and limit must be integers'}), 400
+    
+    if limit is None:
+        limit = CIRCULATION_EVENTS_PAGE_SIZE
+    if not 1 <= limit <= MAX_CIRCULATION_EVENTS_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_CIRCULATION_EVENTS_PAGE_SIZE}'}), 400
+    if after is None:
+        consumer = request.args.get('consumer', '').strip()
+        after = get_consumer_offset(consumer) if consumer else 0
+    if after < 0:
+        return jsonify({'error': 'after must not be negative'}), 400
+    
+    events = get_circulation_events(after, limit)
+    return jsonify({
+        'events': events,
+        'count': len(events),
+        'next_offset': events[-1]['seq'] if events else after
+    })
+
+@api_bp.route('/circulation_events/offsets')
+def circulation_offsets_api():
+    """The newest seq in the log, and each consumer's saved offset and lag."""
+    return jsonify(log_stats())
+
+@api_bp.route('/circulation_events/offsets/<consumer>', methods=['PUT'])
+def save_circulation_offset_api(consumer):
+    """
+    Save how far a consumer has processed the log. Offsets only move forward.
+    
+    Expects a JSON body such as {"offset": 120}.
+    """
+    data = request.get_json(silent=True)
+    offset = data.get('offset') if isinstance(data, dict) else None
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        return jsonify({'error': 'offset must be a non-negative integer'}), 400
+    if offset > latest_circulation_event():
+        return jsonify({'error': 'offset is past the end of the log'}), 400
+    
+    return jsonify({'consumer': consumer, 'offset': save_consumer_offset(consumer, offset)})
+
+@api_bp.route('/metrics')
+def metrics():
+    """Runtime counters for in-process caches and indexes."""
+    metrics = {
+        'search_cache': search_cache.stats(),
+        'single_flight': read_flights.stats(),
+        'tasks': task_executor.stats(),
+        'availability_stream': availability_broadcaster.stats(),
+        'circulation_log': log_stats(),
+        'startup': current_app.extensions.get('startup_timings', {})
+    }
+    if current_app.config.get('CATALOG_REPLICA'):
+        metrics['catalog_replica'] = catalog_replica.memory_report()
+    if current_app.config.get('GROUP_COMMIT'):
+        metrics['group_commit'] = group_commit_stats()
+    return jsonify(metrics)
+
+def _optional_int(value):
+    """Parse an optional integer query parameter, treating an empty value as absent."""
+    return int(value) if value.strip() else None
@@ -4,7 +4,7 @@ Catalog Routes - Book catalog related endpoints
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from database import get_all_books
-from library_service import add_book_to_catalog
+from services.library_service import add_book_to_catalog
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -0,0 +1,36 @@
+"""
+Events Routes - Server-Sent Events streams
+
+GET /events/availability pushes {"book_id", "available_copies"} whenever a
+book's available copies change, so the catalog page can update rows in place
+instead of being reloaded. Under a WSGI server each open stream holds a
+request thread, so only WSGI_EVENT_STREAMS are served at once per process and
+the rest are told to retry later; asgi.py serves the same stream on its event
+loop without a limit.
+"""
+
+from flask import Blueprint, Response, current_app, request
+from services.availability_stream import availability_broadcaster
+
+events_bp = Blueprint('events', __name__, url_prefix='/events')
+
+# Path asgi.py serves natively on the event loop
+AVAILABILITY_STREAM_PATH = '/events/availability'
+
+# Streams end after this long and the browser reconnects, resuming from the last
+# event it saw. Short under WSGI, where a stream holds one of the worker's threads.
+WSGI_STREAM_SECONDS = 25
+ASGI_STREAM_SECONDS = 300
+
+# Response headers for event streams; X-Accel-Buffering stops nginx buffering them
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+@events_bp.route('/availability')
+def availability_stream():
+    """
+    Stream availability changes as Server-Sent Events ('availability' events,
+    with the change's sequence number as the event ID).
+    """
+    stream = availability_broadcaster.stream(request.headers.get('Last-Event-ID'), WSGI_STREAM_SECONDS,
+                                             current_app.config['WSGI_EVENT_STREAMS'])
+    return Response(stream, mimetype='text/event-stream', headers=STREAM_HEADERS)
@@ -0,0 +1,93 @@
+"""
+Payment Routes - Async JSON endpoints for late fee payments, refunds and payment status
+
+The handlers are coroutines that await the payment gateway. Under a WSGI
+server Flask runs each view to completion on its request thread; asgi.py
+serves the same handlers on an event loop, where a pending payment doesn't
+hold a thread.
+"""
+
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Blueprint, jsonify, request
+from services.library_service import (
+    get_payment_status_async, pay_late_fees_async, refund_late_fee_payment_async
+)
+from services.payment_service import AsyncPaymentGateway
+
+payment_bp = Blueprint('payments', __name__, url_prefix='/api/payments')
+
+# Shared gateway client for the payment routes
+payment_gateway = AsyncPaymentGateway()
+
+
+async def pay_late_fees_handler(data: Dict) -> Tuple[Dict, int]:
+    """Pay the late fee on one borrowed book; data is {"patron_id", "book_id"}."""
+    patron_id = data.get('patron_id', '')
+    book_id = data.get('book_id')
+    if not isinstance(patron_id, str) or not isinstance(book_id, int) or isinstance(book_id, bool):
+        return {'error': 'patron_id must be a string and book_id an integer'}, 400
+    
+    success, message, transaction_id = await pay_late_fees_async(patron_id.strip(), book_id, payment_gateway)
+    return {'success': success, 'message': message, 'transaction_id': transaction_id}, 200 if success else 400
+
+async def refund_handler(data: Dict) -> Tuple[Dict, int]:
+    """Refund a late fee payment; data is {"transaction_id", "amount"}."""
+    transaction_id = data.get('transaction_id', '')
+    amount = data.get('amount')
+    if not isinstance(transaction_id, str) or not isinstance(amount, (int, float)) or isinstance(amount, bool):
+        return {'error': 'transaction_id must be a string and amount a number'}, 400
+    
+    success, message = await refund_late_fee_payment_async(transaction_id, float(amount), payment_gateway)
+    return {'success': success, 'message': message}, 200 if success else 400
+
+async def payment_status_handler(data: Dict) -> Tuple[Dict, int]:
+    """Status of a payment at the gateway; data is {"transaction_id"}."""
+    found, message, status = await get_payment_status_async(data['transaction_id'], payment_gateway)
+    return {'success': found, 'message': message, 'payment': status}, 200 if found else 404
+
+
+# (method, path pattern, handler) of every payment route; asgi.py serves them natively
+ASYNC_ROUTES = [
+    ('POST', re.compile(r'/api/payments/late_fees'), pay_late_fees_handler),
+    ('POST', re.compile(r'/api/payments/refunds'), refund_handler),
+    ('GET', re.compile(r'/api/payments/(?P<transaction_id>[^/]+)'), payment_status_handler),
+]
+
+def match_async_route(method: str, path: str) -> Optional[Tuple[Callable, Dict]]:
+    """The payment handler for a request and its path parameters, or None for other routes."""
+    for route_method, pattern, handler in ASYNC_ROUTES:
+        match = pattern.fullmatch(path)
+        if match and route_method == method:
+            return handler, match.groupdict()
+    return None
+
+
+@payment_bp.route('/late_fees', methods=['POST'])
+async def pay_late_fees():
+    """
+    Pay a patron's late fee for one book.
+    Expects a JSON body such as {"patron_id": "123456", "book_id": 1}.
+    """
+    return await _respond(pay_late_fees_handler, request.get_json(silent=True))
+
+@payment_bp.route('/refunds', methods=['POST'])
+async def refund_payment():
+    """
+    Refund a late fee payment.
+    Expects a JSON body such as {"transaction_id": "txn_123456_1700000000", "amount": 3.5}.
+    """
+    return await _respond(refund_handler, request.get_json(silent=True))
+
+@payment_bp.route('/<transaction_id>')
+async def payment_status(transaction_id):
+    """Look up a payment's status at the gateway."""
+    return await _respond(payment_status_handler, {'transaction_id': transaction_id})
+
+async def _respond(handler, data):
+    """Run a payment handler on a JSON object body and turn its result into a response."""
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON object body is required'}), 400
+    payload, status = await handler(data)
+    return jsonify(payload), status
@@ -3,7 +3,8 @@ Search Routes - Book search functionality
 """
 
 from flask import Blueprint, render_template, request, flash
-from library_service import search_books_in_catalog
+from services.library_service import search_books_in_catalog
+from services.search_cache import cached_search, normalize_search
 
 search_bp = Blueprint('search', __name__)
 
@@ -19,8 +20,9 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    # Use business logic function, answered from the result cache when possible
+    term, kind = normalize_search(search_term, search_type)
+    books = cached_search(term, kind, lambda: search_books_in_catalog(term, kind))
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
@@ -0,0 +1,78 @@
+"""
+Stats Routes - Circulation statistics JSON endpoints
+
+Served from the running totals in services/analytics.py, which are brought up
+to date with any new circulation before each answer.
+"""
+
+from flask import Blueprint, jsonify, request
+from database import BOOK_STATS_RANKINGS
+from services.analytics import (
+    TIME_BUCKETS, get_book_circulation, get_stats_summary, get_stats_timeline, get_top_books
+)
+
+stats_bp = Blueprint('stats', __name__, url_prefix='/api/stats')
+
+# Default and largest number of books in a ranking
+TOP_BOOKS_LIMIT = 10
+MAX_TOP_BOOKS_LIMIT = 100
+
+# Default and longest timeline, in days
+TIMELINE_DAYS = 30
+MAX_TIMELINE_DAYS = 3660
+
+@stats_bp.route('/summary')
+def stats_summary():
+    """Library-wide loans, returns, average loan length and overdue rate."""
+    return jsonify(get_stats_summary())
+
+@stats_bp.route('/top')
+def top_books():
+    """
+    Rank books by circulation.
+
+    Optional query parameters:
+        by: 'loans' (default), 'utilization' (loans per copy), 'loan_days' or 'overdue_rate'
+        limit: number of books (1-100, default 10)
+    """
+    ranking = request.args.get('by', 'loans')
+    if ranking not in BOOK_STATS_RANKINGS:
+        return jsonify({'error': f"by must be one of: {', '.join(BOOK_STATS_RANKINGS)}"}), 400
+    try:
+        limit = int(request.args.get('limit', TOP_BOOKS_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= MAX_TOP_BOOKS_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_TOP_BOOKS_LIMIT}'}), 400
+
+    books = get_top_books(ranking, limit)
+    return jsonify({'by': ranking, 'books': books, 'count': len(books)})
+
+@stats_bp.route('/timeline')
+def stats_timeline():
+    """
+    Circulation over time, oldest bucket first.
+
+    Optional query parameters:
+        bucket: 'day' (default), 'week' or 'month'
+        days: how many UTC days back from today to cover (1-3660, default 30)
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in TIME_BUCKETS:
+        return jsonify({'error': f"bucket must be one of: {', '.join(TIME_BUCKETS)}"}), 400
+    try:
+        days = int(request.args.get('days', TIMELINE_DAYS))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+    if not 1 <= days <= MAX_TIMELINE_DAYS:
+        return jsonify({'error': f'days must be between 1 and {MAX_TIMELINE_DAYS}'}), 400
+
+    return jsonify({'bucket': bucket, 'days': days, 'buckets': get_stats_timeline(bucket, days)})
+
+@stats_bp.route('/books/<int:book_id>')
+def book_stats(book_id):
+    """One book's loans, utilization, average loan length and overdue rate."""
+    book = get_book_circulation(book_id)
+    if book is None:
+        return jsonify({'error': 'Book not found'}), 404
+    return jsonify(book)
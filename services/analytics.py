@@ -0,0 +1,165 @@
+"""
+Analytics Module - Circulation statistics from running totals
+Loans, returns, loan lengths and late returns are counted per book and per
+UTC day in book_stats and daily_stats. A circulation log consumer adds each
+new borrow and return to the totals, so rankings, per-title figures and
+timelines are read from small tables instead of the whole loan history.
+rebuild_stats() recounts the totals from the loan tables to check them.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import database
+from services.circulation_log import CirculationConsumer
+from services.task_executor import register_task
+
+# Name the totals' progress through the circulation log is saved under
+STATS_CONSUMER = 'circulation_stats'
+
+# How timeline days can be grouped
+TIME_BUCKETS = ('day', 'week', 'month')
+
+
+def _tally(events: List[Dict]) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+    """Counter deltas by book ID and by day for a batch of events (in CIRCULATION_STATS order)."""
+    by_book: Dict[int, List[int]] = {}
+    by_day: Dict[int, List[int]] = {}
+    for event in events:
+        if event['event'] == 'borrow':
+            delta = (1, 0, 0, 0)
+        elif event['event'] == 'return':
+            loan_seconds = event['occurred_at'] - event['borrow_date'] if event['borrow_date'] is not None else 0
+            late = int(event['due_date'] is not None and event['occurred_at'] > event['due_date'])
+            delta = (0, 1, loan_seconds, late)
+        else:
+            continue
+        for totals, key in ((by_book, event['book_id']), (by_day, event['occurred_at'] // database.SECONDS_PER_DAY)):
+            counters = totals.setdefault(key, [0, 0, 0, 0])
+            for index, value in enumerate(delta):
+                counters[index] += value
+    return by_book, by_day
+
+
+def _apply_events(conn, events: List[Dict]) -> None:
+    database.add_circulation_stats(conn, *_tally(events))
+
+
+# Keeps book_stats and daily_stats current from the circulation log
+stats_consumer = CirculationConsumer(STATS_CONSUMER, _apply_events)
+
+
+@register_task('refresh_circulation_stats')
+def refresh_stats() -> int:
+    """Add any circulation not yet counted to the totals; returns how many events were applied."""
+    if stats_consumer.lag() <= 0:
+        return 0
+    return stats_consumer.catch_up()
+
+
+def _with_rates(counters: Dict) -> Dict:
+    """Counters plus the average loan length in days and the share of returns that were late."""
+    returns = counters['returns']
+    result = dict(counters)
+    result['avg_loan_days'] = round(counters['loan_seconds'] / returns / database.SECONDS_PER_DAY, 2) if returns else None
+    result['overdue_rate'] = round(counters['late_returns'] / returns, 4) if returns else None
+    return result
+
+
+def _book_with_rates(book: Dict) -> Dict:
+    result = _with_rates(book)
+    result['utilization'] = round(book['loans'] / book['total_copies'], 2) if book['total_copies'] else None
+    return result
+
+
+def get_stats_summary() -> Dict:
+    """Library-wide totals and rates, and the log seq they are current to."""
+    refresh_stats()
+    summary = _with_rates(database.get_stats_totals())
+    summary['as_of_seq'] = stats_consumer.offset()
+    return summary
+
+
+def get_top_books(ranking: str, limit: int) -> List[Dict]:
+    """
+    The top books by a ranking in database.BOOK_STATS_RANKINGS: 'loans' (most
+    borrowed), 'utilization' (loans per copy), 'loan_days' (longest average
+    loan) or 'overdue_rate' (largest share of late returns).
+    """
+    refresh_stats()
+    return [_book_with_rates(book) for book in database.get_top_book_stats(ranking, limit)]
+
+
+def get_book_circulation(book_id: int) -> Optional[Dict]:
+    """One book's totals and rates, or None if the book doesn't exist."""
+    refresh_stats()
+    book = database.get_book_stats(book_id)
+    return _book_with_rates(book) if book else None
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def get_stats_timeline(bucket: str, days: int, today: Optional[date] = None) -> List[Dict]:
+    """
+    Totals and rates for the last `days` UTC days (ending today), grouped into
+    day, week (starting Monday) or month buckets, oldest first. Buckets with no
+    circulation are included with zero counts.
+    """
+    refresh_stats()
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    epoch = date(1970, 1, 1)
+    last_day = (today - epoch).days
+    first_day = last_day - days + 1
+    rows = database.get_daily_stats(first_day, last_day)
+
+    buckets: Dict[date, Dict] = {}
+    for day_number in range(first_day, last_day + 1):
+        start = _bucket_start(epoch + timedelta(days=day_number), bucket)
+        counters = buckets.setdefault(start, dict.fromkeys(database.CIRCULATION_STATS, 0))
+        row = rows.get(day_number)
+        if row:
+            for column in database.CIRCULATION_STATS:
+                counters[column] += row[column]
+    return [dict(_with_rates(counters), start=start.isoformat()) for start, counters in buckets.items()]
+
+
+def rebuild_stats(fix: bool = True) -> List[Dict]:
+    """
+    Recount the totals from the loan tables and compare them with the running
+    totals. Writes wait while this runs, so both cover the same loans.
+
+    Args:
+        fix: Replace the running totals with the recounted ones when they differ
+
+    Returns:
+        list: one dict per differing book or day with 'scope' ('book' or 'day'),
+              'key' (book ID or ISO date), 'stored' and 'actual' counters
+    """
+    with database.transaction() as conn:
+        # Count everything already in the log, so both sides cover the same events
+        stats_consumer.catch_up(conn=conn)
+        stored = database.read_circulation_stats(conn)
+        actual = database.compute_circulation_stats()
+
+        differences = []
+        for scope, stored_totals, actual_totals in zip(('book', 'day'), stored, actual):
+            for key in sorted(stored_totals.keys() | actual_totals.keys()):
+                before = stored_totals.get(key, [0, 0, 0, 0])
+                after = actual_totals.get(key, [0, 0, 0, 0])
+                if before != after:
+                    differences.append({
+                        'scope': scope,
+                        'key': key if scope == 'book' else (date(1970, 1, 1) + timedelta(days=key)).isoformat(),
+                        'stored': dict(zip(database.CIRCULATION_STATS, before)),
+                        'actual': dict(zip(database.CIRCULATION_STATS, after))
+                    })
+        if fix and differences:
+            database.replace_circulation_stats(conn, *actual)
+    return differences
@@ -0,0 +1,45 @@
+"""
+Async Database Module - Awaitable access to the blocking database helpers
+sqlite3 calls block, so coroutines run them on a small dedicated thread pool
+instead of on the event loop. The database work behind a request is a few
+milliseconds; what async routes wait on for long is the payment gateway.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Threads running database calls for coroutines
+DEFAULT_DB_THREADS = 8
+
+
+def _new_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=DEFAULT_DB_THREADS, thread_name_prefix='async-db')
+
+
+_executor = _new_executor()
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Await fn(*args, **kwargs) run on the database thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    """Finish queued database calls and stop the pool's threads (a new pool starts on next use)."""
+    global _executor
+    executor, _executor = _executor, _new_executor()
+    executor.shutdown(wait=wait)
+
+
+def _reset_after_fork() -> None:
+    # The parent's pool threads don't exist in a forked worker
+    global _executor
+    _executor = _new_executor()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,294 @@
+"""
+Availability Stream Module - Server-Sent Events for catalog availability
+A trigger on books records every change to available_copies in the
+availability_changes table, whichever process made it. One poller thread per
+process reads the new rows and formats each change once as an SSE message.
+Every connected client then sends the same bytes: threaded WSGI streams wait
+on a condition variable, and ASGI streams on one asyncio event per event loop.
+A threaded stream ties up a request thread, so their number can be capped.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from database import add_change_listener, get_availability_changes, latest_availability_change
+from services.async_db import run_blocking
+
+# How often the poller checks for changes made by other processes (changes in
+# this process wake it straight away)
+DEFAULT_POLL_SECONDS = 0.25
+
+# Recent messages kept in memory for clients that fall behind or reconnect
+DEFAULT_BUFFER_SIZE = 1000
+
+# Comment line sent when nothing has changed, so proxies keep the connection open
+HEARTBEAT_SECONDS = 15
+
+# How long the browser waits before reconnecting after a stream ends
+RETRY_MILLISECONDS = 3000
+
+# How long the browser waits before trying again when this process is already
+# serving as many threaded streams as it allows
+BUSY_RETRY_MILLISECONDS = 60000
+
+# Sent instead of changes a client can no longer catch up on; the page reloads
+RESYNC_MESSAGE = 'event: resync\ndata: {}\n\n'
+
+
+def _format(change: Dict) -> str:
+    data = json.dumps({'book_id': change['book_id'], 'available_copies': change['available_copies']})
+    return f"id: {change['seq']}\nevent: availability\ndata: {data}\n\n"
+
+
+def _parse_event_id(last_event_id) -> Optional[int]:
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        return None
+
+
+class AvailabilityBroadcaster:
+    """Fans availability changes out to every connected event stream in the process."""
+
+    def __init__(self, poll_interval: float = DEFAULT_POLL_SECONDS, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self._condition = threading.Condition()
+        self._wake = threading.Event()
+        # Recent changes' seqs, in order, and their formatted messages
+        self._seqs: List[int] = []
+        self._messages: List[str] = []
+        # Newest seq seen, and the seq just before the oldest buffered message
+        self._last_seq: Optional[int] = None
+        self._floor = 0
+        self._clients = 0
+        # Streams currently holding a request thread (WSGI)
+        self._thread_streams = 0
+        self._thread: Optional[threading.Thread] = None
+        # Per event loop: [asyncio.Event replaced on every publish, number of clients]
+        self._loops: Dict[asyncio.AbstractEventLoop, list] = {}
+        self._stats = {'published': 0, 'polls': 0, 'resyncs': 0, 'refused': 0}
+
+    def stats(self) -> Dict:
+        """
+        Connected clients (thread_streams of them holding a request thread) and
+        counters for published messages, polls, resyncs and refused streams.
+        """
+        with self._condition:
+            return dict(self._stats, clients=self._clients, thread_streams=self._thread_streams)
+
+    def reset(self) -> None:
+        """Drop the buffered messages and start again from the newest change on the next poll."""
+        with self._condition:
+            self._last_seq = None
+            self._seqs.clear()
+            self._messages.clear()
+
+    def wake(self) -> None:
+        """Poll now instead of at the next interval."""
+        self._wake.set()
+
+    def poll(self) -> int:
+        """Read new changes from the database and publish them; returns how many."""
+        with self._condition:
+            last_seq = self._last_seq
+        if last_seq is None:
+            latest = latest_availability_change()
+            with self._condition:
+                self._last_seq = self._floor = latest
+            return 0
+
+        changes = get_availability_changes(last_seq, self.buffer_size)
+        with self._condition:
+            self._stats['polls'] += 1
+            if not changes or self._last_seq != last_seq:
+                return 0
+            self._seqs.extend(change['seq'] for change in changes)
+            self._messages.extend(_format(change) for change in changes)
+            if len(self._seqs) > self.buffer_size:
+                dropped = len(self._seqs) - self.buffer_size
+                self._floor = self._seqs[dropped - 1]
+                del self._seqs[:dropped]
+                del self._messages[:dropped]
+            self._last_seq = changes[-1]['seq']
+            self._stats['published'] += len(changes)
+            self._condition.notify_all()
+            loops = list(self._loops)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:
+                # The loop has been closed
+                pass
+        return len(changes)
+
+    def _wake_loop(self, loop) -> None:
+        # Runs on the event loop: wake every client of this loop waiting on the current event
+        entry = self._loops.get(loop)
+        if entry is not None:
+            event, entry[0] = entry[0], asyncio.Event()
+            event.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._condition:
+                if self._clients == 0:
+                    self._thread = None
+                    return
+            try:
+                self.poll()
+            except Exception:
+                # The database may be briefly busy; try again on the next poll
+                pass
+
+    def _connect(self, last_event_id) -> int:
+        """Register a client and return the seq its stream starts after."""
+        with self._condition:
+            self._clients += 1
+            if self._thread is None:
+                self._last_seq = None
+                self._seqs.clear()
+                self._messages.clear()
+                self._thread = threading.Thread(target=self._run, name='availability-stream', daemon=True)
+                self._thread.start()
+        if self._last_seq is None:
+            self.poll()
+        cursor = _parse_event_id(last_event_id)
+        return self._last_seq if cursor is None else cursor
+
+    def _disconnect(self) -> None:
+        with self._condition:
+            self._clients -= 1
+
+    def _buffered_after(self, cursor: int) -> Tuple[Optional[List[str]], int]:
+        """Buffered messages after cursor, or None if the buffer no longer reaches back that far."""
+        with self._condition:
+            if self._last_seq is None or cursor >= self._last_seq:
+                return [], cursor
+            if cursor < self._floor:
+                return None, cursor
+            return self._messages[bisect_right(self._seqs, cursor):], self._last_seq
+
+    def _catch_up(self, cursor: int) -> Tuple[List[str], int]:
+        """Changes after cursor read from the database, for a client older than the buffer."""
+        changes = get_availability_changes(cursor, self.buffer_size)
+        if not changes or changes[0]['seq'] > cursor + 1:
+            # Pruned from the table (or from another database): the client starts over
+            with self._condition:
+                self._stats['resyncs'] += 1
+                last_seq = self._last_seq
+            return [RESYNC_MESSAGE], last_seq if last_seq is not None else cursor
+        return [_format(change) for change in changes], changes[-1]['seq']
+
+    def stream(self, last_event_id=None, max_seconds: Optional[float] = None,
+               max_streams: Optional[int] = None) -> Iterator[str]:
+        """
+        SSE text for one client on a thread, for a WSGI response. Starts after
+        last_event_id (the browser's Last-Event-ID) when given, otherwise with the
+        next change. Ends after max_seconds; the browser then reconnects.
+
+        Each stream holds its thread for as long as it is open. Once max_streams
+        are open in this process, further streams only tell the browser to try
+        again in BUSY_RETRY_MILLISECONDS, leaving the other threads for requests.
+        """
+        with self._condition:
+            busy = max_streams is not None and self._thread_streams >= max_streams
+            if busy:
+                self._stats['refused'] += 1
+            else:
+                self._thread_streams += 1
+        if busy:
+            yield f'retry: {BUSY_RETRY_MILLISECONDS}\n\n'
+            return
+        
+        try:
+            cursor = self._connect(last_event_id)
+            deadline = time.monotonic() + max_seconds if max_seconds else None
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+            while deadline is None or time.monotonic() < deadline:
+                messages, cursor = self._buffered_after(cursor)
+                if messages is None:
+                    messages, cursor = self._catch_up(cursor)
+                if messages:
+                    yield ''.join(messages)
+                    continue
+                timeout = HEARTBEAT_SECONDS
+                if deadline is not None:
+                    timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+                with self._condition:
+                    changed = self._condition.wait_for(
+                        lambda: self._last_seq is not None and self._last_seq > cursor, timeout)
+                if not changed:
+                    yield ': keep-alive\n\n'
+        finally:
+            with self._condition:
+                self._thread_streams -= 1
+            self._disconnect()
+
+    async def stream_async(self, last_event_id=None, max_seconds: Optional[float] = None,
+                           stop: Optional[asyncio.Event] = None) -> AsyncIterator[str]:
+        """
+        SSE text for one client on an event loop, for an ASGI response. Same
+        messages as stream(); also ends when stop is set (client disconnected).
+        """
+        loop = asyncio.get_running_loop()
+        cursor = await run_blocking(self._connect, last_event_id)
+        entry = self._loops.setdefault(loop, [asyncio.Event(), 0])
+        entry[1] += 1
+        deadline = loop.time() + max_seconds if max_seconds else None
+        try:
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+            while (deadline is None or loop.time() < deadline) and not (stop and stop.is_set()):
+                # Take the event before checking, so a publish in between still wakes us
+                event = entry[0]
+                messages, cursor = self._buffered_after(cursor)
+                if messages is None:
+                    messages, cursor = await run_blocking(self._catch_up, cursor)
+                if messages:
+                    yield ''.join(messages)
+                    continue
+                timeout = HEARTBEAT_SECONDS
+                if deadline is not None:
+                    timeout = max(0.0, min(timeout, deadline - loop.time()))
+                waiters = [asyncio.ensure_future(event.wait())]
+                if stop is not None:
+                    waiters.append(asyncio.ensure_future(stop.wait()))
+                done, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in pending:
+                    waiter.cancel()
+                if not done:
+                    yield ': keep-alive\n\n'
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._loops.pop(loop, None)
+            self._disconnect()
+
+
+# Shared broadcaster for the app; its poller runs only while clients are connected
+availability_broadcaster = AvailabilityBroadcaster()
+
+
+def _on_catalog_change(event: str, data: Dict) -> None:
+    if event == 'availability_changed':
+        availability_broadcaster.wake()
+    elif event == 'reset':
+        # Start again from the new database's newest change
+        availability_broadcaster.reset()
+
+
+add_change_listener(_on_catalog_change)
+
+if hasattr(os, 'register_at_fork'):
+    # The parent's poller thread and clients don't exist in a forked worker
+    os.register_at_fork(after_in_child=availability_broadcaster._reset_state)
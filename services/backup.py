@@ -0,0 +1,169 @@
+"""
+Backup Module - Online snapshots of the live database
+Copies the database file with SQLite's backup API a few pages at a time,
+pausing between steps so live requests keep getting the database, then keeps
+the newest snapshots and removes older ones. Snapshots can be gzip-compressed.
+
+The copy is made inside one read transaction, so it is the database as of the
+moment the backup started. In WAL mode writers carry on during the copy; with
+a rollback journal they wait for it to finish, so the copy then runs without
+pauses.
+"""
+
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database
+
+# Pages copied per backup step, and the pause after each step
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_PAUSE_SECONDS = 0.005
+
+# Snapshots kept by create_snapshot unless told otherwise
+DEFAULT_KEEP = 7
+
+# Snapshot directory names: the time the snapshot was taken, plus '-N' if that name was taken
+SNAPSHOT_FORMAT = '%Y%m%d-%H%M%S'
+
+
+@contextmanager
+def _read_snapshot(source: str):
+    """Open source and hold one read transaction on it for the block; yields the connection."""
+    conn = sqlite3.connect(source, uri=True)
+    try:
+        conn.execute('BEGIN')
+        # The read transaction starts with the first read
+        conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        yield conn
+    finally:
+        conn.close()
+
+
+def _copy(conn: sqlite3.Connection, destination: str, pages: int, pause: float) -> Dict:
+    """Copy the database behind conn to destination, `pages` pages per step."""
+    # Only WAL writers carry on during the copy; a rollback journal copy has them waiting
+    wal = conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    state = {'steps': 0}
+
+    def progress(status, remaining, total):
+        state['steps'] += 1
+        if wal:
+            time.sleep(pause)
+
+    destination_conn = sqlite3.connect(destination)
+    try:
+        conn.backup(destination_conn, pages=pages, progress=progress)
+    finally:
+        destination_conn.close()
+    return {'steps': state['steps'], 'paused': wal, 'bytes': os.path.getsize(destination)}
+
+
+def backup_database(source: str, destination: str, pages: int = DEFAULT_PAGES_PER_STEP,
+                    pause: float = DEFAULT_STEP_PAUSE_SECONDS) -> Dict:
+    """
+    Copy a live database file to destination with the SQLite backup API.
+
+    Copies `pages` pages per step from a read transaction held for the whole
+    copy, so concurrent writes never restart it. In WAL mode it sleeps `pause`
+    seconds between steps and writers are never held off.
+
+    Returns:
+        dict: 'steps', 'paused' (whether it paused between steps) and 'bytes' of the copy
+    """
+    with _read_snapshot(source) as conn:
+        return _copy(conn, destination, pages, pause)
+
+
+def _compress(path: str) -> str:
+    """Gzip path next to itself and remove the original."""
+    compressed = path + '.gz'
+    with open(path, 'rb') as plain, gzip.open(compressed, 'wb') as packed:
+        shutil.copyfileobj(plain, packed)
+    os.remove(path)
+    return compressed
+
+
+def _snapshot_key(name: str) -> Optional[Tuple[datetime, int]]:
+    """(time taken, collision suffix) of a snapshot directory name, or None for other names."""
+    base, suffix = name, '0'
+    if name.count('-') > SNAPSHOT_FORMAT.count('-'):
+        base, suffix = name.rsplit('-', 1)
+    try:
+        return datetime.strptime(base, SNAPSHOT_FORMAT), int(suffix)
+    except ValueError:
+        return None
+
+
+def list_snapshots(directory: str) -> List[str]:
+    """Snapshot directories under directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in os.listdir(directory):
+        key = _snapshot_key(name)
+        if key is not None and os.path.isdir(os.path.join(directory, name)):
+            snapshots.append((key, name))
+    return [os.path.join(directory, name) for _, name in sorted(snapshots)]
+
+
+def rotate_snapshots(directory: str, keep: int = DEFAULT_KEEP) -> List[str]:
+    """Delete all but the newest `keep` snapshots; returns the deleted paths."""
+    snapshots = list_snapshots(directory)
+    expired = snapshots[:-keep] if keep > 0 else snapshots
+    for path in expired:
+        shutil.rmtree(path)
+    return expired
+
+
+def create_snapshot(directory: str, compress: bool = False, keep: Optional[int] = DEFAULT_KEEP,
+                    pages: int = DEFAULT_PAGES_PER_STEP, pause: float = DEFAULT_STEP_PAUSE_SECONDS,
+                    now: Callable[[], datetime] = datetime.now) -> Dict:
+    """
+    Back up the database into a new timestamped directory under `directory`,
+    then rotate old snapshots.
+
+    Args:
+        directory: Where snapshots are kept
+        compress: Gzip the copied file
+        keep: Number of snapshots to keep (None keeps all)
+        pages, pause: Pages per step and the pause between steps, as for backup_database
+
+    Returns:
+        dict: 'path' of the snapshot, per-file 'files' results, total 'bytes',
+              'seconds' taken and the 'removed' old snapshots
+    """
+    started = time.perf_counter()
+    taken = now()
+    path = os.path.join(directory, taken.strftime(SNAPSHOT_FORMAT))
+    suffix = 1
+    # Creating the directory claims the name, even against a backup started in another process
+    while True:
+        try:
+            os.makedirs(path)
+            break
+        except FileExistsError:
+            path = os.path.join(directory, f'{taken.strftime(SNAPSHOT_FORMAT)}-{suffix}')
+            suffix += 1
+
+    label = database.database_label(database.DATABASE)
+    destination = os.path.join(path, label)
+    files = {label: dict(backup_database(database.DATABASE, destination, pages, pause), path=destination)}
+    if compress:
+        for result in files.values():
+            result['path'] = _compress(result['path'])
+            result['bytes'] = os.path.getsize(result['path'])
+
+    removed = rotate_snapshots(directory, keep) if keep is not None else []
+    return {
+        'path': path,
+        'files': files,
+        'bytes': sum(result['bytes'] for result in files.values()),
+        'seconds': round(time.perf_counter() - started, 3),
+        'removed': removed
+    }
@@ -0,0 +1,152 @@
+"""
+Catalog Replica Module - Memory-resident copy of the books table
+Holds the catalog column by column in compact arrays with hash indexes on
+ID and ISBN and a maintained title order, so catalog reads don't go back to
+SQLite. It is kept current by the change feed from database.py's write helpers.
+
+The replica only sees writes made through this process's helpers, so it must
+only be enabled when a single process writes to the catalog. create_app refuses
+it together with SQLITE_WAL or forked workers.
+"""
+
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import database
+from records import Book
+
+
+class CatalogReplica:
+    """
+    Column-oriented in-memory copy of the books table.
+
+    Row i of the catalog is (ids[i], titles[i], authors[i], isbns[i],
+    total_copies[i], available_copies[i]). Numeric columns live in typed
+    arrays; string columns share their str objects with nothing else.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self.ids = array('q')
+        self.total_copies = array('l')
+        self.available_copies = array('l')
+        self.titles: List[str] = []
+        self.authors: List[str] = []
+        self.isbns: List[str] = []
+        self._row_by_id: Dict[int, int] = {}
+        self._row_by_isbn: Dict[str, int] = {}
+        # Row numbers sorted by (title, id), with the sort keys kept alongside for bisect
+        self._title_order = array('l')
+        self._title_keys: List[Tuple[str, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def load(self, books: Iterable[Dict]) -> None:
+        """Replace the replica contents with the given books."""
+        with self._lock:
+            self._clear()
+            for book in books:
+                self._append(book)
+            order = sorted(range(len(self.ids)), key=lambda row: (self.titles[row], self.ids[row]))
+            self._title_order = array('l', order)
+            self._title_keys = [(self.titles[row], self.ids[row]) for row in order]
+
+    def _append(self, book: Dict) -> int:
+        row = len(self.ids)
+        self.ids.append(book['id'])
+        self.titles.append(book['title'])
+        self.authors.append(book['author'])
+        self.isbns.append(book['isbn'])
+        self.total_copies.append(book['total_copies'])
+        self.available_copies.append(book['available_copies'])
+        self._row_by_id[book['id']] = row
+        self._row_by_isbn[book['isbn']] = row
+        return row
+
+    def add_book(self, book: Dict) -> None:
+        """Apply a 'book_added' change."""
+        with self._lock:
+            if book['id'] in self._row_by_id:
+                return
+            row = self._append(book)
+            key = (book['title'], book['id'])
+            position = bisect_left(self._title_keys, key)
+            self._title_keys.insert(position, key)
+            self._title_order.insert(position, row)
+
+    def apply_availability(self, book_id: int, change: int) -> None:
+        """Apply an 'availability_changed' change."""
+        with self._lock:
+            row = self._row_by_id.get(book_id)
+            if row is not None:
+                self.available_copies[row] += change
+
+    def _book(self, row: int) -> Book:
+        return Book(self.ids[row], self.titles[row], self.authors[row], self.isbns[row],
+                    self.total_copies[row], self.available_copies[row])
+
+    def all_books(self) -> List[Book]:
+        """Every book ordered by title, like get_all_books()."""
+        with self._lock:
+            return [self._book(row) for row in self._title_order]
+
+    def get_by_id(self, book_id: int) -> Optional[Book]:
+        with self._lock:
+            row = self._row_by_id.get(book_id)
+            return self._book(row) if row is not None else None
+
+    def get_by_isbn(self, isbn: str) -> Optional[Book]:
+        with self._lock:
+            row = self._row_by_isbn.get(isbn)
+            return self._book(row) if row is not None else None
+
+    def memory_report(self) -> Dict:
+        """Approximate bytes held by the replica, in total and per 100,000 books."""
+        with self._lock:
+            columns = {
+                'numeric_columns': sum(sys.getsizeof(column) for column in
+                                       (self.ids, self.total_copies, self.available_copies)),
+                'string_columns': sum(sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column)
+                                      for column in (self.titles, self.authors, self.isbns)),
+                'id_isbn_indexes': sys.getsizeof(self._row_by_id) + sys.getsizeof(self._row_by_isbn),
+                'title_order': sys.getsizeof(self._title_order) + sys.getsizeof(self._title_keys)
+                               + sum(sys.getsizeof(key) for key in self._title_keys),
+            }
+            books = len(self.ids)
+        total = sum(columns.values())
+        return {
+            'books': books,
+            'bytes': total,
+            'bytes_per_100k_books': round(total * 100_000 / books) if books else 0,
+            'breakdown': columns
+        }
+
+
+# Shared replica, populated by enable_catalog_replica()
+catalog_replica = CatalogReplica()
+
+
+def _on_catalog_change(event: str, data: Dict) -> None:
+    if event == 'book_added':
+        catalog_replica.add_book(data)
+    elif event == 'availability_changed':
+        catalog_replica.apply_availability(data['book_id'], data['change'])
+    elif event == 'reset':
+        # The database is already detached from the replica; enable it again to reload
+        catalog_replica.load([])
+
+
+def enable_catalog_replica() -> CatalogReplica:
+    """Load the catalog into memory and serve database.py's book reads from it."""
+    database.attach_catalog_replica(None)
+    database.add_change_listener(_on_catalog_change)
+    catalog_replica.load(database.get_all_books())
+    database.attach_catalog_replica(catalog_replica)
+    return catalog_replica
@@ -0,0 +1,89 @@
+"""
+Circulation Log Module - Incremental consumers of the circulation event log
+A derived view (a cache, a ledger, aggregates) registers as a named consumer
+and is handed only the circulation events after its saved offset, instead of
+rescanning books and loans. Each batch is applied and the new offset saved in
+one transaction, so database writes made by the consumer are applied exactly
+once, even with several processes polling the same consumer.
+"""
+
+from typing import Callable, Dict, List, Optional
+
+import database
+
+# Events handed to a consumer per transaction
+DEFAULT_BATCH_SIZE = 1000
+
+
+class CirculationConsumer:
+    """A named reader of circulation_events that remembers how far it has got."""
+
+    def __init__(self, name: str, apply: Callable[[object, List[Dict]], None],
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            name: consumer name, the key of its saved offset
+            apply: apply(conn, events), called with each batch of events (oldest
+                first) inside the transaction that saves the offset. Writes made
+                on conn commit with the offset; in-memory updates should tolerate
+                a batch being applied again if the commit fails.
+            batch_size: most events per batch
+        """
+        self.name = name
+        self.apply = apply
+        self.batch_size = batch_size
+
+    def poll(self, conn=None) -> int:
+        """
+        Apply the next batch of events, if any; returns how many were applied.
+        Runs in its own transaction, or in conn's open write transaction if given.
+        """
+        if conn is None:
+            with database.transaction() as conn:
+                return self.poll(conn)
+        offset = database.get_consumer_offset(self.name, conn)
+        events = database.get_circulation_events(offset, self.batch_size, conn)
+        if not events:
+            return 0
+        self.apply(conn, events)
+        database.save_consumer_offset(self.name, events[-1]['seq'], conn)
+        return len(events)
+
+    def catch_up(self, max_batches: Optional[int] = None, conn=None) -> int:
+        """
+        Apply batches until the consumer reaches the end of the log; returns how
+        many events. Each batch commits separately unless conn is given.
+        """
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            applied = self.poll(conn)
+            if applied == 0:
+                break
+            total += applied
+            batches += 1
+        return total
+
+    def offset(self) -> int:
+        """seq of the last event applied."""
+        return database.get_consumer_offset(self.name)
+
+    def lag(self) -> int:
+        """Events in the log that the consumer has not applied yet."""
+        return database.latest_circulation_event() - self.offset()
+
+    def reset(self) -> None:
+        """Forget the saved offset, so the next poll starts from the beginning of the log."""
+        database.delete_consumer_offset(self.name)
+
+
+def log_stats() -> Dict:
+    """Newest seq in the log and each consumer's offset and lag (events still to apply)."""
+    latest = database.latest_circulation_event()
+    return {
+        'latest_seq': latest,
+        'consumers': {
+            name: {'offset': offset, 'lag': latest - offset}
+            for name, offset in database.get_consumer_offsets().items()
+        }
+    }
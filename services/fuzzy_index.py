@@ -0,0 +1,229 @@
+"""
+Fuzzy Index Module - Typo-tolerant title/author search
+Finds words within a small edit distance of each query word using a trigram
+candidate index, verifies candidates with a bounded Levenshtein distance and
+ranks matching books by how well they match.
+"""
+
+import threading
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import add_change_listener, get_all_books, get_books_by_ids
+from services.suggest_index import CatalogFollower, normalize
+from services.task_executor import register_task
+
+# Trigram size used by the candidate filter
+GRAM_SIZE = 3
+
+
+def edit_distance_within(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Levenshtein distance between a and b if it is at most max_distance, else None.
+    Only a band of width 2 * max_distance + 1 around the diagonal is computed.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        if min(current[low - 1:high + 1]) > max_distance:
+            return None
+        previous = current
+
+    return previous[len(b)] if previous[len(b)] <= max_distance else None
+
+
+def default_budget(word: str) -> int:
+    """Edits allowed for a query word: none for short words, then 1, then 2."""
+    if len(word) <= 3:
+        return 0
+    if len(word) <= 5:
+        return 1
+    return 2
+
+
+def _grams(word: str) -> set:
+    padded = '$' * (GRAM_SIZE - 1) + word + '$' * (GRAM_SIZE - 1)
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+
+class FuzzyIndex:
+    """
+    Word-level index over titles and authors for typo-tolerant search.
+
+    Each distinct normalized word keeps the IDs of the books it appears in, and
+    each (word length, trigram) pair keeps the IDs of the words that contain it.
+    A query word only verifies words of a close enough length that share enough
+    trigrams to possibly be within its edit budget (every edit destroys at most
+    GRAM_SIZE trigrams).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._words: List[str] = []
+        self._word_ids: Dict[str, int] = {}
+        self._postings: List[array] = []
+        self._grams: Dict[Tuple[int, str], array] = defaultdict(lambda: array('l'))
+        self._book_ids = set()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def build(self, books: Iterable[Dict]) -> None:
+        """Replace the index contents with the given books."""
+        with self._lock:
+            self._words, self._word_ids, self._postings = [], {}, []
+            self._grams = defaultdict(lambda: array('l'))
+            self._book_ids = set()
+            for book in books:
+                self._add(book)
+
+    def add_book(self, book: Dict) -> None:
+        """Index a newly added book's title and author words."""
+        with self._lock:
+            self._add(book)
+
+    def _add(self, book: Dict) -> None:
+        if book['id'] in self._book_ids:
+            return
+        self._book_ids.add(book['id'])
+        words = set(normalize(book['title']).split()) | set(normalize(book['author']).split())
+        for word in words:
+            word_id = self._word_ids.get(word)
+            if word_id is None:
+                word_id = len(self._words)
+                self._word_ids[word] = word_id
+                self._words.append(word)
+                self._postings.append(array('l'))
+                for gram in _grams(word):
+                    self._grams[len(word), gram].append(word_id)
+            self._postings[word_id].append(book['id'])
+
+    def _near_words(self, word: str, budget: int) -> List[Tuple[int, int]]:
+        """(word_id, distance) for indexed words within budget edits of word."""
+        exact = self._word_ids.get(word)
+        if budget == 0:
+            return [(exact, 0)] if exact is not None else []
+
+        grams = _grams(word)
+        needed = len(grams) - budget * GRAM_SIZE
+        lengths = range(max(1, len(word) - budget), len(word) + budget + 1)
+        counts = Counter(chain.from_iterable(
+            self._grams.get((length, gram), ()) for length in lengths for gram in grams
+        ))
+
+        matches = []
+        for word_id, shared in counts.items():
+            if shared < needed:
+                continue
+            distance = edit_distance_within(word, self._words[word_id], budget)
+            if distance is not None:
+                matches.append((word_id, distance))
+        return matches
+
+    def search(self, query: str, limit: int = 20, max_distance: int = 2) -> List[Tuple[int, int, int]]:
+        """
+        Rank books whose title/author words are near the query words.
+
+        Each query word may be off by up to min(default_budget(word), max_distance)
+        edits. Books must match the query word with the fewest candidate books,
+        then rank by how many query words they match and the total edit distance.
+
+        Returns:
+            list: (book_id, matched_words, total_distance) tuples, best first
+        """
+        words = list(dict.fromkeys(normalize(query).split()))
+        if not words:
+            return []
+
+        with self._lock:
+            per_word = []
+            for word in words:
+                best = {}
+                for word_id, distance in self._near_words(word, min(default_budget(word), max_distance)):
+                    for book_id in self._postings[word_id]:
+                        if distance < best.get(book_id, max_distance + 1):
+                            best[book_id] = distance
+                if best:
+                    per_word.append(best)
+
+        if not per_word:
+            return []
+
+        # Drive candidates from the most selective word so common words stay cheap
+        driver = min(per_word, key=len)
+        ranked = []
+        for book_id in driver:
+            matched, total = 0, 0
+            for best in per_word:
+                if book_id in best:
+                    matched += 1
+                    total += best[book_id]
+            ranked.append((book_id, matched, total))
+
+        ranked.sort(key=lambda item: (-item[1], item[2], item[0]))
+        return ranked[:limit]
+
+
+# Shared index for the app, built in the background at startup or on the first fuzzy search
+fuzzy_index = FuzzyIndex()
+fuzzy_follower = CatalogFollower(fuzzy_index.add_book)
+_built = False
+_build_lock = threading.Lock()
+
+
+def _on_catalog_change(event: str, data: Dict) -> None:
+    global _built
+    if event == 'book_added' and _built:
+        fuzzy_index.add_book(data)
+    elif event == 'reset':
+        # Rebuilt from the new database on the next fuzzy search
+        with _build_lock:
+            fuzzy_follower.reset()
+            fuzzy_index.build([])
+            _built = False
+
+
+add_change_listener(_on_catalog_change)
+
+
+def ensure_fuzzy_index() -> FuzzyIndex:
+    """
+    Build the shared fuzzy index from the catalog if it has not been built yet,
+    otherwise pick up books other processes have added since.
+    """
+    global _built
+    if not _built:
+        with _build_lock:
+            if not _built:
+                fuzzy_follower.start()
+                fuzzy_index.build(get_all_books())
+                _built = True
+    else:
+        fuzzy_follower.refresh()
+    return fuzzy_index
+
+
+@register_task('warm_fuzzy_index')
+def _warm_fuzzy_index() -> None:
+    # Submitted by create_app so the first fuzzy search doesn't pay for the build
+    ensure_fuzzy_index()
+
+
+def fuzzy_search_books(search_term: str, limit: int = 20) -> List[Dict]:
+    """Books whose title or author nearly matches the search term, best first."""
+    ranked = ensure_fuzzy_index().search(search_term, limit)
+    return get_books_by_ids([book_id for book_id, _, _ in ranked])
@@ -0,0 +1,140 @@
+"""
+Group Commit Module - Batch concurrent writes into shared transactions
+A single writer thread per database file takes write operations from a queue,
+runs whatever arrives within a short window in one transaction and hands each
+caller its own result through a future, so many small writes share one commit.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+# How long the writer waits for more operations after the first one arrives
+DEFAULT_WINDOW_SECONDS = 0.002
+
+# Most operations committed together in one transaction
+DEFAULT_MAX_BATCH = 64
+
+# Queue item that tells the writer thread to finish
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Runs write operations on one connection in batched transactions.
+
+    Each operation is a callable taking the writer's connection. It runs inside
+    its own SAVEPOINT, so an operation that raises is rolled back alone and the
+    rest of its batch still commits. Futures are only resolved after COMMIT.
+    Once closed, the writer refuses new operations with RuntimeError.
+    """
+
+    def __init__(self, connect: Callable[[], Any], window: float = DEFAULT_WINDOW_SECONDS,
+                 max_batch: int = DEFAULT_MAX_BATCH, name: str = 'group-commit-writer'):
+        self._connect = connect
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: 'queue.Queue' = queue.Queue()
+        # Guards closed, so nothing is queued behind the stop marker
+        self._submit_lock = threading.Lock()
+        self.closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {'operations': 0, 'batches': 0, 'failed_operations': 0, 'failed_commits': 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[Any], Any]) -> Future:
+        """Queue operation(conn) for the next batch; the future gets its return value or exception."""
+        future = Future()
+        with self._submit_lock:
+            if self.closed:
+                raise RuntimeError('group commit writer is closed')
+            self._queue.put((operation, future))
+        return future
+
+    def run(self, operation: Callable[[Any], Any]) -> Any:
+        """Submit operation and wait for its committed result."""
+        return self.submit(operation).result()
+
+    def close(self) -> None:
+        """Commit what is already queued, then stop the writer thread."""
+        with self._submit_lock:
+            if not self.closed:
+                self.closed = True
+                self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict:
+        """Operation, batch and failure counters, with the average batch size."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['average_batch'] = round(stats['operations'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+    def _next_batch(self) -> Tuple[List[Tuple[Callable, Future]], bool]:
+        """Block for one operation, then collect more until the window closes or the batch is full."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        conn = self._connect()
+        conn.isolation_level = None  # Transactions are managed explicitly below
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn, batch: List[Tuple[Callable, Future]]) -> None:
+        outcomes = []
+        failed = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for operation, future in batch:
+                conn.execute('SAVEPOINT operation')
+                try:
+                    outcomes.append((future, True, operation(conn)))
+                    conn.execute('RELEASE operation')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operation')
+                    conn.execute('RELEASE operation')
+                    outcomes.append((future, False, e))
+                    failed += 1
+            conn.execute('COMMIT')
+        except Exception as e:
+            # BEGIN or COMMIT failed: nothing in the batch was written
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            with self._stats_lock:
+                self._stats['failed_commits'] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self._stats['operations'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['failed_operations'] += failed
+        for future, succeeded, value in outcomes:
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
@@ -0,0 +1,57 @@
+"""
+Hold Queue Module - Fast hold position lookups
+Keeps each book's hold IDs in queue order in memory, so a patron's position is
+a binary search. A copy is tagged with the queue version it was read at. The
+version changes whenever a hold is placed or removed, by any process, and a
+lookup that sees a newer version reloads that book's queue first.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Optional, Tuple
+
+from database import add_change_listener, get_hold_queue
+
+
+class HoldQueueIndex:
+    """Sorted hold IDs per book, each tagged with the queue version it was read at."""
+
+    def __init__(self):
+        self._queues: Dict[int, Tuple[int, array]] = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def position(self, book_id: int, version: int, hold_id: int) -> Optional[int]:
+        """
+        1-based position of hold_id in book_id's queue at version (or later),
+        or None if the hold is no longer queued.
+        """
+        cached = self._queues.get(book_id)
+        if cached is None or cached[0] < version:
+            loaded_version, hold_ids = get_hold_queue(book_id)
+            cached = (loaded_version, array('q', hold_ids))
+            with self._lock:
+                self._queues[book_id] = cached
+                self.reloads += 1
+        hold_ids = cached[1]
+        index = bisect_left(hold_ids, hold_id)
+        if index < len(hold_ids) and hold_ids[index] == hold_id:
+            return index + 1
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queues.clear()
+
+
+# Shared index for the app, filled in as positions are looked up
+hold_queues = HoldQueueIndex()
+
+
+def _on_catalog_change(event: str, data: Dict) -> None:
+    if event == 'reset':
+        hold_queues.clear()
+
+
+add_change_listener(_on_catalog_change)
@@ -3,14 +3,35 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import sqlite3
+import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
+    get_book_by_id, get_book_by_isbn, get_patron_borrow_count, get_patron_counters, get_patron_history,
     insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books,get_patron_borrowed_books
+    get_all_books,get_patron_borrowed_books,
+    get_borrowed_books_for_patrons, get_existing_book_ids, borrow_books_bulk, return_books_bulk,
+    to_epoch, insert_hold, delete_hold, get_patron_holds,
+    get_paid_late_fees, record_late_fee_payment, record_late_fee_refund
 )
-from services.payment_service import PaymentGateway
+from services.async_db import run_blocking
+from services.payment_service import AsyncPaymentGateway, PaymentGateway
+from services.fuzzy_index import fuzzy_search_books
+from services.hold_queue import hold_queues
+from services.single_flight import coalesced
+from services.task_executor import register_task, submit_task
+
+# Most books a patron may have on loan at once (R3); a patron holding this many can't borrow more
+MAX_BOOKS_PER_PATRON = 5
+
+# Most items accepted in one bulk checkout or check-in
+MAX_BULK_ITEMS = 50
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Returned loans per page of borrowing history (R7)
+HISTORY_PAGE_SIZE = 20
 
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
@@ -84,8 +105,8 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     # Check patron's current borrowed books count
     current_borrowed = get_patron_borrow_count(patron_id)
     
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
+    if current_borrowed >= MAX_BOOKS_PER_PATRON:
+        return False, f"You have reached the maximum borrowing limit of {MAX_BOOKS_PER_PATRON} books."
     
     # Create borrow record
     borrow_date = datetime.now()
@@ -131,25 +152,135 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not borrowed_book:
         return False, "This book was not borrowed by this patron"
 
-    # Record the return date of the book
+    # Record the return and any late fee owed, and lend the copy to the next
+    # patron on hold (or make it available), in one transaction
     return_date = datetime.now()
-
-    return_success = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not return_success:
+    try:
+        outcome, = return_books_bulk(patron_id, [book_id], return_date, fee_for=_fee_for_return,
+                                     hold_due_date=return_date + timedelta(days=14),
+                                     max_books=MAX_BOOKS_PER_PATRON)
+    except Exception:
         return False, "error occurred while recording return date."
+    if outcome['status'] != 'returned':
+        return False, "This book was not borrowed by this patron"
 
-    # Increase the amount of books available by 1
-    availability_success = update_book_availability(book_id, 1)
-    if not availability_success:
-        return False, "error occurred while updating book availability."
-
-    # Calculate and display late fees if applicable
-    late_fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    # Display late fees if applicable
     late_fee_message = ""
-    if late_fee_info and late_fee_info.get('late_fee', 0) > 0:
-        late_fee_message = f" Late fee: ${late_fee_info['late_fee']}"
+    if outcome['late_fee'] > 0:
+        late_fee_message = f" Late fee: ${outcome['late_fee']:.2f}"
 
-    return True, f'Book "{book["title"]}" successfully returned.{late_fee_message}'
+    return True, f'Book "{book["title"]}" successfully returned.{late_fee_message}{_hold_message(outcome)}'
+
+def _hold_message(outcome: Dict) -> str:
+    """Note added to a return message when the copy went to a patron on hold."""
+    return " The copy has been lent to the next patron on hold." if outcome.get('held_for') else ""
+
+def _validate_bulk_request(patron_id: str, book_ids: List[int]) -> Optional[str]:
+    """Return an error message if a bulk request is malformed, otherwise None."""
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits."
+    
+    if not book_ids:
+        return "At least one book ID is required."
+    
+    if len(book_ids) > MAX_BULK_ITEMS:
+        return f"At most {MAX_BULK_ITEMS} books can be processed at once."
+    
+    return None
+
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow a stack of books for one patron in a single transaction.
+    Bulk version of borrow_book_by_patron for self-checkout kiosks.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow, in scan order
+        
+    Returns:
+        tuple: (success: bool, message: str, results: list of per-book dicts
+                with 'book_id', 'success' and 'message')
+    """
+    error = _validate_bulk_request(patron_id, book_ids)
+    if error:
+        return False, error, []
+    
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    
+    try:
+        outcomes = borrow_books_bulk(patron_id, book_ids, borrow_date, due_date, MAX_BOOKS_PER_PATRON)
+    except Exception:
+        return False, "Database error occurred while creating borrow records.", []
+    
+    messages = {
+        'not_found': "Book not found.",
+        'unavailable': "This book is currently not available.",
+        'limit': f"You have reached the maximum borrowing limit of {MAX_BOOKS_PER_PATRON} books."
+    }
+    results = []
+    for outcome in outcomes:
+        if outcome['status'] == 'borrowed':
+            message = f'Successfully borrowed "{outcome["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+        else:
+            message = messages[outcome['status']]
+        results.append({
+            'book_id': outcome['book_id'],
+            'success': outcome['status'] == 'borrowed',
+            'message': message
+        })
+    
+    borrowed = sum(result['success'] for result in results)
+    return True, f"Borrowed {borrowed} of {len(results)} books.", results
+
+def return_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Return a stack of books for one patron in a single transaction.
+    Bulk version of return_book_by_patron for check-in stations.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books being returned, in scan order
+        
+    Returns:
+        tuple: (success: bool, message: str, results: list of per-book dicts
+                with 'book_id', 'success', 'message' and 'late_fee')
+    """
+    error = _validate_bulk_request(patron_id, book_ids)
+    if error:
+        return False, error, []
+    
+    return_date = datetime.now()
+    
+    try:
+        outcomes = return_books_bulk(patron_id, book_ids, return_date, fee_for=_fee_for_return,
+                                     hold_due_date=return_date + timedelta(days=14),
+                                     max_books=MAX_BOOKS_PER_PATRON)
+    except Exception:
+        return False, "Database error occurred while recording returns.", []
+    
+    results = []
+    for outcome in outcomes:
+        late_fee = 0.0
+        if outcome['status'] == 'returned':
+            late_fee = outcome.get('late_fee', _fee_for_return(outcome['due_ts'], to_epoch(return_date)))
+            message = f'Book "{outcome["title"]}" successfully returned.'
+            if late_fee > 0:
+                message += f" Late fee: ${late_fee:.2f}"
+            message += _hold_message(outcome)
+        elif outcome['status'] == 'not_found':
+            message = "Book not found."
+        else:
+            message = "This book was not borrowed by this patron"
+        results.append({
+            'book_id': outcome['book_id'],
+            'success': outcome['status'] == 'returned',
+            'message': message,
+            'late_fee': late_fee
+        })
+    
+    returned = sum(result['success'] for result in results)
+    return True, f"Returned {returned} of {len(results)} books.", results
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
@@ -199,28 +330,10 @@ def get_late_fee(patron_id, book_id):
     # Check borrow and return/current date
     for item in current_borrowed:
         if item['book_id'] == book_id:
-            due = item['due_date']
-            current = datetime.now()
-            
-            # Calculating days overdue
-            if current > due:
-                days_overdue = (current - due).days
-            else:
-                days_overdue = 0
-            
-            # Calculating late fee
-            fee_amount = 0.0
-            if (days_overdue > 0 and days_overdue <= 7):
-                fee_amount = days_overdue * 0.5
-            elif (days_overdue > 7 and days_overdue < 19):
-                temp = days_overdue - 7 
-                fee_amount = (temp * 1) + 3.5
-            elif (days_overdue > 19):
-                fee_amount = 15
-                
+            days_overdue = _days_overdue(item['due_ts'], to_epoch(datetime.now()))
             
             return {
-                'fee_amount': fee_amount,
+                'fee_amount': _late_fee_amount(days_overdue),
                 'days_overdue': days_overdue,
                 'status': 'success'
             }
@@ -232,6 +345,96 @@ def get_late_fee(patron_id, book_id):
         'status': 'Book was not borrowed by patron'
     }
 
+def _days_overdue(due_ts: int, now_ts: int) -> int:
+    """Whole days between a due date and now, both in epoch seconds (0 if not yet overdue)."""
+    return (now_ts - due_ts) // SECONDS_PER_DAY if now_ts > due_ts else 0
+
+def _late_fee_amount(days_overdue: int) -> float:
+    """
+    Late fee for a number of days overdue.
+    $0.50/day for the first 7 days, $1.00/day after that, capped at $15.00.
+    Day 19 (3.50 + 12 x 1.00 = 15.50) is the first day charged the cap.
+    """
+    if days_overdue <= 0:
+        return 0.0
+    if days_overdue <= 7:
+        return days_overdue * 0.5
+    return min(15.0, (days_overdue - 7) * 1.0 + 3.5)
+
+def _fee_for_return(due_ts: int, return_ts: int) -> float:
+    """Late fee assessed when a loan due at due_ts is returned at return_ts."""
+    return _late_fee_amount(_days_overdue(due_ts, return_ts))
+
+def calculate_late_fees_bulk(pairs: List[Tuple[str, int]], patron_ids: List[str]) -> List[Dict]:
+    """
+    Calculate late fees for many patron/book pairs and whole patrons at once.
+    Batch version of calculate_late_fee_for_book for the circulation desk and notices job.
+    
+    All loans are loaded with one query for every patron involved, and a single
+    timestamp is used for the whole batch.
+    
+    Args:
+        pairs: (patron_id, book_id) pairs to price individually
+        patron_ids: patrons whose every borrowed book should be priced
+        
+    Returns:
+        list: one result dict per pair and per borrowed book of each patron,
+              in request order. Failed items carry status 'error' and an 'error' message.
+    """
+    def is_valid(patron_id):
+        return isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6
+    
+    wanted = {pid for pid, _ in pairs if is_valid(pid)} | {pid for pid in patron_ids if is_valid(pid)}
+    loans = get_borrowed_books_for_patrons(list(wanted))
+    now = to_epoch(datetime.now())
+    
+    # Index each patron's loans by book ID (earliest loan first, as in the single lookup)
+    due_dates = {}
+    for pid, patron_loans in loans.items():
+        for loan in patron_loans:
+            due_dates.setdefault(pid, {}).setdefault(loan['book_id'], loan['due_ts'])
+    
+    # Books that were requested but are not on loan need an existence check
+    unmatched_ids = {
+        book_id for pid, book_id in pairs
+        if is_valid(pid) and book_id not in due_dates.get(pid, {})
+    }
+    existing_ids = get_existing_book_ids(list(unmatched_ids))
+    
+    def priced(patron_id, book_id, due_ts):
+        days_overdue = _days_overdue(due_ts, now)
+        return {
+            'patron_id': patron_id,
+            'book_id': book_id,
+            'fee_amount': _late_fee_amount(days_overdue),
+            'days_overdue': days_overdue,
+            'status': 'success'
+        }
+    
+    def failed(patron_id, book_id, message):
+        return {'patron_id': patron_id, 'book_id': book_id, 'status': 'error', 'error': message}
+    
+    results = []
+    for patron_id, book_id in pairs:
+        if not is_valid(patron_id):
+            results.append(failed(patron_id, book_id, "Invalid patron ID. Must be exactly 6 digits."))
+        elif book_id in due_dates.get(patron_id, {}):
+            results.append(priced(patron_id, book_id, due_dates[patron_id][book_id]))
+        elif book_id not in existing_ids:
+            results.append(failed(patron_id, book_id, "Book not found."))
+        else:
+            results.append(failed(patron_id, book_id, "Book was not borrowed by patron"))
+    
+    for patron_id in patron_ids:
+        if not is_valid(patron_id):
+            results.append(failed(patron_id, None, "Invalid patron ID. Must be exactly 6 digits."))
+            continue
+        for loan in loans.get(patron_id, []):
+            results.append(priced(patron_id, loan['book_id'], loan['due_ts']))
+    
+    return results
+
+@coalesced
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     """w
     Search for books in the catalog.
@@ -241,6 +444,7 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
 - Support partial matching for title/author (case-insensitive)
 - Support exact matching for ISBN
 - Return results in same format as catalog display
+- `fuzzy` type: typo-tolerant title/author matching, ranked best first
 
     TODO: Implement R6 as per requirements
     """
@@ -266,9 +470,14 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
         book_isbn = get_book_by_isbn(search_term)
         if book_isbn: 
             results.append(book_isbn)
+
+    # Typo-tolerant title/author search, best matches first
+    elif search_type.lower() == "fuzzy":
+        results = fuzzy_search_books(search_term)
     
     return results
 
+@coalesced
 def get_patron_status_report(patron_id: str) -> Dict:
     """
     Get status report for a patron.
@@ -297,15 +506,20 @@ The system shall display patron status for a particular patron that includes the
         book_titles.append(item['title'])
         due_dates.append(item['due_date'])
 
-    # Check total late fees owed
-    total_late_fees = 0.0
+    # Maintained counters: open loans, and fees assessed on returns less payments and refunds
+    counters = get_patron_counters(patron_id)
+
+    # Check total late fees owed, including fees accruing on current loans
+    now = to_epoch(datetime.now())
+    total_late_fees = counters['outstanding_fees']
     for book in current_borrowed:
-        late_fee_info = calculate_late_fee_for_book(patron_id, book['book_id'])
-        if late_fee_info and late_fee_info.get('late_fee', 0) > 0:
-            total_late_fees += late_fee_info['late_fee']
+        total_late_fees += _fee_for_return(book['due_ts'], now)
 
     # Number of books currently borrowed
-    books_borrowed_count = get_patron_borrow_count(patron_id)
+    books_borrowed_count = counters['active_loans']
+
+    # Most recent returns; further pages come from get_patron_borrowing_history
+    borrowing_history = get_patron_history(patron_id, limit=HISTORY_PAGE_SIZE)
 
     return {
         'patron_id': patron_id,
@@ -314,8 +528,107 @@ The system shall display patron status for a particular patron that includes the
         'due_dates': due_dates,
         'total_late_fees': total_late_fees,
         'books_borrowed_count': books_borrowed_count,
+        'borrowing_history': borrowing_history,
     }
 
+def get_patron_borrowing_history(patron_id: str, before_id: Optional[int] = None,
+                                 limit: int = HISTORY_PAGE_SIZE) -> Tuple[bool, str, Dict]:
+    """
+    Get one page of a patron's borrowing history, most recent return first.
+    Paged companion to the history section of R7: Patron Status Report
+    
+    Args:
+        patron_id: 6-digit library card ID
+        before_id: 'next_cursor' from the previous page, or None for the first page
+        limit: number of returned loans per page
+        
+    Returns:
+        tuple: (success: bool, message: str, page: dict with 'history' and
+                'next_cursor', which is None on the last page)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", {}
+    
+    history = get_patron_history(patron_id, before_id, limit)
+    next_cursor = history[-1]['id'] if len(history) == limit else None
+    return True, f"Found {len(history)} returned loans.", {'history': history, 'next_cursor': next_cursor}
+
+def place_hold(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Put a patron in the queue for a book with no copies available. When a copy
+    is returned it is lent to the first patron in the queue who is under the
+    borrowing limit, so patrons don't need to keep retrying the borrow.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to hold
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+    
+    book = get_book_by_id(book_id)
+    if not book:
+        return False, "Book not found."
+    
+    if book['available_copies'] > 0:
+        return False, "This book is available to borrow now."
+    
+    if any(loan['book_id'] == book_id for loan in get_patron_borrowed_books(patron_id)):
+        return False, "You already have this book on loan."
+    
+    try:
+        added = insert_hold(patron_id, book_id, datetime.now())
+    except Exception:
+        return False, "Database error occurred while placing the hold."
+    if not added:
+        return False, "You already have a hold on this book."
+    
+    position = next(hold['position'] for hold in get_hold_positions(patron_id)[2] if hold['book_id'] == book_id)
+    return True, f'Hold placed on "{book["title"]}". You are number {position} in the queue.'
+
+def cancel_hold(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Take a patron out of a book's hold queue.
+    
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+    
+    if not delete_hold(patron_id, book_id):
+        return False, "You have no hold on this book."
+    return True, "Hold cancelled."
+
+def get_hold_positions(patron_id: str) -> Tuple[bool, str, List[Dict]]:
+    """
+    A patron's holds with their place in each book's queue. Positions come
+    from the in-memory hold queue index, which only rereads a book's queue
+    after it has changed.
+    
+    Returns:
+        tuple: (success: bool, message: str, holds: list of dicts with 'book_id',
+                'title', 'placed_at', 'position' (1 is next) and 'queue_length')
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", []
+    
+    holds = []
+    for hold in get_patron_holds(patron_id):
+        position = hold_queues.position(hold['book_id'], hold['queue_version'], hold['id'])
+        if position is not None:
+            holds.append({
+                'book_id': hold['book_id'],
+                'title': hold['title'],
+                'placed_at': hold['placed_at'],
+                'position': position,
+                'queue_length': hold['queue_length']
+            })
+    return True, f"Found {len(holds)} holds.", holds
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
@@ -337,48 +650,81 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
+    error, fee_amount, description = _prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    # Use provided gateway or create new one
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    # Process payment through external gateway
+    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=fee_amount,
+            description=description
+        )
+    except Exception as e:
+        # Handle payment gateway errors
+        return False, f"Payment processing error: {str(e)}", None
+    if success:
+        _record_late_fee(record_late_fee_payment, patron_id=patron_id, book_id=book_id,
+                         amount=fee_amount, transaction_id=transaction_id)
+    return _payment_result(success, transaction_id, message)
+
+def _prepare_late_fee_payment(patron_id: str, book_id: int) -> Tuple[Optional[str], float, str]:
+    """
+    Validate a late fee payment and look up what to charge.
+    
+    Returns:
+        tuple: (error message or None, fee amount, payment description)
+    """
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
-        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+        return "Invalid patron ID. Must be exactly 6 digits.", 0.0, ""
     
     # Calculate late fee first
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
     
     # Check if there's a fee to pay
     if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
+        return "Unable to calculate late fees.", 0.0, ""
     
-    fee_amount = fee_info.get('fee_amount', 0.0)
+    # Only what hasn't already been paid on this loan
+    fee_amount = round(fee_info.get('fee_amount', 0.0) - get_paid_late_fees(patron_id, book_id), 2)
     
     if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
+        return "No late fees to pay for this book.", 0.0, ""
     
     # Get book details for payment description
     book = get_book_by_id(book_id)
     if not book:
-        return False, "Book not found.", None
-    
-    # Use provided gateway or create new one
-    if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        return "Book not found.", 0.0, ""
     
-    # Process payment through external gateway
-    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    return None, fee_amount, f"Late fees for '{book['title']}'"
+
+# Recording a payment or refund the gateway accepted, as a background task for when the first try fails
+register_task('record_late_fee_payment')(record_late_fee_payment)
+register_task('record_late_fee_refund')(record_late_fee_refund)
+
+def _record_late_fee(record: Callable, **payload) -> None:
+    """
+    Record a payment or refund the gateway has already accepted. If the database
+    write fails, the money has still moved, so the write is handed to the task
+    executor, which retries it and keeps it in task_retries with the error if
+    it keeps failing.
+    """
     try:
-        success, transaction_id, message = payment_gateway.process_payment(
-            patron_id=patron_id,
-            amount=fee_amount,
-            description=f"Late fees for '{book['title']}'"
-        )
-        
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
-            return False, f"Payment failed: {message}", None
-            
-    except Exception as e:
-        # Handle payment gateway errors
-        return False, f"Payment processing error: {str(e)}", None
+        record(**payload)
+    except sqlite3.Error:
+        submit_task(record.__name__, **payload)
+
+def _payment_result(success: bool, transaction_id: str, message: str) -> Tuple[bool, str, Optional[str]]:
+    if success:
+        return True, f"Payment successful! {message}", transaction_id
+    return False, f"Payment failed: {message}", None
 
 
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
@@ -396,14 +742,9 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         tuple: (success: bool, message: str)
     """
     # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
-    
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
-    
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    error = _refund_error(transaction_id, amount)
+    if error:
+        return False, error
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -413,11 +754,101 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
     try:
         success, message = payment_gateway.refund_payment(transaction_id, amount)
-        
-        if success:
-            return True, message
-        else:
-            return False, f"Refund failed: {message}"
-            
     except Exception as e:
-        return False, f"Refund processing error: {str(e)}"
\ No newline at end of file
+        return False, f"Refund processing error: {str(e)}"
+    if success:
+        _record_late_fee(record_late_fee_refund, transaction_id=transaction_id, amount=amount,
+                         refund_id=_new_refund_id(transaction_id))
+    return _refund_result(success, message)
+
+def _refund_error(transaction_id: str, amount: float) -> Optional[str]:
+    """Why a refund request is invalid, or None if it can go to the gateway."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID."
+    
+    if amount <= 0:
+        return "Refund amount must be greater than 0."
+    
+    if amount > 15.00:  # Maximum late fee per book
+        return "Refund amount exceeds maximum late fee."
+    return None
+
+def _new_refund_id(transaction_id: str) -> str:
+    """ID a refund is logged under; retries of its write reuse it, so it is only logged once."""
+    return f"refund_{transaction_id}_{uuid.uuid4().hex[:12]}"
+
+def _refund_result(success: bool, message: str) -> Tuple[bool, str]:
+    if success:
+        return True, message
+    return False, f"Refund failed: {message}"
+
+# Async Payments
+#
+# Coroutine versions of the payment functions for async routes. Database work
+# runs on the async_db thread pool and the gateway call is awaited, so a
+# pending payment doesn't hold a thread. Validation and messages are shared
+# with the functions above.
+
+async def pay_late_fees_async(patron_id: str, book_id: int,
+                              payment_gateway: AsyncPaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+    """Async pay_late_fees: same arguments and results, with an awaitable gateway."""
+    error, fee_amount, description = await run_blocking(_prepare_late_fee_payment, patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    if payment_gateway is None:
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        success, transaction_id, message = await payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=fee_amount,
+            description=description
+        )
+    except Exception as e:
+        return False, f"Payment processing error: {str(e)}", None
+    if success:
+        await run_blocking(_record_late_fee, record_late_fee_payment, patron_id=patron_id, book_id=book_id,
+                           amount=fee_amount, transaction_id=transaction_id)
+    return _payment_result(success, transaction_id, message)
+
+async def refund_late_fee_payment_async(transaction_id: str, amount: float,
+                                        payment_gateway: AsyncPaymentGateway = None) -> Tuple[bool, str]:
+    """Async refund_late_fee_payment: same arguments and results, with an awaitable gateway."""
+    error = _refund_error(transaction_id, amount)
+    if error:
+        return False, error
+    
+    if payment_gateway is None:
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        success, message = await payment_gateway.refund_payment(transaction_id, amount)
+    except Exception as e:
+        return False, f"Refund processing error: {str(e)}"
+    if success:
+        await run_blocking(_record_late_fee, record_late_fee_refund, transaction_id=transaction_id, amount=amount,
+                           refund_id=_new_refund_id(transaction_id))
+    return _refund_result(success, message)
+
+async def get_payment_status_async(transaction_id: str,
+                                   payment_gateway: AsyncPaymentGateway = None) -> Tuple[bool, str, Dict]:
+    """
+    Look up a late fee payment's status at the gateway.
+    
+    Returns:
+        tuple: (found: bool, message: str, status: dict from the gateway)
+    """
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return False, "Invalid transaction ID.", {}
+    
+    if payment_gateway is None:
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        status = await payment_gateway.verify_payment_status(transaction_id)
+    except Exception as e:
+        return False, f"Status check error: {str(e)}", {}
+    if status.get('status') == 'not_found':
+        return False, status.get('message', 'Transaction not found'), status
+    return True, f"Payment is {status.get('status')}.", status
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+Loan Export Module - Columnar, memory-mappable snapshots of the loan history
+Writes every loan as one NumPy .npy file per column, so analysis tools can map
+multi-million-row histories with numpy.load(path, mmap_mode='r') instead of
+querying the live database. patron_id is dictionary-encoded: the patron column
+holds int32 codes into patron_ids.npy, a fixed-width byte string array. The
+files are written with the standard library, and open_export() maps them
+without NumPy too.
+"""
+
+import ast
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, List, Union
+
+import database
+
+# Loans read from the database per batch
+DEFAULT_BATCH_SIZE = 50000
+
+# Export directory names: the time the export was taken
+EXPORT_FORMAT = 'loans-%Y%m%d-%H%M%S'
+
+# Columns in row order: name, .npy dtype and the array typecode it is written with
+COLUMNS = (
+    ('patron', '<i4', 'i'),
+    ('book_id', '<i4', 'i'),
+    ('borrow_date', '<i8', 'q'),
+    ('due_date', '<i8', 'q'),
+    ('return_date', '<i8', 'q'),
+)
+
+# return_date of loans that were still open when the export was taken
+OPEN_RETURN_DATE = 0
+
+PATRON_IDS_FILE = 'patron_ids.npy'
+MANIFEST_FILE = 'manifest.json'
+
+# .npy format 1.0: magic, version, header length, then a header padded so data starts here
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_DATA_OFFSET = 128
+
+
+def _npy_header(descr: str, length: int) -> bytes:
+    """A .npy 1.0 header for a 1-d array, padded to _NPY_DATA_OFFSET bytes."""
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': (length,)}).encode('latin1')
+    padding = _NPY_DATA_OFFSET - len(_NPY_MAGIC) - 2 - len(header) - 1
+    return _NPY_MAGIC + struct.pack('<H', len(header) + padding + 1) + header + b' ' * padding + b'\n'
+
+
+class _ColumnWriter:
+    """Appends values to one .npy file; the length in the header is filled in on close."""
+
+    def __init__(self, path: str, descr: str, typecode: str):
+        self.descr = descr
+        self.typecode = typecode
+        self.length = 0
+        self._file = open(path, 'wb')
+        self._file.write(b'\0' * _NPY_DATA_OFFSET)
+
+    def append(self, values: List[int]) -> None:
+        column = array(self.typecode, values)
+        if sys.byteorder == 'big':
+            column.byteswap()
+        column.tofile(self._file)
+        self.length += len(column)
+
+    def close(self) -> None:
+        self._file.seek(0)
+        self._file.write(_npy_header(self.descr, self.length))
+        self._file.close()
+
+
+def export_loans(directory: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Export every loan (open and returned) to a new subdirectory of `directory`.
+    The loans are streamed from the database in batches, so neither side holds
+    the whole history in memory. The export is written under a temporary name
+    and renamed when complete.
+
+    Returns:
+        dict: the export's manifest, plus its 'path'
+    """
+    os.makedirs(directory, exist_ok=True)
+    created_at = datetime.now()
+    path = os.path.join(directory, created_at.strftime(EXPORT_FORMAT))
+    suffix = 1
+    while os.path.exists(path) or os.path.exists(path + '.partial'):
+        path = os.path.join(directory, f'{created_at.strftime(EXPORT_FORMAT)}-{suffix}')
+        suffix += 1
+    partial = path + '.partial'
+    os.makedirs(partial)
+
+    writers = [_ColumnWriter(os.path.join(partial, f'{name}.npy'), descr, typecode)
+               for name, descr, typecode in COLUMNS]
+    codes: Dict[str, int] = {}
+    try:
+        for batch in database.iter_loan_batches(batch_size):
+            patrons, book_ids, borrow_dates, due_dates, return_dates = zip(*batch)
+            writers[0].append([codes.setdefault(patron_id, len(codes)) for patron_id in patrons])
+            writers[1].append(book_ids)
+            writers[2].append(borrow_dates)
+            writers[3].append(due_dates)
+            writers[4].append([OPEN_RETURN_DATE if value is None else value for value in return_dates])
+    except Exception:
+        for writer in writers:
+            writer.close()
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    for writer in writers:
+        writer.close()
+
+    # Dictionary codes are in first-seen order, so patron_ids[code] decodes a patron
+    patron_ids = [patron_id.encode() for patron_id in codes]
+    width = max((len(patron_id) for patron_id in patron_ids), default=1)
+    with open(os.path.join(partial, PATRON_IDS_FILE), 'wb') as file:
+        file.write(_npy_header(f'|S{width}', len(patron_ids)))
+        for patron_id in patron_ids:
+            file.write(patron_id.ljust(width, b'\0'))
+
+    manifest = {
+        'rows': writers[0].length,
+        'created_at': created_at.isoformat(timespec='seconds'),
+        'columns': {name: {'file': f'{name}.npy', 'dtype': writer.descr}
+                    for (name, _, _), writer in zip(COLUMNS, writers)},
+        'patron_ids': {'file': PATRON_IDS_FILE, 'dtype': f'|S{width}', 'count': len(patron_ids)},
+        'open_return_date': OPEN_RETURN_DATE
+    }
+    with open(os.path.join(partial, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.rename(partial, path)
+    return dict(manifest, path=path)
+
+
+def _map_npy(path: str):
+    """Memory-map a .npy file; returns (mmap, dtype descr, length, data offset)."""
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:6] != _NPY_MAGIC[:6]:
+        mapped.close()
+        raise ValueError(f'{path} is not a .npy file')
+    header_length = struct.unpack('<H', mapped[8:10])[0]
+    header = ast.literal_eval(mapped[10:10 + header_length].decode('latin1'))
+    return mapped, header['descr'], header['shape'][0], 10 + header_length
+
+
+class LoanExport:
+    """
+    A loan export opened with memory maps. Columns are read-only typed views of
+    the mapped files; nothing is read until it is used.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST_FILE)) as file:
+            self.manifest = json.load(file)
+        self.path = path
+        self._maps = {}
+        self._views = {}
+
+    def __len__(self) -> int:
+        return self.manifest['rows']
+
+    def _open(self, file_name: str):
+        if file_name not in self._maps:
+            self._maps[file_name] = _map_npy(os.path.join(self.path, file_name))
+        return self._maps[file_name]
+
+    def column(self, name: str) -> Union[memoryview, array]:
+        """
+        A column as a sequence of ints: a zero-copy memoryview on little-endian
+        machines (a byte-swapped copy otherwise). Patron codes decode with patron_id().
+        """
+        if name not in self._views:
+            descr = self.manifest['columns'][name]['dtype']
+            typecode = next(typecode for column, _, typecode in COLUMNS if column == name)
+            mapped, _, length, offset = self._open(self.manifest['columns'][name]['file'])
+            view = memoryview(mapped)[offset:offset + length * array(typecode).itemsize]
+            if sys.byteorder == 'little' and descr.startswith('<'):
+                self._views[name] = view.cast(typecode)
+            else:
+                values = array(typecode, view.tobytes())
+                values.byteswap()
+                view.release()
+                self._views[name] = values
+        return self._views[name]
+
+    def patron_id(self, code: int) -> str:
+        """The patron_id a patron code stands for."""
+        mapped, descr, length, offset = self._open(self.manifest['patron_ids']['file'])
+        if not 0 <= code < length:
+            raise IndexError(code)
+        width = int(descr[2:])
+        return mapped[offset + code * width:offset + (code + 1) * width].rstrip(b'\0').decode()
+
+    def close(self) -> None:
+        """Release the column views and unmap the files."""
+        for view in self._views.values():
+            if isinstance(view, memoryview):
+                view.release()
+        self._views.clear()
+        for mapped, _, _, _ in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_export(path: str) -> LoanExport:
+    """Open an export directory written by export_loans()."""
+    return LoanExport(path)
+
@@ -6,10 +6,15 @@ For Assignment 3: You will learn to mock this service in their tests
 since we cannot make actual payment API calls during testing.
 """
 
-import requests
+import asyncio
 from typing import Dict, Tuple
 import time
 
+# Simulated round-trip time of each gateway call, in seconds
+PAYMENT_LATENCY_SECONDS = 0.5
+REFUND_LATENCY_SECONDS = 0.5
+STATUS_LATENCY_SECONDS = 0.3
+
 
 class PaymentGateway:
     """
@@ -52,9 +57,11 @@ class PaymentGateway:
             success, txn_id, msg = gateway.process_payment("123456", 10.50, "Late fees")
         """
         # Simulate API call delay
-        time.sleep(0.5)
+        time.sleep(PAYMENT_LATENCY_SECONDS)
         
-        # In a real implementation, this would make an HTTP request:
+        # In a real implementation, this would make an HTTP request. Import
+        # requests here rather than at module level so app startup doesn't load it:
+        # import requests
         # response = requests.post(
         #     f"{self.base_url}/charges",
         #     headers={"Authorization": f"Bearer {self.api_key}"},
@@ -66,6 +73,10 @@ class PaymentGateway:
         #     }
         # )
         
+        return self._payment_outcome(patron_id, amount, description)
+    
+    def _payment_outcome(self, patron_id: str, amount: float, description: str) -> Tuple[bool, str, str]:
+        """Simulated gateway answer to a payment request."""
         # For this template, we simulate different scenarios based on amount
         # This allows testing without a real API
         
@@ -96,8 +107,11 @@ class PaymentGateway:
         Returns:
             tuple: (success: bool, message: str)
         """
-        time.sleep(0.5)
-        
+        time.sleep(REFUND_LATENCY_SECONDS)
+        return self._refund_outcome(transaction_id, amount)
+    
+    def _refund_outcome(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Simulated gateway answer to a refund request."""
         if not transaction_id or not transaction_id.startswith("txn_"):
             return False, "Invalid transaction ID"
         
@@ -120,8 +134,11 @@ class PaymentGateway:
         Returns:
             dict: Payment status information
         """
-        time.sleep(0.3)
-        
+        time.sleep(STATUS_LATENCY_SECONDS)
+        return self._status_outcome(transaction_id)
+    
+    def _status_outcome(self, transaction_id: str) -> Dict:
+        """Simulated gateway answer to a status check."""
         if not transaction_id or not transaction_id.startswith("txn_"):
             return {"status": "not_found", "message": "Transaction not found"}
         
@@ -131,4 +148,34 @@ class PaymentGateway:
             "status": "completed",
             "amount": 10.50,
             "timestamp": time.time()
-        }
\ No newline at end of file
+        }
+
+
+class AsyncPaymentGateway(PaymentGateway):
+    """
+    Non-blocking client for the same payment gateway, for async routes.
+    
+    Each call awaits the gateway instead of holding a thread while it waits,
+    so one event loop can have many payments pending at once. Results are the
+    same as PaymentGateway's. latency_scale multiplies the simulated delays.
+    """
+    
+    def __init__(self, api_key: str = "test_key_12345", latency_scale: float = 1.0):
+        super().__init__(api_key)
+        self.latency_scale = latency_scale
+    
+    async def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """Process a payment; see PaymentGateway.process_payment."""
+        # A real client would await an async HTTP request here
+        await asyncio.sleep(PAYMENT_LATENCY_SECONDS * self.latency_scale)
+        return self._payment_outcome(patron_id, amount, description)
+    
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Refund a previous payment; see PaymentGateway.refund_payment."""
+        await asyncio.sleep(REFUND_LATENCY_SECONDS * self.latency_scale)
+        return self._refund_outcome(transaction_id, amount)
+    
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check a transaction's status; see PaymentGateway.verify_payment_status."""
+        await asyncio.sleep(STATUS_LATENCY_SECONDS * self.latency_scale)
+        return self._status_outcome(transaction_id)
@@ -0,0 +1,182 @@
+"""
+Search Cache Module - LRU/TTL cache for catalog search results
+Popular searches are answered from memory instead of rescanning the catalog.
+New books invalidate the cache; availability changes are patched into cached
+results in place so borrowing and returning don't throw away hot entries.
+Changes made by other worker processes are read from the circulation log at
+most once per CATALOG_REFRESH_SECONDS: their new books invalidate the cache and
+results holding a book they borrowed or returned are dropped.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from database import add_change_listener
+from services.suggest_index import CatalogFollower, normalize
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 60.0
+
+
+def normalize_search(search_term: str, search_type: str) -> Tuple[str, str]:
+    """
+    A search's term and type as the catalog search compares them: the type and
+    title/author terms lower-cased, fuzzy terms normalized like the fuzzy index,
+    ISBNs unchanged. Routes search with these values and cache under them, so
+    two searches share a cache entry only if they return the same books.
+    """
+    search_type = search_type.lower()
+    if search_type in ('title', 'author'):
+        return search_term.lower(), search_type
+    if search_type == 'fuzzy':
+        return normalize(search_term), search_type
+    return search_term, search_type
+
+
+def search_key(search_term: str, search_type: str, page: Optional[Hashable] = None) -> Tuple:
+    """Cache key for a search, so 'Gatsby' and 'gatsby' share an entry."""
+    return (*normalize_search(search_term, search_type), page)
+
+
+class SearchCache:
+    """
+    Size-bounded LRU cache of search results with a time-to-live.
+
+    Every catalog change bumps a version number. Results computed while the
+    version changed are not stored, so a slow search can't cache stale data.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple, Tuple[float, List[Dict]]]' = OrderedDict()
+        self._keys_by_book: Dict[int, set] = {}
+        self._version = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                       'invalidations': 0, 'patches': 0}
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], List[Dict]]) -> List[Dict]:
+        """Return cached results for key, computing and caching them on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, results = entry
+                if self._clock() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return [dict(book) for book in results]
+                self._remove(key)
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            version = self._version
+
+        results = compute()
+
+        with self._lock:
+            if version == self._version:
+                self._store(key, [dict(book) for book in results])
+        return results
+
+    def _store(self, key: Tuple, results: List[Dict]) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self._clock(), results)
+        for book in results:
+            self._keys_by_book.setdefault(book['id'], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def _remove(self, key: Tuple) -> None:
+        _, results = self._entries.pop(key)
+        for book in results:
+            keys = self._keys_by_book.get(book['id'])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_book[book['id']]
+
+    def invalidate(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._keys_by_book.clear()
+            self._stats['invalidations'] += 1
+
+    def drop_books(self, book_ids: Iterable[int]) -> None:
+        """Drop every cached result containing any of the books."""
+        with self._lock:
+            self._version += 1
+            for book_id in book_ids:
+                for key in list(self._keys_by_book.get(book_id, ())):
+                    self._remove(key)
+                    self._stats['invalidations'] += 1
+
+    def patch_availability(self, book_id: int, change: int) -> None:
+        """Apply an availability change to every cached result containing the book."""
+        with self._lock:
+            self._version += 1
+            for key in self._keys_by_book.get(book_id, ()):
+                for book in self._entries[key][1]:
+                    if book['id'] == book_id:
+                        book['available_copies'] += change
+                        self._stats['patches'] += 1
+
+    def reset(self) -> None:
+        """Drop every entry and zero the counters, with a fresh lock."""
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_book = {}
+        self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters, hit rate and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Shared cache for the search routes
+search_cache = SearchCache()
+
+# Borrows and returns in this process were patched in already; dropping those
+# results too costs a recompute at most once per interval but keeps this simple
+search_follower = CatalogFollower(lambda book: search_cache.invalidate(), books_changed=search_cache.drop_books)
+
+
+def _on_catalog_change(event: str, data: Dict) -> None:
+    if event == 'reset':
+        search_follower.reset()
+        search_cache.invalidate()
+    elif event == 'book_added':
+        search_cache.invalidate()
+    elif event == 'availability_changed':
+        search_cache.patch_availability(data['book_id'], data['change'])
+
+
+add_change_listener(_on_catalog_change)
+
+# Each forked worker process starts with its own empty cache
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=search_cache.reset)
+
+
+def cached_search(search_term: str, search_type: str, compute: Callable[[], List[Dict]],
+                  page: Optional[Hashable] = None) -> List[Dict]:
+    """Run a search through the shared cache; compute() produces results on a miss."""
+    if search_follower.started:
+        search_follower.refresh()
+    else:
+        # Results cached from here on are read after this log position
+        search_follower.start()
+    return search_cache.get_or_compute(search_key(search_term, search_type, page), compute)
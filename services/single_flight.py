@@ -0,0 +1,129 @@
+"""
+Single Flight Module - Coalesce identical concurrent reads
+When several threads ask for the same expensive read at the same moment,
+only the first one runs it; the others wait and get a copy of its result.
+A caller only joins a read that started after its own last write.
+"""
+
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    """One in-flight computation and the threads waiting on it."""
+
+    __slots__ = ('version', 'done', 'result', 'error')
+
+    def __init__(self, version: int):
+        self.version = version
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time within a process.
+
+    Callers that arrive while a computation for their key is running get a
+    copy of that computation's result (or its exception) instead of starting
+    their own. Nothing is cached once the computation finishes.
+
+    With ``version``, a function returning a number that grows with every
+    write, a caller only joins a computation that read a version at least as
+    new as the one it reads, so a read never misses the caller's own writes.
+    """
+
+    def __init__(self, version: Optional[Callable[[], int]] = None):
+        self.version = version
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return fn()'s result, sharing a copy with concurrent callers using the same key."""
+        version = self.version() if self.version is not None else 0
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            # A computation that started before this caller's last write may not see it
+            leader = call is None or call.version < version
+            if leader:
+                call = _Call(version)
+                self._calls[key] = call
+                self._stats['executions'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return _copy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # A newer computation may have taken over the key
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def reset(self) -> None:
+        """Forget in-flight calls and zero the counters, with a fresh lock."""
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self) -> Dict:
+        """How many calls were made, executed and coalesced."""
+        with self._lock:
+            return dict(self._stats)
+
+
+def _copy(result: Any) -> Any:
+    """Copy the lists, dicts and tuples of a shared result; records and scalars are read-only."""
+    if type(result) is list:
+        return [_copy(item) for item in result]
+    if type(result) is dict:
+        return {key: _copy(value) for key, value in result.items()}
+    if type(result) is tuple:
+        return tuple(_copy(item) for item in result)
+    return result
+
+
+def _circulation_seq() -> int:
+    # Imported here because database itself uses coalesced
+    from database import latest_circulation_event
+    return latest_circulation_event()
+
+
+# Shared instance for the app's expensive read paths. Every write these reads
+# depend on (loans, returns, new books, payments) appends to the circulation log.
+read_flights = SingleFlight(version=_circulation_seq)
+
+# A forked worker must not wait on calls that were running in its parent
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=read_flights.reset)
+
+
+def coalesced(fn: Callable) -> Callable:
+    """
+    Decorator that coalesces concurrent calls with equal arguments through read_flights.
+    Waiting callers get copies of the result's lists and dicts.
+    """
+    name = f'{fn.__module__}.{fn.__qualname__}'
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        return read_flights.do(key, lambda: fn(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,211 @@
+"""
+Suggest Index Module - Prefix autocomplete over book titles and authors
+Keeps a sorted array of normalized keys in memory and answers prefix
+lookups with binary search, so suggestions don't wait on the database.
+Books added by other worker processes are picked up from the circulation
+log at most once per CATALOG_REFRESH_SECONDS.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from database import (
+    add_change_listener, get_all_books, get_books_added_since, get_catalog_changes_since, latest_circulation_event
+)
+
+# Default cap on indexed keys, roughly 100 bytes of memory each
+DEFAULT_MAX_ENTRIES = 2_000_000
+
+# How often an in-memory index checks the circulation log for books added by other processes
+CATALOG_REFRESH_SECONDS = 1.0
+
+
+def normalize(text: str) -> str:
+    """Lower-case, strip accents and collapse punctuation/whitespace to single spaces."""
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.split(r'[^\w]+', text.casefold())).strip()
+
+
+class SuggestIndex:
+    """
+    Memory-bounded prefix index over titles and authors.
+
+    Every word start of a normalized title/author is a key ("the great gatsby",
+    "great gatsby", "gatsby"), so patrons can type any word of a title. Keys are
+    kept in one sorted list with a parallel array pointing at the distinct
+    suggestion (display text, field) they belong to.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.truncated = False
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._refs = array('l')
+        self._suggestions: List[Tuple[str, str]] = []
+        self._suggestion_ids: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def build(self, books: List[Dict]) -> None:
+        """Replace the index contents with the given books."""
+        keys, suggestions, suggestion_ids = [], [], {}
+        truncated = False
+        for book in books:
+            for field in ('title', 'author'):
+                suggestion = (book[field], field)
+                if suggestion in suggestion_ids:
+                    continue
+                new_keys = _word_start_keys(book[field])
+                if len(keys) + len(new_keys) > self.max_entries:
+                    truncated = True
+                    continue
+                suggestion_ids[suggestion] = len(suggestions)
+                suggestions.append(suggestion)
+                keys.extend((key, suggestion_ids[suggestion]) for key in new_keys)
+        keys.sort()
+
+        with self._lock:
+            self._keys = [key for key, _ in keys]
+            self._refs = array('l', (ref for _, ref in keys))
+            self._suggestions = suggestions
+            self._suggestion_ids = suggestion_ids
+            self.truncated = truncated
+
+    def add_book(self, book: Dict) -> None:
+        """Index a newly added book's title and author."""
+        with self._lock:
+            for field in ('title', 'author'):
+                suggestion = (book[field], field)
+                if suggestion in self._suggestion_ids:
+                    continue
+                new_keys = _word_start_keys(book[field])
+                if len(self._keys) + len(new_keys) > self.max_entries:
+                    self.truncated = True
+                    continue
+                ref = len(self._suggestions)
+                self._suggestion_ids[suggestion] = ref
+                self._suggestions.append(suggestion)
+                for key in new_keys:
+                    position = bisect_left(self._keys, key)
+                    self._keys.insert(position, key)
+                    self._refs.insert(position, ref)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        Return up to ``limit`` distinct suggestions whose title or author has a
+        word starting with ``prefix``, in alphabetical order of the matched key.
+        """
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+
+        results, seen = [], set()
+        with self._lock:
+            position = bisect_left(self._keys, prefix)
+            while position < len(self._keys) and len(results) < limit:
+                if not self._keys[position].startswith(prefix):
+                    break
+                ref = self._refs[position]
+                if ref not in seen:
+                    seen.add(ref)
+                    text, field = self._suggestions[ref]
+                    results.append({'text': text, 'type': field})
+                position += 1
+        return results
+
+
+class CatalogFollower:
+    """
+    Keeps an in-memory index current with books added by any process.
+
+    Books added in this process reach the index straight away through the
+    change listeners; those added by other worker processes are read from the
+    add_book events in the circulation log, at most once per interval.
+    Indexes must tolerate being given a book they already have.
+
+    Given ``books_changed``, it is also called with the IDs of books borrowed
+    or returned since the last check, by any process including this one.
+    """
+
+    def __init__(self, add_book: Callable[[Dict], None], interval: float = CATALOG_REFRESH_SECONDS,
+                 books_changed: Optional[Callable[[Set[int]], None]] = None):
+        self.add_book = add_book
+        self.books_changed = books_changed
+        self.interval = interval
+        self._seq: Optional[int] = None
+        self._checked = 0.0
+
+    def start(self) -> None:
+        """Note the log position; call just before the index is built from the catalog."""
+        self._seq = latest_circulation_event()
+        self._checked = time.monotonic()
+
+    def reset(self) -> None:
+        """Stop following until the next start(), e.g. when the index is emptied."""
+        self._seq = None
+
+    @property
+    def started(self) -> bool:
+        return self._seq is not None
+
+    def refresh(self) -> int:
+        """Add books logged since the last check, if the interval has passed; returns how many."""
+        seq, now = self._seq, time.monotonic()
+        if seq is None or now - self._checked < self.interval:
+            return 0
+        # Concurrent callers skip the check; a book read twice is skipped by the index
+        self._checked = now
+        if self.books_changed is None:
+            latest, books = get_books_added_since(seq)
+        else:
+            latest, books, changed = get_catalog_changes_since(seq)
+            if changed:
+                self.books_changed(changed)
+        for book in books:
+            self.add_book(book)
+        if self._seq is not None:
+            self._seq = latest
+        return len(books)
+
+
+def _word_start_keys(text: str) -> List[str]:
+    """Normalized suffixes of text starting at each word boundary."""
+    words = normalize(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+# Shared index for the app, filled by build_suggest_index() at startup
+suggest_index = SuggestIndex()
+suggest_follower = CatalogFollower(suggest_index.add_book)
+
+
+def _on_catalog_change(event: str, data: Dict) -> None:
+    if event == 'book_added':
+        suggest_index.add_book(data)
+    elif event == 'reset':
+        suggest_follower.reset()
+        suggest_index.build([])
+
+
+add_change_listener(_on_catalog_change)
+
+
+def build_suggest_index() -> None:
+    """Load every book in the catalog into the shared suggest index."""
+    suggest_follower.start()
+    suggest_index.build(get_all_books())
+
+
+def suggest(prefix: str, limit: int = 10) -> List[Dict]:
+    """Top suggestions for a search box prefix from the shared index."""
+    suggest_follower.refresh()
+    return suggest_index.suggest(prefix, limit)
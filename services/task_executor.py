@@ -0,0 +1,310 @@
+"""
+Task Executor Module - Background work off the request path
+Services hand post-commit work (cache refreshes, notifications, ledger
+updates) to a few worker threads through a bounded queue. A task that fails
+is saved to the task_retries table and retried with exponential backoff, by
+this process or any other sharing the database, so retries survive restarts.
+When the queue is full, new tasks go straight to the table instead of
+holding up the request.
+"""
+
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import database
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 1000
+
+# Attempts before a task is kept as 'dead', and the delay before the first retry (doubled each time)
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY_SECONDS = 1.0
+
+# How long submit() waits for queue space before saving the task for later
+DEFAULT_SUBMIT_TIMEOUT_SECONDS = 0.05
+
+# How often due retries are picked up, and how long a picked-up retry is hidden
+# from other processes before it is due again (in case this process stops)
+DEFAULT_POLL_SECONDS = 1.0
+RETRY_LEASE_SECONDS = 300
+
+# Time allowed for queued tasks to finish on shutdown; the rest are saved for later
+DEFAULT_SHUTDOWN_SECONDS = 10.0
+
+# Recent task latencies kept for the metrics
+LATENCY_SAMPLES = 1000
+
+# Background tasks by name; payloads are keyword arguments that must be JSON-serializable
+_tasks: Dict[str, Callable] = {}
+
+
+def register_task(name: str):
+    """Decorator that registers fn(**payload) as the background task `name`."""
+    def decorator(fn):
+        _tasks[name] = fn
+        return fn
+    return decorator
+
+
+def _latency_summary(samples) -> Dict:
+    if not samples:
+        return {'avg': 0.0, 'p95': 0.0}
+    ordered = sorted(samples)
+    return {
+        'avg': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2)
+    }
+
+
+class TaskExecutor:
+    """
+    Runs registered tasks on worker threads fed by a bounded queue.
+
+    With workers=0 tasks run inline in submit(), which tests use to keep
+    everything on one thread. Retry handling is the same either way.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, retry_delay: float = DEFAULT_RETRY_DELAY_SECONDS,
+                 submit_timeout: float = DEFAULT_SUBMIT_TIMEOUT_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_SECONDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.submit_timeout = submit_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._running = False
+        self._start_in_children = False
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._stopping = threading.Event()
+        self._abandon = threading.Event()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'retried': 0, 'spilled': 0, 'dead': 0}
+        self._waits = deque(maxlen=LATENCY_SAMPLES)
+        self._runs = deque(maxlen=LATENCY_SAMPLES)
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def configure(self, **settings) -> None:
+        """Stop the executor (finishing queued tasks) and change its settings; call start() again after."""
+        self.shutdown()
+        self._start_in_children = False
+        for name, value in settings.items():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise ValueError(f'Unknown task executor setting {name!r}')
+            setattr(self, name, value)
+
+    def start(self) -> None:
+        """Start the worker threads and the retry poller (nothing to start with workers=0)."""
+        with self._lock:
+            if self._running or self.workers <= 0 or self._start_in_children:
+                return
+            # Tasks submitted before the threads started (in a preloading parent) carry over
+            waiting, self._queue = self._queue, queue.Queue(maxsize=self.max_queue)
+            while not waiting.empty():
+                item = waiting.get_nowait()
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    database.save_task_retry(item[0], item[1], item[2], int(time.time()), retry_id=item[3])
+                    self._count('spilled')
+            self._stopping = threading.Event()
+            self._abandon = threading.Event()
+            args = (self._queue, self._stopping, self._abandon)
+            self._threads = [threading.Thread(target=self._work, args=args, name=f'task-worker-{index}',
+                                              daemon=True) for index in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._poll_retries, args=(self._stopping,),
+                                                  name='task-retry-poller', daemon=True))
+            for thread in self._threads:
+                thread.start()
+            self._running = True
+
+    def start_after_fork(self) -> None:
+        """
+        Start the threads in each process forked from this one rather than here.
+
+        For servers that create the app in a parent and fork the workers from
+        it (gunicorn with preload_app): threads running in the parent at the
+        fork could leave a worker holding locks they had taken. Tasks submitted
+        in the parent wait in the queue, and every forked worker runs them.
+        """
+        with self._lock:
+            if not self._running:
+                self._start_in_children = True
+
+    def submit(self, name: str, **payload) -> bool:
+        """
+        Run task `name` with payload in the background. Call it after the
+        caller's transaction has committed.
+
+        Returns:
+            bool: True if queued (or run, with workers=0), False if the queue
+                  stayed full and the task was saved to task_retries instead
+        """
+        if name not in _tasks:
+            raise ValueError(f'Unknown background task {name!r}')
+        encoded = json.dumps(payload)
+        self._count('submitted')
+        item = (name, encoded, 0, None, time.monotonic())
+
+        if self.workers <= 0:
+            self._run(item)
+            return True
+        self.start()
+        try:
+            self._queue.put(item, timeout=self.submit_timeout)
+            return True
+        except queue.Full:
+            database.save_task_retry(name, encoded, 0, int(time.time()))
+            self._count('spilled')
+            return False
+
+    def run_due_retries(self) -> int:
+        """Queue (or, with workers=0, run) retries that are due, as far as the queue has room; returns how many."""
+        room = self.max_queue - self._queue.qsize() if self.workers > 0 else self.max_queue
+        if room <= 0:
+            return 0
+        now = int(time.time())
+        # A plain read first, so an idle poller doesn't take the write lock every second
+        if not database.has_due_task_retries(now):
+            return 0
+        rows = database.claim_due_task_retries(now, room, now + RETRY_LEASE_SECONDS)
+        for row in rows:
+            item = (row['task'], row['payload'], row['attempts'], row['id'], time.monotonic())
+            if self.workers <= 0:
+                self._run(item)
+            else:
+                self._queue.put(item)
+        return len(rows)
+
+    def shutdown(self, timeout: float = DEFAULT_SHUTDOWN_SECONDS) -> None:
+        """
+        Stop taking new work and let the workers finish the queue for up to
+        timeout seconds. Tasks still queued after that are saved to
+        task_retries, so they run later rather than being lost.
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            work_queue, threads = self._queue, self._threads
+            self._stopping.set()
+            deadline = time.monotonic() + timeout
+            for thread in threads:
+                thread.join(max(0.0, deadline - time.monotonic()))
+            self._abandon.set()
+            while True:
+                try:
+                    name, payload, attempts, retry_id, _ = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                database.save_task_retry(name, payload, attempts, int(time.time()), retry_id=retry_id)
+                self._count('spilled')
+
+    def stats(self) -> Dict:
+        """Counters, queue depth, task wait/run latency in ms and task_retries rows by status."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            waits, runs = list(self._waits), list(self._runs)
+        stats.update({
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self.max_queue,
+            'wait_ms': _latency_summary(waits),
+            'run_ms': _latency_summary(runs),
+            'retry_table': database.count_task_retries()
+        })
+        return stats
+
+    def _work(self, work_queue, stopping, abandon) -> None:
+        while True:
+            try:
+                item = work_queue.get(timeout=0.1)
+            except queue.Empty:
+                if stopping.is_set():
+                    return
+                continue
+            if abandon.is_set():
+                # Shutdown ran out of time; keep the task for later instead of running it
+                name, payload, attempts, retry_id, _ = item
+                database.save_task_retry(name, payload, attempts, int(time.time()), retry_id=retry_id)
+                self._count('spilled')
+                continue
+            self._run(item)
+
+    def _poll_retries(self, stopping) -> None:
+        while not stopping.wait(self.poll_interval):
+            try:
+                self.run_due_retries()
+            except Exception:
+                # The database may be briefly busy; try again on the next poll
+                pass
+
+    def _run(self, item) -> None:
+        name, payload, attempts, retry_id, enqueued = item
+        started = time.monotonic()
+        try:
+            _tasks[name](**json.loads(payload))
+        except Exception as e:
+            self._failed(name, payload, attempts + 1, retry_id, e)
+        else:
+            if retry_id is not None:
+                database.delete_task_retry(retry_id)
+            self._count('completed')
+        finally:
+            finished = time.monotonic()
+            with self._stats_lock:
+                self._waits.append(started - enqueued)
+                self._runs.append(finished - started)
+
+    def _failed(self, name: str, payload: str, attempts: int, retry_id: Optional[int], error: Exception) -> None:
+        self._count('failed')
+        if attempts >= self.max_attempts:
+            status, run_after = 'dead', int(time.time())
+            self._count('dead')
+        else:
+            status = 'pending'
+            run_after = math.ceil(time.time() + self.retry_delay * 2 ** (attempts - 1))
+            self._count('retried')
+        database.save_task_retry(name, payload, attempts, run_after, f'{type(error).__name__}: {error}',
+                                 status, retry_id)
+
+    def _after_fork_in_child(self) -> None:
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+        if self._running:
+            # The parent's threads weren't copied, and the tasks in its queue are its own to run
+            self._running = False
+            self._threads = []
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self.start()
+        elif self._start_in_children:
+            self._start_in_children = False
+            self.start()
+
+
+# Shared executor for the app, configured and started by create_app
+task_executor = TaskExecutor()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=task_executor._after_fork_in_child)
+
+
+def submit_task(name: str, **payload) -> bool:
+    """Run a registered task in the background on the shared executor; see TaskExecutor.submit."""
+    return task_executor.submit(name, **payload)
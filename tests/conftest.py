@@ -0,0 +1,17 @@
+import pytest
+from database import add_sample_data, configure_database, init_database
+
+
+@pytest.fixture(autouse=True)
+def isolated_database(monkeypatch):
+    """
+    Give every test its own in-memory database with the sample catalog, as app startup does,
+    so tests don't depend on each other or on library.db and can run in parallel.
+    Apps created in tests run background tasks inline.
+    """
+    monkeypatch.setenv('FLASK_TASK_WORKERS', '0')
+    configure_database(mode='memory')
+    init_database()
+    add_sample_data()
+    yield
+    configure_database()
@@ -0,0 +1,125 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone
+import database
+from app import create_app
+from database import insert_borrow_record, update_borrow_record_return_date
+from services.analytics import (
+    get_book_circulation, get_stats_summary, get_stats_timeline, get_top_books, rebuild_stats, stats_consumer
+)
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+"""
+### Circulation stats
+- Loans, returns, loan length and late returns are kept as running totals per book and per day
+- The totals are updated from new circulation events before each answer
+- rebuild-stats recounts them from the loan tables to verify (and repair) them
+"""
+
+def _loan(patron_id, book_id, borrowed, days_out, days_allowed=14):
+    """Record a loan that was returned days_out days after borrowed."""
+    insert_borrow_record(patron_id, book_id, borrowed, borrowed + timedelta(days=days_allowed))
+    update_borrow_record_return_date(patron_id, book_id, borrowed + timedelta(days=days_out))
+
+
+def test_summary_counts_loans_and_returns():
+    """Test library-wide totals, average loan length and overdue rate."""
+    start = datetime(2025, 3, 3, 12)
+    _loan('222222', 1, start, 4)
+    _loan('333333', 1, start, 20)
+
+    summary = get_stats_summary()
+
+    # The sample data's open loan of "1984" counts as a loan too
+    assert (summary['loans'], summary['returns'], summary['late_returns']) == (3, 2, 1)
+    assert summary['avg_loan_days'] == 12.0
+    assert summary['overdue_rate'] == 0.5
+    assert summary['as_of_seq'] == database.latest_circulation_event()
+
+def test_totals_follow_new_circulation():
+    """Test that each answer includes circulation since the last one, without recounting."""
+    get_stats_summary()
+    offset = stats_consumer.offset()
+
+    borrow_book_by_patron('222222', 2)
+    assert get_book_circulation(2)['loans'] == 1
+    assert stats_consumer.offset() == offset + 1
+    return_book_by_patron('222222', 2)
+    book = get_book_circulation(2)
+
+    assert (book['loans'], book['returns'], book['utilization']) == (1, 1, 0.5)
+    assert get_book_circulation(999) is None
+
+def test_top_books_rankings():
+    """Test rankings by loans, loans per copy and overdue rate."""
+    start = datetime(2025, 3, 3, 12)
+    for patron_id in ('222222', '333333', '444444'):
+        _loan(patron_id, 1, start, 3)
+    _loan('222222', 2, start, 30)
+    _loan('333333', 2, start, 30)
+
+    assert [book['book_id'] for book in get_top_books('loans', 2)] == [1, 2]
+    # 1984 has one copy and one loan; Mockingbird has two copies and two loans
+    assert [book['book_id'] for book in get_top_books('utilization', 3)] == [1, 2, 3]
+    assert [(book['book_id'], book['overdue_rate']) for book in get_top_books('overdue_rate', 5)] == \
+        [(2, 1.0), (1, 0.0)]
+
+def test_timeline_buckets():
+    """Test day, week and month buckets, including empty ones."""
+    # Days are UTC days
+    _loan('222222', 1, datetime(2025, 3, 3, 12, tzinfo=timezone.utc), 2)
+    _loan('333333', 1, datetime(2025, 3, 11, 12, tzinfo=timezone.utc), 2)
+
+    days = get_stats_timeline('day', 5, today=date(2025, 3, 7))
+    weeks = get_stats_timeline('week', 14, today=date(2025, 3, 16))
+    months = get_stats_timeline('month', 40, today=date(2025, 3, 31))
+
+    assert [(bucket['start'], bucket['loans'], bucket['returns']) for bucket in days] == [
+        ('2025-03-03', 1, 0), ('2025-03-04', 0, 0), ('2025-03-05', 0, 1), ('2025-03-06', 0, 0), ('2025-03-07', 0, 0)
+    ]
+    assert days[1]['avg_loan_days'] is None and days[2]['avg_loan_days'] == 2.0
+    assert [(bucket['start'], bucket['loans']) for bucket in weeks] == [('2025-03-03', 1), ('2025-03-10', 1)]
+    assert [(bucket['start'], bucket['returns']) for bucket in months] == [('2025-02-01', 0), ('2025-03-01', 2)]
+
+def test_rebuild_matches_running_totals():
+    """Test that recounting from the loan tables agrees with the incremental totals."""
+    start = datetime(2025, 3, 3, 12)
+    _loan('222222', 1, start, 4)
+    borrow_book_by_patron('333333', 2)
+    get_stats_summary()
+    return_book_by_patron('333333', 2)
+
+    assert rebuild_stats(fix=False) == []
+
+def test_rebuild_repairs_drift():
+    """Test that rebuild-stats reports totals that disagree with the loan tables and replaces them."""
+    get_stats_summary()
+    conn = database.get_db_connection()
+    conn.execute('UPDATE book_stats SET loans = 7 WHERE book_id = 3')
+    conn.commit()
+    conn.close()
+    runner = create_app().test_cli_runner()
+
+    checked = runner.invoke(args=['rebuild-stats', '--check'])
+    assert checked.exit_code == 1 and 'book 3: loans 7 -> 1' in checked.output
+    assert get_book_circulation(3)['loans'] == 7
+
+    rebuilt = runner.invoke(args=['rebuild-stats'])
+    assert rebuilt.exit_code == 0 and get_book_circulation(3)['loans'] == 1
+    assert 'match' in runner.invoke(args=['rebuild-stats', '--check']).output
+
+def test_stats_api():
+    """Test the /api/stats endpoints and their validation."""
+    client = create_app().test_client()
+    borrow_book_by_patron('222222', 1)
+
+    assert client.get('/api/stats/summary').get_json()['loans'] == 2
+    top = client.get('/api/stats/top?by=utilization&limit=1').get_json()
+    assert top['count'] == 1 and top['books'][0]['book_id'] == 3
+    assert len(client.get('/api/stats/timeline?bucket=week&days=28').get_json()['buckets']) in (4, 5)
+    assert client.get('/api/stats/books/1').get_json()['loans'] == 1
+    assert client.get('/api/stats/books/999').status_code == 404
+
+    assert client.get('/api/stats/top?by=fees').status_code == 400
+    assert client.get('/api/stats/top?limit=0').status_code == 400
+    assert client.get('/api/stats/timeline?bucket=year').status_code == 400
+    assert client.get('/api/stats/timeline?days=x').status_code == 400
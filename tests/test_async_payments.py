@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+import pytest
+import routes.payment_routes as payment_routes
+from datetime import datetime, timedelta
+from app import create_app
+from database import add_sample_data, configure_database, init_database, insert_borrow_record
+from services.library_service import pay_late_fees_async, refund_late_fee_payment_async
+from services.payment_service import AsyncPaymentGateway
+
+"""
+### Async payment routes
+- Payment, refund and status endpoints are coroutines awaiting an async gateway
+- Under asgi.py they run on the event loop, so many payments can be pending at once
+"""
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """A fast simulated gateway shared by the payment routes."""
+    gateway = AsyncPaymentGateway(latency_scale=0.01)
+    monkeypatch.setattr(payment_routes, 'payment_gateway', gateway)
+    return gateway
+
+@pytest.fixture
+def overdue_loan():
+    """Patron 654321 has The Great Gatsby, 10 days overdue."""
+    now = datetime.now()
+    insert_borrow_record('654321', 1, now - timedelta(days=24), now - timedelta(days=10))
+    return '654321', 1
+
+@pytest.fixture
+def asgi_app():
+    from asgi import create_asgi_app
+    return create_asgi_app(create_app())
+
+async def _call(app, method, path, body=None):
+    """Send one HTTP request straight to an ASGI app and return (status, JSON body)."""
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'root_path': '', 'headers': [(b'host', b'test')], 'server': ('test', 80)}
+    await app(scope, receive, send)
+    body = b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+    return sent[0]['status'], json.loads(body)
+
+
+def test_pay_late_fees_async(gateway, overdue_loan):
+    """Test the async payment function against the simulated gateway."""
+    success, message, transaction_id = asyncio.run(pay_late_fees_async(*overdue_loan, gateway))
+
+    assert success == True
+    assert "Payment successful" in message
+    assert transaction_id.startswith("txn_654321_")
+
+def test_refund_async_validation(gateway):
+    """Test that invalid refunds are rejected before reaching the gateway."""
+    success, message = asyncio.run(refund_late_fee_payment_async("bad", 5.0, gateway))
+
+    assert success == False
+    assert "Invalid transaction ID" in message
+
+def test_payment_routes_under_wsgi(gateway, overdue_loan):
+    """Test the async views through the regular Flask app."""
+    client = create_app().test_client()
+
+    paid = client.post('/api/payments/late_fees', json={'patron_id': '654321', 'book_id': 1})
+    transaction_id = paid.get_json()['transaction_id']
+    refunded = client.post('/api/payments/refunds', json={'transaction_id': transaction_id, 'amount': 2.5})
+    status = client.get(f'/api/payments/{transaction_id}')
+
+    assert paid.status_code == 200
+    assert refunded.status_code == 200 and "Refund of $2.50" in refunded.get_json()['message']
+    assert status.get_json()['payment']['status'] == 'completed'
+    assert client.post('/api/payments/late_fees', data='nope').status_code == 400
+    assert client.get('/api/payments/unknown').status_code == 404
+
+def test_asgi_payment_and_fallthrough(gateway, overdue_loan, asgi_app):
+    """Test payment routes on the event loop and other routes through the Flask app."""
+    status, body = asyncio.run(_call(asgi_app, 'POST', '/api/payments/late_fees',
+                                     {'patron_id': '654321', 'book_id': 1}))
+    invalid_status, _ = asyncio.run(_call(asgi_app, 'POST', '/api/payments/refunds', ['not', 'an', 'object']))
+    metrics_status, metrics = asyncio.run(_call(asgi_app, 'GET', '/api/metrics'))
+
+    assert status == 200 and body['success'] == True
+    assert invalid_status == 400
+    assert metrics_status == 200 and 'search_cache' in metrics
+
+@pytest.fixture
+def overdue_patrons(tmp_path):
+    """200 patrons with The Great Gatsby 10 days overdue, in a database file shared by the pool's threads."""
+    configure_database(str(tmp_path / 'payments.db'))
+    init_database()
+    add_sample_data()
+    now = datetime.now()
+    patron_ids = [str(700000 + index) for index in range(200)]
+    for patron_id in patron_ids:
+        insert_borrow_record(patron_id, 1, now - timedelta(days=24), now - timedelta(days=10))
+    return patron_ids
+
+def test_asgi_many_pending_payments(monkeypatch, overdue_patrons, asgi_app):
+    """Test that hundreds of payments wait on the gateway concurrently in one process."""
+    monkeypatch.setattr(payment_routes, 'payment_gateway', AsyncPaymentGateway(latency_scale=0.4))
+
+    async def pay_all(patron_ids):
+        return await asyncio.gather(*(_call(asgi_app, 'POST', '/api/payments/late_fees',
+                                            {'patron_id': patron_id, 'book_id': 1}) for patron_id in patron_ids))
+
+    started = time.perf_counter()
+    results = asyncio.run(pay_all(overdue_patrons))
+    elapsed = time.perf_counter() - started
+
+    # Each payment waits 0.2 s at the gateway; one at a time would take 40 s
+    assert all(status == 200 for status, _ in results)
+    assert elapsed < 5
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import pytest
+from app import create_app
+from database import (
+    add_sample_data, configure_database, get_availability_changes, get_db_connection, init_database,
+    latest_availability_change
+)
+from services.availability_stream import BUSY_RETRY_MILLISECONDS, AvailabilityBroadcaster
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+"""
+### Availability event stream
+- A trigger records every change to a book's available copies, from any process
+- GET /events/availability pushes each change as a Server-Sent Event to every open stream
+- Reconnecting clients resume after the last event ID they saw
+"""
+
+@pytest.fixture
+def file_database(tmp_path):
+    """The poller reads from its own thread, so use a database file rather than shared-cache memory."""
+    configure_database(str(tmp_path / 'stream.db'))
+    init_database()
+    add_sample_data()
+
+@pytest.fixture
+def broadcaster():
+    return AvailabilityBroadcaster(poll_interval=0.02)
+
+def _events(text):
+    """The availability changes in a chunk of SSE text."""
+    return [json.loads(line[len('data: '):]) for line in text.splitlines()
+            if line.startswith('data: ') and line != 'data: {}']
+
+
+def test_changes_recorded_by_trigger():
+    """Test that borrowing and returning record the new available copies."""
+    before = latest_availability_change()
+    borrow_book_by_patron("222222", 1)
+    return_book_by_patron("222222", 1)
+
+    changes = get_availability_changes(before)
+    assert [(change['book_id'], change['available_copies']) for change in changes] == [(1, 2), (1, 3)]
+
+def test_stream_pushes_changes(file_database, broadcaster):
+    """Test that a connected stream receives a borrow made after it connected."""
+    stream = broadcaster.stream(max_seconds=5)
+    assert next(stream).startswith('retry:')
+
+    borrow_book_by_patron("222222", 1)
+    chunk = next(stream)
+    stream.close()
+
+    assert _events(chunk) == [{'book_id': 1, 'available_copies': 2}]
+    assert f'id: {latest_availability_change()}' in chunk
+    assert broadcaster.stats()['clients'] == 0
+
+def test_stream_resumes_after_last_event_id(file_database, broadcaster):
+    """Test that a reconnecting client gets the changes it missed."""
+    last_seen = latest_availability_change()
+    borrow_book_by_patron("222222", 1)
+    borrow_book_by_patron("333333", 2)
+
+    stream = broadcaster.stream(last_event_id=str(last_seen), max_seconds=5)
+    next(stream)
+    chunk = next(stream)
+    stream.close()
+
+    assert _events(chunk) == [{'book_id': 1, 'available_copies': 2}, {'book_id': 2, 'available_copies': 1}]
+
+def test_stream_resync_when_changes_pruned(file_database, broadcaster):
+    """Test that a client too far behind is told to reload."""
+    borrow_book_by_patron("222222", 1)
+    conn = get_db_connection()
+    conn.execute('DELETE FROM availability_changes WHERE seq < ?', (latest_availability_change(),))
+    conn.commit()
+    conn.close()
+
+    stream = broadcaster.stream(last_event_id='0', max_seconds=5)
+    next(stream)
+    chunk = next(stream)
+    stream.close()
+
+    assert chunk.startswith('event: resync')
+
+def test_thread_streams_are_capped(file_database, broadcaster):
+    """Test that streams past the per-process cap are told to retry later instead of holding a thread."""
+    first = broadcaster.stream(max_seconds=5, max_streams=1)
+    assert next(first).startswith('retry: 3000')
+
+    second = broadcaster.stream(max_seconds=5, max_streams=1)
+    assert list(second) == [f'retry: {BUSY_RETRY_MILLISECONDS}\n\n']
+    assert broadcaster.stats()['refused'] == 1
+    assert broadcaster.stats()['thread_streams'] == 1
+
+    first.close()
+    third = broadcaster.stream(max_seconds=5, max_streams=1)
+    assert next(third).startswith('retry: 3000')
+    third.close()
+    assert broadcaster.stats()['thread_streams'] == 0
+
+def test_reset_starts_from_newest_change(file_database, broadcaster):
+    """Test that reset drops buffered changes and the next poll starts from the newest one."""
+    broadcaster.poll()
+    borrow_book_by_patron("222222", 1)
+    assert broadcaster.poll() == 1
+
+    broadcaster.reset()
+    borrow_book_by_patron("333333", 2)
+    assert broadcaster.poll() == 0
+    borrow_book_by_patron("444444", 1)
+    assert broadcaster.poll() == 1
+
+def test_flask_route_streams_events():
+    """Test the WSGI route's content type and first message."""
+    client = create_app().test_client()
+
+    response = client.get('/events/availability', buffered=False)
+    first = next(response.response)
+    response.close()
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert (first.decode() if isinstance(first, bytes) else first).startswith('retry:')
+
+def test_asgi_stream_fans_out(file_database):
+    """Test that several streams on one event loop all get the same change, then stop on disconnect."""
+    from asgi import create_asgi_app
+    app = create_asgi_app(create_app())
+
+    async def listen(received, disconnected):
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                received.append(message['body'].decode())
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/events/availability', 'headers': []}
+        await app(scope, receive, send)
+
+    async def scenario():
+        disconnected = asyncio.Event()
+        streams = [[] for _ in range(3)]
+        tasks = [asyncio.ensure_future(listen(received, disconnected)) for received in streams]
+        while not all(streams):
+            await asyncio.sleep(0.01)
+        borrow_book_by_patron("222222", 1)
+        for _ in range(300):
+            if all(_events(''.join(received)) for received in streams):
+                break
+            await asyncio.sleep(0.01)
+        disconnected.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        return streams
+
+    streams = asyncio.run(scenario())
+    for received in streams:
+        assert _events(''.join(received)) == [{'book_id': 1, 'available_copies': 2}]
+
+def test_catalog_page_listens_for_changes():
+    """Test that catalog rows carry the IDs the page script patches."""
+    html = create_app().test_client().get('/catalog').data.decode()
+
+    assert 'data-book-id="1"' in html and 'data-total-copies="3"' in html
+    assert "new EventSource(\"/events/availability\")" in html
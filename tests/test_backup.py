@@ -0,0 +1,95 @@
+import gzip
+import os
+import sqlite3
+import pytest
+from datetime import datetime
+import database
+from app import create_app
+from database import init_database, insert_book
+from services import backup
+from services.backup import backup_database, create_snapshot, list_snapshots
+
+"""
+### Online backup
+- The database is copied with the SQLite backup API in paged steps, from one read transaction
+- Snapshots are timestamped (with a suffix on collision), optionally gzipped and rotated
+"""
+
+@pytest.fixture
+def backup_db(tmp_path, monkeypatch):
+    """A fresh database with a few books."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'library.db'))
+    init_database()
+    for i in range(5):
+        insert_book(f'Book {i}', 'Author', f'{9780000000000 + i}', 1, 1)
+    return tmp_path
+
+def _book_count(path):
+    conn = sqlite3.connect(path)
+    count = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_backup_copies_database(backup_db):
+    """Test a paged backup of an idle database."""
+    destination = str(backup_db / 'copy.db')
+
+    result = backup_database(database.DATABASE, destination, pages=1, pause=0)
+
+    assert _book_count(destination) == 5
+    assert result['steps'] > 1
+
+def test_backup_copies_the_moment_it_started(backup_db, monkeypatch):
+    """Test that writes during a paged WAL copy neither restart it nor wait for it."""
+    database.enable_wal()
+    writer = sqlite3.connect(database.DATABASE, timeout=0)
+    def write_between_steps(seconds):
+        writer.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                       "VALUES ('New', 'Author', ?, 1, 1)", (f'{9790000000000 + _book_count(database.DATABASE)}',))
+        writer.commit()
+    monkeypatch.setattr(backup.time, 'sleep', write_between_steps)
+    destination = str(backup_db / 'copy.db')
+
+    result = backup_database(database.DATABASE, destination, pages=1)
+    writer.close()
+
+    assert result['paused'] == True
+    assert _book_count(destination) == 5
+    assert _book_count(database.DATABASE) == 5 + result['steps']
+
+def test_snapshot_compression_and_rotation(backup_db):
+    """Test that snapshots are gzipped and only the newest are kept."""
+    directory = str(backup_db / 'backups')
+    for minute in range(3):
+        snapshot = create_snapshot(directory, compress=True, keep=2, pause=0,
+                                   now=lambda: datetime(2025, 1, 1, 10, minute))
+
+    assert [os.path.basename(path) for path in list_snapshots(directory)] == \
+        ['20250101-100100', '20250101-100200']
+    assert snapshot['removed'] == [os.path.join(directory, '20250101-100000')]
+
+    restored = str(backup_db / 'restored.db')
+    with gzip.open(snapshot['files']['library.db']['path'], 'rb') as packed, open(restored, 'wb') as plain:
+        plain.write(packed.read())
+    assert _book_count(restored) == 5
+
+def test_snapshots_in_the_same_second(backup_db):
+    """Test that a second snapshot taken in the same second gets its own directory."""
+    directory = str(backup_db / 'backups')
+    for _ in range(3):
+        create_snapshot(directory, pause=0, now=lambda: datetime(2025, 1, 1, 10, 0))
+    create_snapshot(directory, keep=2, pause=0, now=lambda: datetime(2025, 1, 1, 10, 1))
+
+    assert [os.path.basename(path) for path in list_snapshots(directory)] == \
+        ['20250101-100000-2', '20250101-100100']
+
+def test_backup_command(backup_db):
+    """Test the backup CLI command."""
+    runner = create_app().test_cli_runner()
+
+    result = runner.invoke(args=['backup', '--dir', str(backup_db / 'backups'), '--keep', '3'])
+
+    assert result.exit_code == 0
+    assert 'library.db' in result.output
+    assert len(list_snapshots(str(backup_db / 'backups'))) == 1
@@ -1,7 +1,10 @@
 import pytest
+import database
 from library_service import (
+    add_book_to_catalog,
     borrow_book_by_patron,
 )
+from services.library_service import MAX_BOOKS_PER_PATRON
 
 """
 ### R3: Book Borrowing Interface
@@ -49,3 +52,17 @@ def test_borrow_book_nonexistent_book():
     assert success == False
     assert "Book not found" in message
 
+def test_borrow_book_refused_at_limit():
+    """Test that a patron with 5 books on loan can't borrow a sixth."""
+    book_ids = []
+    for n in range(MAX_BOOKS_PER_PATRON + 1):
+        add_book_to_catalog(f"Limit Book {n}", "Author", f"555000000{n:04d}", 1)
+        book_ids.append(database.get_book_by_isbn(f"555000000{n:04d}")['id'])
+
+    for book_id in book_ids[:MAX_BOOKS_PER_PATRON]:
+        assert borrow_book_by_patron("333333", book_id)[0] == True
+    success, message = borrow_book_by_patron("333333", book_ids[-1])
+
+    assert MAX_BOOKS_PER_PATRON == 5
+    assert success == False
+    assert "maximum borrowing limit of 5 books" in message
@@ -0,0 +1,86 @@
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from database import get_book_by_id, get_book_by_isbn, to_epoch
+from services.library_service import (
+    add_book_to_catalog,
+    borrow_books_by_patron,
+    return_books_by_patron,
+)
+
+"""
+### R3/R4: Bulk checkout and check-in for scanner stations
+- Processes a list of book IDs for one patron in a single transaction
+- Checks the borrowing limit once for the whole stack (max 5 books)
+- Reports a result for every scanned item
+"""
+
+def test_bulk_borrow_invalid_patron_id():
+    """Test bulk borrowing with an invalid patron ID."""
+    success, message, results = borrow_books_by_patron("12345", [1, 2])
+
+    assert success == False
+    assert "Invalid patron ID" in message
+    assert results == []
+
+def test_bulk_borrow_empty_list():
+    """Test bulk borrowing with no book IDs."""
+    success, message, results = borrow_books_by_patron("123456", [])
+
+    assert success == False
+    assert "At least one book" in message
+
+def test_bulk_borrow_and_return_round_trip():
+    """Test borrowing a stack and returning it, with per-item results."""
+    add_book_to_catalog("Bulk Test Book", "Bulk Author", "5550000000001", 2)
+    book = get_book_by_isbn("5550000000001")
+    before = book['available_copies']
+
+    success, message, results = borrow_books_by_patron("777001", [book['id'], 99999])
+
+    assert success == True
+    assert [r['success'] for r in results] == [True, False]
+    assert "Book not found" in results[1]['message']
+    assert get_book_by_id(book['id'])['available_copies'] == before - 1
+
+    success, message, results = return_books_by_patron("777001", [book['id'], book['id']])
+
+    assert success == True
+    assert [r['success'] for r in results] == [True, False]
+    assert "not borrowed" in results[1]['message']
+    assert get_book_by_id(book['id'])['available_copies'] == before
+
+def test_bulk_borrow_limit_checked_once(mocker):
+    """Test that items past the borrowing limit are refused."""
+    bulk = mocker.patch(
+        'services.library_service.borrow_books_bulk',
+        return_value=[{'book_id': 1, 'status': 'borrowed', 'title': 'A'},
+                      {'book_id': 2, 'status': 'limit', 'title': 'B'}]
+    )
+
+    success, message, results = borrow_books_by_patron("123456", [1, 2])
+
+    assert success == True
+    assert "Borrowed 1 of 2" in message
+    assert "maximum borrowing limit" in results[1]['message']
+    assert bulk.call_args[0][4] == 5
+
+def test_bulk_return_reports_late_fee(mocker):
+    """Test that returning an overdue book reports its late fee."""
+    mocker.patch(
+        'services.library_service.return_books_bulk',
+        return_value=[{'book_id': 1, 'status': 'returned', 'title': 'A',
+                       'due_ts': to_epoch(datetime.now() - timedelta(days=3, hours=1))}]
+    )
+
+    success, message, results = return_books_by_patron("123456", [1])
+
+    assert results[0]['late_fee'] == 1.5
+    assert "Late fee: $1.50" in results[0]['message']
+
+def test_bulk_api_rejects_bad_body():
+    """Test that the bulk endpoints validate the JSON body."""
+    client = create_app().test_client()
+
+    assert client.post('/api/bulk_borrow', json={'patron_id': '123456'}).status_code == 400
+    assert client.post('/api/bulk_return', json={'patron_id': '123456', 'book_ids': ['1']}).status_code == 400
@@ -1,4 +1,6 @@
 import pytest
+from datetime import datetime, timedelta
+import database
 from library_service import (
     calculate_late_fee_for_book,
 )
@@ -48,3 +50,13 @@ def test_calculate_late_fee_invalid_book_id():
     
     if result:
         assert "Book not found" in str(result)
+
+@pytest.mark.parametrize('days_overdue, fee', [(7, 3.5), (8, 4.5), (18, 14.5), (19, 15.0), (20, 15.0)])
+def test_calculate_late_fee_cap_boundary(days_overdue, fee):
+    """Test that the $15.00 cap applies from day 19, the first day the daily rate would exceed it."""
+    due_date = datetime.now() - timedelta(days=days_overdue, hours=1)
+    database.insert_borrow_record("222222", 1, due_date - timedelta(days=14), due_date)
+
+    result = calculate_late_fee_for_book("222222", 1)
+
+    assert (result['days_overdue'], result['fee_amount']) == (days_overdue, fee)
@@ -0,0 +1,78 @@
+import pytest
+import database
+from app import create_app
+from services.catalog_replica import CatalogReplica, enable_catalog_replica
+from services.library_service import add_book_to_catalog, borrow_books_by_patron, return_books_by_patron
+
+"""
+### In-memory catalog replica
+- Book reads are served from column-oriented memory when the replica is enabled
+- The replica follows insert_book and availability changes through the change feed
+- It is refused when several worker processes may write (WAL or forked workers)
+"""
+
+BOOKS = [
+    {'id': 2, 'title': 'To Kill a Mockingbird', 'author': 'Harper Lee', 'isbn': '9780061120084',
+     'total_copies': 2, 'available_copies': 2},
+    {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald', 'isbn': '9780743273565',
+     'total_copies': 3, 'available_copies': 3},
+]
+
+@pytest.fixture
+def replica():
+    create_app()
+    yield enable_catalog_replica()
+    database.attach_catalog_replica(None)
+
+
+def test_replica_lookups_and_title_order():
+    """Test ID/ISBN lookups and title ordering."""
+    replica = CatalogReplica()
+    replica.load(BOOKS)
+    replica.add_book({'id': 3, 'title': 'Animal Farm', 'author': 'George Orwell', 'isbn': '9780451526342',
+                      'total_copies': 1, 'available_copies': 1})
+
+    assert [book['title'] for book in replica.all_books()] == \
+        ['Animal Farm', 'The Great Gatsby', 'To Kill a Mockingbird']
+    assert replica.get_by_id(2) == BOOKS[0]
+    assert replica.get_by_isbn('9780743273565') == BOOKS[1]
+    assert replica.get_by_id(99) is None
+
+def test_replica_memory_report():
+    """Test that the memory report covers every book."""
+    replica = CatalogReplica()
+    replica.load(BOOKS)
+
+    report = replica.memory_report()
+
+    assert report['books'] == 2
+    assert report['bytes'] == sum(report['breakdown'].values())
+    assert report['bytes_per_100k_books'] > 0
+
+def test_replica_matches_database(replica):
+    """Test that replica reads match what SQLite holds."""
+    conn = database.get_db_connection()
+    rows = [dict(row) for row in conn.execute('SELECT * FROM books')]
+    conn.close()
+
+    assert sorted(database.get_all_books(), key=lambda book: book['id']) == rows
+
+def test_replica_follows_change_feed(replica):
+    """Test that new books and availability changes reach the replica."""
+    add_book_to_catalog("Replica Test Book", "Replica Author", "5550000000033", 2)
+    book = database.get_book_by_isbn("5550000000033")
+    assert book['available_copies'] == 2
+
+    borrow_books_by_patron("777033", [book['id']])
+    assert database.get_book_by_id(book['id'])['available_copies'] == 1
+
+    return_books_by_patron("777033", [book['id']])
+    assert database.get_book_by_id(book['id'])['available_copies'] == 2
+
+@pytest.mark.parametrize('setting', ['SQLITE_WAL', 'TASK_WORKERS_AFTER_FORK'])
+def test_replica_refused_with_several_writers(setting):
+    """Test that the replica can't be enabled where other processes' writes would bypass it."""
+    with pytest.raises(ValueError, match='single writer process'):
+        create_app({'CATALOG_REPLICA': True, setting: True})
+
+    assert database._catalog_replica is None
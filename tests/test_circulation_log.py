@@ -0,0 +1,248 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import database
+from app import create_app
+from database import (
+    get_circulation_events, get_consumer_offset, init_database, insert_book, latest_circulation_event,
+    to_epoch
+)
+from services.circulation_log import CirculationConsumer
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, borrow_books_by_patron, pay_late_fees, place_hold,
+    refund_late_fee_payment, return_book_by_patron
+)
+from services import library_service
+from services.payment_service import PaymentGateway
+from services.task_executor import task_executor
+
+"""
+### Circulation event log
+- Borrows, returns, new books, payments and refunds are appended to circulation_events
+  in the same transaction as the change
+- The log can't be edited, and seq only grows
+- Consumers read the events after their saved offset and save the new offset with their own writes
+"""
+
+def _new_events(after):
+    return [(event['event'], event['patron_id'], event['book_id']) for event in get_circulation_events(after)]
+
+
+def test_sample_data_in_log():
+    """Test that the sample catalog and its loan are in the log from the start."""
+    assert _new_events(0) == [
+        ('add_book', None, 1), ('add_book', None, 2), ('add_book', None, 3), ('borrow', '123456', 3)
+    ]
+
+def test_circulation_written_to_log():
+    """Test that adding a book, borrowing and returning each append an event."""
+    before = latest_circulation_event()
+    add_book_to_catalog("Dune", "Frank Herbert", "9780441172719", 2)
+    borrow_book_by_patron("222222", 1)
+    return_book_by_patron("222222", 1)
+
+    assert _new_events(before) == [('add_book', None, 4), ('borrow', '222222', 1), ('return', '222222', 1)]
+    borrow, returned = get_circulation_events(before)[1:]
+    assert returned['borrow_date'] == borrow['occurred_at']
+    assert returned['due_date'] == borrow['due_date'] == borrow['occurred_at'] + 14 * 24 * 60 * 60
+    assert returned['amount'] == 0.0
+
+def test_return_to_holder_logs_return_then_borrow():
+    """Test that a copy lent to a holder shows up as the return followed by the holder's borrow."""
+    place_hold("222222", 3)
+    before = latest_circulation_event()
+
+    return_book_by_patron("123456", 3)
+
+    assert _new_events(before) == [('return', '123456', 3), ('borrow', '222222', 3)]
+
+def test_bulk_borrow_logs_each_book():
+    """Test that a bulk checkout logs only the books actually borrowed."""
+    before = latest_circulation_event()
+
+    borrow_books_by_patron("222222", [1, 3, 2])
+
+    assert _new_events(before) == [('borrow', '222222', 1), ('borrow', '222222', 2)]
+
+def test_failed_write_logs_nothing():
+    """Test that a rolled-back change leaves no event behind."""
+    before = latest_circulation_event()
+
+    assert insert_book("Copy", "Author", "9780743273565", 1, 1) == False
+    assert latest_circulation_event() == before
+
+def test_payments_and_refunds_logged():
+    """Test that successful gateway payments and refunds are logged with their transaction ID."""
+    now = datetime.now()
+    database.insert_borrow_record("654321", 1, now - timedelta(days=24), now - timedelta(days=10))
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123", "Success")
+    gateway.refund_payment.return_value = (True, "Refunded")
+    before = latest_circulation_event()
+
+    pay_late_fees("654321", 1, gateway)
+    refund_late_fee_payment("txn_123", 2.5, gateway)
+    gateway.process_payment.return_value = (False, "", "Declined")
+    pay_late_fees("654321", 1, gateway)
+
+    payment, refund = get_circulation_events(before)
+    assert (payment['event'], payment['patron_id'], payment['amount'], payment['reference']) == \
+        ('payment', '654321', 6.5, 'txn_123')
+    assert (refund['event'], refund['patron_id'], refund['amount']) == ('refund', '654321', 2.5)
+    assert refund['reference'].startswith('refund_txn_123_')
+
+def test_refund_write_retried_once_per_refund():
+    """Test that a retried refund write applies once, while separate partial refunds of one payment each apply."""
+    database.record_late_fee_payment("654321", 1, 6.5, "txn_123")
+    before = latest_circulation_event()
+
+    database.record_late_fee_refund("txn_123", 2.5, "refund_a")
+    database.record_late_fee_refund("txn_123", 2.5, "refund_a")
+    database.record_late_fee_refund("txn_123", 1.0, "refund_b")
+
+    assert [(event['event'], event['reference']) for event in get_circulation_events(before)] == \
+        [('refund', 'refund_a'), ('refund', 'refund_b')]
+    assert database.get_patron_counters("654321")['outstanding_fees'] == -3.0
+
+def test_refund_retry_reuses_refund_id(monkeypatch):
+    """Test that a refund whose first write fails is retried under the same refund ID."""
+    database.record_late_fee_payment("654321", 1, 6.5, "txn_123")
+    gateway = Mock(spec=PaymentGateway)
+    gateway.refund_payment.return_value = (True, "Refunded")
+    submitted = []
+    monkeypatch.setattr(library_service, 'submit_task', lambda name, **payload: submitted.append(payload))
+    log_event = database._log_circulation_event
+    def fail(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(database, '_log_circulation_event', fail)
+
+    assert refund_late_fee_payment("txn_123", 2.5, gateway)[0] == True
+    monkeypatch.setattr(database, '_log_circulation_event', log_event)
+    database.record_late_fee_refund(**submitted[0])
+    database.record_late_fee_refund(**submitted[0])
+
+    assert submitted[0]['refund_id'].startswith('refund_txn_123_')
+    assert database.get_patron_counters("654321")['outstanding_fees'] == -4.0
+
+def test_payment_write_retried_after_failure(monkeypatch):
+    """Test that a payment the gateway accepted is still recorded, once, when the first write fails."""
+    now = datetime.now()
+    database.insert_borrow_record("654321", 1, now - timedelta(days=24), now - timedelta(days=10))
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123", "Success")
+    monkeypatch.setattr(task_executor, 'workers', 0)
+    failures = iter([sqlite3.OperationalError('database is locked')])
+    log_event = database._log_circulation_event
+    def fail_once(*args, **kwargs):
+        error = next(failures, None)
+        if error:
+            raise error
+        return log_event(*args, **kwargs)
+    monkeypatch.setattr(database, '_log_circulation_event', fail_once)
+    before = latest_circulation_event()
+
+    assert pay_late_fees("654321", 1, gateway)[0] == True
+    database.record_late_fee_payment("654321", 1, 6.5, "txn_123")
+
+    assert [(event['event'], event['reference']) for event in get_circulation_events(before)] == \
+        [('payment', 'txn_123')]
+    assert database.get_patron_counters("654321")['outstanding_fees'] == -6.5
+    assert database.count_task_retries() == {}
+
+def test_log_is_append_only():
+    """Test that events can't be changed or deleted."""
+    conn = database.get_db_connection()
+    with pytest.raises(sqlite3.DatabaseError, match='append-only'):
+        conn.execute("UPDATE circulation_events SET patron_id = '999999'")
+    with pytest.raises(sqlite3.DatabaseError, match='append-only'):
+        conn.execute('DELETE FROM circulation_events')
+    conn.close()
+
+def test_consumer_resumes_from_saved_offset():
+    """Test that a consumer only ever sees each event once, across instances."""
+    seen = []
+    consumer = CirculationConsumer('counter', lambda conn, events: seen.extend(events), batch_size=3)
+
+    assert consumer.catch_up() == 4
+    assert consumer.poll() == 0
+    borrow_book_by_patron("222222", 1)
+    assert CirculationConsumer('counter', lambda conn, events: seen.extend(events)).poll() == 1
+
+    assert [event['seq'] for event in seen] == list(range(1, 6))
+    assert get_consumer_offset('counter') == 5
+
+def test_consumer_writes_commit_with_offset():
+    """Test that a consumer's table updates and offset commit or roll back together."""
+    conn = database.get_db_connection()
+    conn.execute('CREATE TABLE borrow_counts (book_id INTEGER PRIMARY KEY, loans INTEGER NOT NULL)')
+    conn.commit()
+    conn.close()
+
+    def count_borrows(conn, events):
+        for event in events:
+            if event['event'] == 'borrow':
+                conn.execute('''
+                    INSERT INTO borrow_counts VALUES (?, 1)
+                    ON CONFLICT (book_id) DO UPDATE SET loans = loans + 1
+                ''', (event['book_id'],))
+        if any(event['book_id'] == 2 for event in events):
+            raise RuntimeError('consumer failed')
+
+    consumer = CirculationConsumer('borrow_counts', count_borrows, batch_size=2)
+    with pytest.raises(RuntimeError):
+        consumer.catch_up()
+
+    conn = database.get_db_connection()
+    counts = dict(conn.execute('SELECT book_id, loans FROM borrow_counts').fetchall())
+    conn.close()
+    # The first batch (books 1 and 2 added) failed, so nothing was kept
+    assert counts == {} and consumer.offset() == 0
+
+def test_migration_backfills_existing_history(tmp_path, monkeypatch):
+    """Test that upgrading a database writes its existing books and loans to the log, in time order."""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+            author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL);
+        CREATE TABLE borrow_records (id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL, borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT);
+        INSERT INTO books VALUES (1, '1984', 'George Orwell', '9780451524935', 1, 0);
+        INSERT INTO borrow_records VALUES
+            (1, '123456', 1, '2025-01-01T10:00:00', '2025-01-15T10:00:00', NULL),
+            (2, '654321', 1, '2024-12-01T09:30:00', '2024-12-15T09:30:00', '2024-12-10T12:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DATABASE', path)
+
+    init_database()
+
+    events = get_circulation_events(0)
+    assert [(event['event'], event['patron_id']) for event in events] == [
+        ('add_book', None), ('borrow', '654321'), ('return', '654321'), ('borrow', '123456')
+    ]
+    assert events[2]['occurred_at'] == to_epoch(datetime(2024, 12, 10, 12))
+    assert events[2]['borrow_date'] == to_epoch(datetime(2024, 12, 1, 9, 30))
+
+def test_circulation_events_api():
+    """Test tailing the log and saving a consumer offset through the JSON API."""
+    client = create_app().test_client()
+
+    first = client.get('/api/circulation_events?limit=3').get_json()
+    assert first['count'] == 3 and first['next_offset'] == 3
+    rest = client.get(f"/api/circulation_events?after={first['next_offset']}").get_json()
+    assert [event['event'] for event in rest['events']] == ['borrow']
+
+    saved = client.put('/api/circulation_events/offsets/reports', json={'offset': 3})
+    assert saved.get_json() == {'consumer': 'reports', 'offset': 3}
+    assert client.get('/api/circulation_events?consumer=reports').get_json()['next_offset'] == 4
+    assert client.get('/api/circulation_events/offsets').get_json()['consumers']['reports'] == \
+        {'offset': 3, 'lag': 1}
+
+    assert client.put('/api/circulation_events/offsets/reports', json={'offset': 99}).status_code == 400
+    assert client.put('/api/circulation_events/offsets/reports', json={'offset': '3'}).status_code == 400
+    assert client.get('/api/circulation_events?limit=0').status_code == 400
+    assert client.get('/api/circulation_events?after=x').status_code == 400
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import pytest
+import database
+from app import create_app
+from database import configure_database, get_all_books, init_database, insert_book
+from services.search_cache import search_cache
+from services.suggest_index import suggest
+
+"""
+### Database configuration
+- The database location and mode (file, in-memory, temp copy) are app configuration
+- Switching databases resets in-memory caches and indexes built from the old one
+"""
+
+def _book_count(path):
+    conn = sqlite3.connect(path)
+    count = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_memory_databases_are_separate():
+    """Test that each in-memory configuration starts empty and doesn't see the previous one."""
+    insert_book('Memory Book', 'Author', '5555555555555', 1, 1)
+    assert any(book['isbn'] == '5555555555555' for book in get_all_books())
+
+    configure_database(':memory:')
+    init_database()
+
+    assert get_all_books() == []
+
+def test_create_app_uses_configured_file(tmp_path):
+    """Test that create_app points the database helpers at the configured file."""
+    path = str(tmp_path / 'configured.db')
+    create_app({'DATABASE': path, 'SEED_SAMPLE_DATA': True})
+
+    assert database.DATABASE == path
+    assert _book_count(path) == len(get_all_books()) > 0
+
+def test_temp_mode_leaves_the_original_alone(tmp_path):
+    """Test that temp mode works on a copy that is removed on reconfiguration."""
+    path = str(tmp_path / 'original.db')
+    create_app({'DATABASE': path, 'SEED_SAMPLE_DATA': True})
+    original_count = _book_count(path)
+
+    copy = configure_database(path, mode='temp')
+    insert_book('Temp Book', 'Author', '6666666666666', 1, 1)
+
+    assert copy != path
+    assert _book_count(copy) == original_count + 1
+    assert _book_count(path) == original_count
+
+    configure_database(':memory:')
+    assert not os.path.exists(copy)
+
+def test_unknown_mode_rejected():
+    """Test that an unknown database mode is an error."""
+    with pytest.raises(ValueError):
+        configure_database(mode='cloud')
+
+def test_reset_clears_caches():
+    """Test that switching databases drops cached searches and suggestions."""
+    client = create_app().test_client()
+    client.get('/search?q=gatsby&type=title')
+    assert suggest('great')
+
+    configure_database(':memory:')
+    init_database()
+
+    assert search_cache.stats()['size'] == 0
+    assert suggest('great') == []
@@ -0,0 +1,55 @@
+import pytest
+from library_service import search_books_in_catalog
+from services.fuzzy_index import FuzzyIndex, edit_distance_within
+
+"""
+### R6: Book Search - typo-tolerant mode
+- `type=fuzzy` matches titles and authors within a small edit distance
+- Results are ranked with the closest matches first
+"""
+
+BOOKS = [
+    {'id': 1, 'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald'},
+    {'id': 2, 'title': 'Animal Farm', 'author': 'George Orwell'},
+    {'id': 3, 'title': '1984', 'author': 'George Orwell'},
+    {'id': 4, 'title': 'Tender Is the Night', 'author': 'F. Scott Fitzgerald'},
+]
+
+def test_edit_distance_within():
+    """Test the bounded Levenshtein distance."""
+    assert edit_distance_within("orwell", "orwell", 2) == 0
+    assert edit_distance_within("orwel", "orwell", 2) == 1
+    assert edit_distance_within("fitzgerlad", "fitzgerald", 2) == 2
+    assert edit_distance_within("gatsby", "orwell", 2) is None
+
+def test_fuzzy_index_finds_misspelled_author():
+    """Test that misspelled author names still find their books."""
+    index = FuzzyIndex()
+    index.build(BOOKS)
+
+    assert sorted(book_id for book_id, _, _ in index.search("Orwel")) == [2, 3]
+    assert sorted(book_id for book_id, _, _ in index.search("Fitzgerlad")) == [1, 4]
+
+def test_fuzzy_index_ranks_closest_first():
+    """Test that books matching more words with fewer edits rank first."""
+    index = FuzzyIndex()
+    index.build(BOOKS)
+
+    ranked = index.search("great gatsbi fitzgerald")
+
+    assert ranked[0][0] == 1
+    assert ranked[0][1] == 3
+
+def test_fuzzy_index_short_words_exact():
+    """Test that very short words must match exactly."""
+    index = FuzzyIndex()
+    index.build(BOOKS)
+
+    assert index.search("fam") == []
+    assert index.search("") == []
+
+def test_search_fuzzy_type():
+    """Test the fuzzy search type through the business logic function."""
+    result = search_books_in_catalog("Orwel", "fuzzy")
+
+    assert any("Orwell" in book['author'] for book in result)
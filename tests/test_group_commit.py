@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+import pytest
+from datetime import datetime, timedelta
+import database
+from database import (
+    disable_group_commit, enable_group_commit, get_book_by_isbn, get_patron_borrow_count,
+    group_commit_stats, init_database, insert_book, insert_borrow_record
+)
+from services.group_commit import GroupCommitWriter
+
+"""
+### Group commit
+- Concurrent writes are committed together by one writer thread
+- A failing write is rolled back alone; the rest of its batch commits
+- The database helpers keep their return values with group commit enabled
+- A closed writer refuses new operations; run_write then writes directly
+"""
+
+@pytest.fixture
+def writer(tmp_path):
+    """A writer on a database with one items table."""
+    path = str(tmp_path / 'writer.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+    conn.commit()
+    conn.close()
+    writer = GroupCommitWriter(lambda: sqlite3.connect(path), window=0.05)
+    yield writer, path
+    writer.close()
+
+@pytest.fixture
+def grouped_db(tmp_path, monkeypatch):
+    """A fresh database with group commit enabled."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'grouped.db'))
+    init_database()
+    enable_group_commit(window=0.01)
+    yield
+    disable_group_commit()
+
+def _insert(name):
+    return lambda conn: conn.execute('INSERT INTO items (name) VALUES (?)', (name,)).lastrowid
+
+def _count(path):
+    conn = sqlite3.connect(path)
+    count = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_concurrent_writes_share_commits(writer):
+    """Test that operations arriving together are committed in one batch."""
+    writer, path = writer
+    futures = [writer.submit(_insert(f'item {i}')) for i in range(20)]
+
+    assert sorted(future.result() for future in futures) == list(range(1, 21))
+    assert _count(path) == 20
+    assert writer.stats()['batches'] < 20
+
+def test_failed_operation_rolled_back_alone(writer):
+    """Test that one failing operation doesn't undo the rest of its batch."""
+    writer, path = writer
+    futures = [writer.submit(_insert('a')), writer.submit(_insert('a')), writer.submit(_insert('b'))]
+
+    assert futures[0].result() == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result()
+    assert futures[2].result() is not None
+    assert _count(path) == 2
+    assert writer.stats()['failed_operations'] == 1
+
+def test_result_is_committed_when_future_resolves(writer):
+    """Test that a caller sees its write from another connection as soon as it returns."""
+    writer, path = writer
+
+    writer.run(_insert('visible'))
+
+    assert _count(path) == 1
+
+def test_closed_writer_refuses_operations(writer):
+    """Test that an operation submitted after close raises instead of waiting forever."""
+    writer, path = writer
+    writer.close()
+
+    with pytest.raises(RuntimeError, match='closed'):
+        writer.submit(_insert('late'))
+    assert _count(path) == 0
+
+def test_run_write_falls_back_when_writer_closes(grouped_db, monkeypatch):
+    """Test that a write racing disable_group_commit is written directly."""
+    writer = database._writer_for(database.DATABASE)
+    monkeypatch.setattr(database, '_writer_for', lambda path: writer)
+    disable_group_commit()
+
+    assert insert_book('Late Write', 'Author', '9780000000099', 1, 1) == True
+    assert get_book_by_isbn('9780000000099')['title'] == 'Late Write'
+
+def test_helpers_with_group_commit(grouped_db):
+    """Test the write helpers' return values through the writer thread."""
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(
+        insert_book(f'Book {i}', 'Author', f'{9780000000000 + i}', 1, 1))) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 10
+    assert insert_book('Duplicate', 'Author', '9780000000000', 1, 1) == False
+    assert get_book_by_isbn('9780000000003')['title'] == 'Book 3'
+
+    now = datetime.now()
+    assert insert_borrow_record('123456', 1, now, now + timedelta(days=14)) == True
+    assert get_patron_borrow_count('123456') == 1
+    assert sum(stats['operations'] for stats in group_commit_stats().values()) == 12
@@ -0,0 +1,160 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+import database
+from app import create_app
+from database import add_sample_data, get_book_by_id, get_patron_borrowed_books, init_database, insert_borrow_record
+from library_service import return_book_by_patron
+from services.hold_queue import hold_queues
+from services.library_service import (
+    cancel_hold, get_hold_positions, place_hold, return_books_by_patron
+)
+
+"""
+### Holds
+- A patron can join the queue for a book with no copies available
+- A returned copy is lent to the first patron in the queue who is under the borrowing limit,
+  in the same transaction as the return
+- Patrons can look up their position in each queue
+"""
+
+def _positions(patron_id):
+    return {hold['book_id']: hold['position'] for hold in get_hold_positions(patron_id)[2]}
+
+
+def test_place_hold_reports_position():
+    """Test that holds on an unavailable book queue up in order."""
+    first = place_hold("222222", 3)
+    second = place_hold("333333", 3)
+
+    assert first == (True, 'Hold placed on "1984". You are number 1 in the queue.')
+    assert second[0] == True and "number 2" in second[1]
+    assert _positions("333333") == {3: 2}
+    assert get_hold_positions("333333")[2][0]['queue_length'] == 2
+
+def test_place_hold_rejections():
+    """Test holds on available books, books already on loan, duplicates and bad input."""
+    assert place_hold("222222", 1) == (False, "This book is available to borrow now.")
+    assert place_hold("123456", 3) == (False, "You already have this book on loan.")
+    place_hold("222222", 3)
+    assert place_hold("222222", 3) == (False, "You already have a hold on this book.")
+    assert place_hold("22222", 3)[1].startswith("Invalid patron ID")
+    assert place_hold("222222", 999) == (False, "Book not found.")
+
+def test_return_lends_copy_to_first_holder():
+    """Test that a return goes straight to the first patron in the queue."""
+    place_hold("222222", 3)
+    place_hold("333333", 3)
+
+    success, message = return_book_by_patron("123456", 3)
+
+    assert success == True and "lent to the next patron on hold" in message
+    assert get_book_by_id(3)['available_copies'] == 0
+    assert [loan['book_id'] for loan in get_patron_borrowed_books("222222")] == [3]
+    assert _positions("222222") == {}
+    assert _positions("333333") == {3: 1}
+
+def test_returned_copy_never_shows_available_to_waiting_holder(tmp_path, monkeypatch):
+    """Test that no other connection or listener ever sees the copy available between return and loan."""
+    database.configure_database(str(tmp_path / 'holds.db'))
+    init_database()
+    add_sample_data()
+    place_hold("222222", 3)
+    seen, changes = [], []
+    monkeypatch.setattr(database, '_change_listeners',
+                        database._change_listeners + [lambda event, data: changes.append(event)])
+
+    # Each event of the return is written inside its transaction; read what's committed at that moment
+    log_event = database._log_circulation_event
+    def log_and_look(conn, event, *args, **kwargs):
+        reader = sqlite3.connect(database.DATABASE)
+        seen.append((event, reader.execute('SELECT available_copies FROM books WHERE id = 3').fetchone()[0]))
+        reader.close()
+        return log_event(conn, event, *args, **kwargs)
+    monkeypatch.setattr(database, '_log_circulation_event', log_and_look)
+
+    assert return_book_by_patron("123456", 3)[0] == True
+
+    assert seen == [('return', 0), ('borrow', 0)]
+    assert 'availability_changed' not in changes and 'hold_filled' in changes
+    assert get_book_by_id(3)['available_copies'] == 0
+    assert place_hold("444444", 3)[0] == True
+
+def test_return_skips_holder_at_limit():
+    """Test that a holder at the borrowing limit keeps their place while the next holder is served."""
+    now = datetime.now()
+    for _ in range(5):
+        insert_borrow_record("222222", 1, now, now + timedelta(days=14))
+    place_hold("222222", 3)
+    place_hold("333333", 3)
+
+    return_book_by_patron("123456", 3)
+
+    assert [loan['book_id'] for loan in get_patron_borrowed_books("333333")] == [3]
+    assert _positions("222222") == {3: 1}
+
+def test_return_without_holds_makes_copy_available():
+    """Test that the copy becomes available when nobody is waiting."""
+    success, message = return_book_by_patron("123456", 3)
+
+    assert success == True and "hold" not in message
+    assert get_book_by_id(3)['available_copies'] == 1
+
+def test_bulk_return_fills_holds():
+    """Test that check-in stations fill holds too."""
+    place_hold("222222", 3)
+
+    success, _, results = return_books_by_patron("123456", [3])
+
+    assert "lent to the next patron on hold" in results[0]['message']
+    assert get_book_by_id(3)['available_copies'] == 0
+
+def test_cancel_hold():
+    """Test leaving a queue moves later holders up."""
+    place_hold("222222", 3)
+    place_hold("333333", 3)
+
+    assert cancel_hold("222222", 3) == (True, "Hold cancelled.")
+    assert cancel_hold("222222", 3) == (False, "You have no hold on this book.")
+    assert _positions("333333") == {3: 1}
+
+def test_holds_api():
+    """Test placing, listing and cancelling holds through the JSON API."""
+    client = create_app().test_client()
+
+    placed = client.post('/api/holds', json={'patron_id': '222222', 'book_id': 3})
+    rejected = client.post('/api/holds', json={'patron_id': '222222', 'book_id': 1})
+    listed = client.get('/api/holds/222222').get_json()
+
+    assert placed.status_code == 201 and rejected.status_code == 400
+    assert client.post('/api/holds', json={'patron_id': 222222}).status_code == 400
+    assert listed['count'] == 1 and listed['holds'][0]['position'] == 1
+    assert client.delete('/api/holds/222222/3').status_code == 200
+    assert client.delete('/api/holds/222222/3').status_code == 404
+    assert client.get('/api/holds/abc').status_code == 400
+
+def test_positions_reread_only_after_queue_changes():
+    """Test that repeated lookups use the in-memory queue and changes made elsewhere are picked up."""
+    place_hold("222222", 3)
+    place_hold("333333", 3)
+    _positions("333333")
+    reloads = hold_queues.reloads
+
+    for _ in range(5):
+        assert _positions("333333") == {3: 2}
+    assert hold_queues.reloads == reloads
+
+    # Another process removes the first hold
+    conn = database.get_db_connection()
+    conn.execute("DELETE FROM holds WHERE patron_id = '222222'")
+    conn.commit()
+    conn.close()
+    assert _positions("333333") == {3: 1}
+
+def test_hold_form_on_catalog():
+    """Test the Place Hold form shown for unavailable books."""
+    client = create_app().test_client()
+
+    assert b'Place Hold' in client.get('/catalog').data
+    response = client.post('/hold', data={'patron_id': '222222', 'book_id': '3'}, follow_redirects=True)
+    assert b'You are number 1 in the queue' in response.data
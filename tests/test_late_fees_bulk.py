@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from database import to_epoch
+from records import Loan
+from services.library_service import calculate_late_fees_bulk
+
+"""
+### R5: Late Fee Calculation - batch API
+- POST `/api/late_fees` prices many patron/book pairs, or whole patrons, in one request
+- Invalid items are reported per item without failing the batch
+"""
+
+def loan(book_id, days_overdue):
+    due = datetime.now() - timedelta(days=days_overdue, hours=1)
+    return Loan(book_id, 'T', 'A', to_epoch(due - timedelta(days=14)), to_epoch(due), to_epoch(datetime.now()))
+
+
+def test_bulk_late_fees_pairs_and_patrons(mocker):
+
+    lookup = mocker.patch(
+        'services.library_service.get_borrowed_books_for_patrons',
+        return_value={'123456': [loan(1, 3), loan(2, 10)], '654321': [loan(3, 30)]}
+    )
+    mocker.patch('services.library_service.get_existing_book_ids', return_value=set())
+
+    results = calculate_late_fees_bulk([('123456', 1), ('123456', 2)], ['654321'])
+
+    assert [r['fee_amount'] for r in results] == [1.5, 6.5, 15.0]
+    assert [r['days_overdue'] for r in results] == [3, 10, 30]
+    assert all(r['status'] == 'success' for r in results)
+    lookup.assert_called_once()
+
+
+def test_bulk_late_fees_per_item_errors(mocker):
+
+    mocker.patch(
+        'services.library_service.get_borrowed_books_for_patrons',
+        return_value={'123456': [loan(1, 0)]}
+    )
+    mocker.patch('services.library_service.get_existing_book_ids', return_value={2})
+
+    results = calculate_late_fees_bulk([('12345', 1), ('123456', 2), ('123456', 99)], ['abc'])
+
+    assert [r['status'] for r in results] == ['error'] * 4
+    assert "Invalid patron ID" in results[0]['error']
+    assert "not borrowed" in results[1]['error']
+    assert "Book not found" in results[2]['error']
+    assert "Invalid patron ID" in results[3]['error']
+
+
+def test_bulk_late_fees_api():
+
+    client = create_app().test_client()
+
+    response = client.post('/api/late_fees', json={
+        'items': [{'patron_id': '123456', 'book_id': 3}],
+        'patron_ids': ['123456']
+    })
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert data['count'] == len(data['results'])
+    assert data['results'][0]['book_id'] == 3
+
+
+def test_bulk_late_fees_api_rejects_bad_body():
+
+    client = create_app().test_client()
+
+    assert client.post('/api/late_fees', json=[]).status_code == 400
+    assert client.post('/api/late_fees', json={}).status_code == 400
+    assert client.post('/api/late_fees', json={'items': [{'patron_id': 123456}]}).status_code == 400
@@ -0,0 +1,92 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from database import insert_borrow_record, to_epoch, update_borrow_record_return_date
+from services.loan_export import export_loans, open_export
+
+"""
+### Loan export
+- Every loan (returned and open) is written as one .npy file per column
+- patron_id is dictionary-encoded as int32 codes into patron_ids.npy
+- The export maps back in without NumPy, and with numpy.load(mmap_mode='r') where NumPy is installed
+"""
+
+START = datetime(2025, 3, 3, 12)
+
+def _loan(patron_id, book_id, days_out, borrowed=START):
+    """Record a 14-day loan returned days_out days after borrowed."""
+    insert_borrow_record(patron_id, book_id, borrowed, borrowed + timedelta(days=14))
+    update_borrow_record_return_date(patron_id, book_id, borrowed + timedelta(days=days_out))
+
+
+def _rows(export):
+    """The export's loans as (patron_id, book_id, borrow_date, due_date, return_date) tuples."""
+    columns = [export.column(name) for name in ('patron', 'book_id', 'borrow_date', 'due_date', 'return_date')]
+    return sorted((export.patron_id(patron), *rest) for patron, *rest in zip(*columns))
+
+
+def test_export_round_trip(tmp_path):
+    """Test that every loan comes back from the mapped columns, with open loans' return_date 0."""
+    _loan('222222', 1, 4)
+    _loan('333333', 2, 20)
+    _loan('222222', 3, 1)
+
+    manifest = export_loans(str(tmp_path))
+
+    # The sample data's open loan of "1984" is exported too
+    assert manifest['rows'] == 4 and manifest['patron_ids']['count'] == 3
+    assert os.path.basename(manifest['path']).startswith('loans-')
+    day = 86400
+    with open_export(manifest['path']) as export:
+        assert len(export) == 4
+        rows = _rows(export)
+    assert ('222222', 1, to_epoch(START), to_epoch(START) + 14 * day, to_epoch(START) + 4 * day) in rows
+    assert ('333333', 2, to_epoch(START), to_epoch(START) + 14 * day, to_epoch(START) + 20 * day) in rows
+    assert [row[4] for row in rows if row[0] == '123456'] == [0]
+
+def test_npy_files_have_format_headers(tmp_path):
+    """Test the .npy 1.0 magic, header and 64-byte aligned data offset of every column file."""
+    manifest = export_loans(str(tmp_path))
+
+    for column in list(manifest['columns'].values()) + [manifest['patron_ids']]:
+        with open(os.path.join(manifest['path'], column['file']), 'rb') as file:
+            head = file.read(128)
+        assert head[:8] == b'\x93NUMPY\x01\x00'
+        assert 10 + int.from_bytes(head[8:10], 'little') == 128 and head.endswith(b'\n')
+        assert f"'descr': '{column['dtype']}'".encode() in head
+    assert manifest['columns']['borrow_date']['dtype'] == '<i8'
+
+def test_batches_do_not_change_the_export(tmp_path):
+    """Test that small read batches produce the same export as one batch, without a partial directory left."""
+    for n in range(5):
+        _loan(f'{100000 + n}', n % 3 + 1, n + 1)
+
+    with open_export(export_loans(str(tmp_path / 'one'))['path']) as export:
+        whole = _rows(export)
+    with open_export(export_loans(str(tmp_path / 'many'), batch_size=2)['path']) as export:
+        batched = _rows(export)
+
+    assert len(whole) == 6 and batched == whole
+    assert not [name for name in os.listdir(tmp_path / 'many') if name.endswith('.partial')]
+
+def test_export_loans_command(tmp_path):
+    """Test the export-loans CLI command."""
+    result = create_app().test_cli_runner().invoke(args=['export-loans', '--dir', str(tmp_path)])
+
+    assert result.exit_code == 0 and 'Exported 1 loans (1 patrons)' in result.output
+    assert len(os.listdir(tmp_path)) == 1
+
+def test_numpy_maps_the_export(tmp_path):
+    """Test that numpy.load maps the exported columns and decodes patron codes."""
+    np = pytest.importorskip('numpy')
+    _loan('222222', 2, 7)
+    path = export_loans(str(tmp_path))['path']
+
+    patron = np.load(os.path.join(path, 'patron.npy'), mmap_mode='r')
+    patron_ids = np.load(os.path.join(path, 'patron_ids.npy'), mmap_mode='r')
+    returned = np.load(os.path.join(path, 'return_date.npy'), mmap_mode='r')
+
+    assert patron.dtype == np.int32 and len(patron) == 2
+    assert sorted(patron_ids[patron].astype(str)) == ['123456', '222222']
+    assert (returned > 0).sum() == 1
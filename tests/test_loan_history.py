@@ -0,0 +1,93 @@
+import pytest
+from datetime import datetime, timedelta
+import database
+from app import create_app
+from database import (
+    get_patron_borrow_count, get_patron_history, init_database, insert_borrow_record,
+    reconcile_patron_counters, return_books_bulk, update_borrow_record_return_date
+)
+from services.library_service import get_patron_borrowing_history
+
+"""
+### Loan history
+- borrow_records only holds open loans
+- Returned loans are archived to borrow_history, most recent return first
+- History pages are keyset-paginated
+"""
+
+@pytest.fixture
+def history_db(tmp_path, monkeypatch):
+    """A fresh, fully migrated database with three books."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'history.db'))
+    init_database()
+    conn = database.get_db_connection()
+    conn.executemany('INSERT INTO books VALUES (?, ?, ?, ?, 5, 5)', [
+        (1, '1984', 'George Orwell', '9780451524935'),
+        (2, 'Animal Farm', 'George Orwell', '9780451526342'),
+        (3, 'Emma', 'Jane Austen', '9780141439587'),
+    ])
+    conn.commit()
+    conn.close()
+
+def _table_count(table):
+    conn = database.get_db_connection()
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_return_moves_loan_to_history(history_db):
+    """Test that returning a book archives the loan out of borrow_records."""
+    now = datetime.now()
+    insert_borrow_record('123456', 1, now, now + timedelta(days=14))
+    insert_borrow_record('123456', 2, now, now + timedelta(days=14))
+
+    update_borrow_record_return_date('123456', 1, now)
+    return_books_bulk('123456', [2], now)
+
+    assert _table_count('borrow_records') == 0
+    assert _table_count('borrow_history') == 2
+    assert get_patron_borrow_count('123456') == 0
+    assert reconcile_patron_counters() == []
+
+def test_history_pages_most_recent_first(history_db):
+    """Test paging through history with the cursor."""
+    start = datetime(2025, 1, 1, 10)
+    for book_id in (1, 2, 3):
+        insert_borrow_record('123456', book_id, start, start + timedelta(days=14))
+        update_borrow_record_return_date('123456', book_id, start + timedelta(days=book_id))
+
+    success, message, first = get_patron_borrowing_history('123456', limit=2)
+    success, message, second = get_patron_borrowing_history('123456', first['next_cursor'], limit=2)
+
+    assert [entry['book_id'] for entry in first['history']] == [3, 2]
+    assert [entry['book_id'] for entry in second['history']] == [1]
+    assert second['next_cursor'] is None
+    assert second['history'][0]['return_date'] == datetime(2025, 1, 2, 10)
+
+def test_history_is_per_patron(history_db):
+    """Test that history only includes the requested patron's loans."""
+    now = datetime.now()
+    insert_borrow_record('654321', 1, now, now + timedelta(days=14))
+    update_borrow_record_return_date('654321', 1, now)
+
+    assert get_patron_history('123456') == []
+    assert len(get_patron_history('654321')) == 1
+
+def test_history_invalid_patron():
+    """Test that an invalid patron ID is rejected."""
+    success, message, page = get_patron_borrowing_history('12')
+
+    assert success == False
+    assert "Invalid patron ID" in message
+
+def test_history_api(history_db):
+    """Test the borrowing history API endpoint."""
+    client = create_app().test_client()
+
+    response = client.get('/api/patron/123456/history?limit=5')
+    assert response.status_code == 200
+    assert response.get_json()['next_cursor'] is None
+
+    assert client.get('/api/patron/123456/history?limit=0').status_code == 400
+    assert client.get('/api/patron/abc/history').status_code == 400
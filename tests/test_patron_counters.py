@@ -0,0 +1,146 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import database
+from app import create_app
+from database import (
+    get_patron_borrow_count, get_patron_counters, init_database, insert_borrow_record,
+    reconcile_patron_counters, return_books_bulk, update_borrow_record_return_date
+)
+from services.library_service import get_patron_status_report, pay_late_fees, refund_late_fee_payment
+from services.payment_service import PaymentGateway
+
+"""
+### Patron counters
+- patrons.active_loans is kept in step with open loans by triggers
+- Late fees assessed on return accumulate in patrons.outstanding_fees; payments lower it, refunds raise it
+- reconcile_patron_counters verifies the counters against borrow_records and the circulation log
+"""
+
+@pytest.fixture
+def counters_db(tmp_path, monkeypatch):
+    """A fresh, fully migrated database with two books."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'counters.db'))
+    init_database()
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO books VALUES (1, '1984', 'George Orwell', '9780451524935', 5, 5)")
+    conn.execute("INSERT INTO books VALUES (2, 'Animal Farm', 'George Orwell', '9780451526342', 5, 5)")
+    conn.commit()
+    conn.close()
+
+
+def test_migration_backfills_counters(tmp_path, monkeypatch):
+    """Test that upgrading a database counts the loans it already has."""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE borrow_records (id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL, borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT);
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) VALUES
+            ('123456', 1, '2025-01-01T10:00:00', '2025-01-15T10:00:00', NULL),
+            ('123456', 2, '2025-01-02T10:00:00', '2025-01-16T10:00:00', NULL),
+            ('123456', 3, '2024-12-01T10:00:00', '2024-12-15T10:00:00', '2024-12-10T10:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DATABASE', path)
+
+    init_database()
+
+    assert get_patron_borrow_count('123456') == 2
+    assert reconcile_patron_counters() == []
+
+def test_counters_follow_borrow_and_return(counters_db):
+    """Test that borrowing and returning move the active loan counter."""
+    now = datetime.now()
+    assert get_patron_borrow_count('123456') == 0
+
+    insert_borrow_record('123456', 1, now, now + timedelta(days=14))
+    insert_borrow_record('123456', 2, now, now + timedelta(days=14))
+    assert get_patron_borrow_count('123456') == 2
+
+    update_borrow_record_return_date('123456', 1, now)
+    assert get_patron_borrow_count('123456') == 1
+
+def test_late_fee_added_to_outstanding_fees(counters_db):
+    """Test that fees assessed on return are added to the patron's outstanding fees."""
+    borrowed = datetime.now() - timedelta(days=20)
+    insert_borrow_record('123456', 1, borrowed, borrowed + timedelta(days=14))
+    insert_borrow_record('123456', 2, borrowed, borrowed + timedelta(days=14))
+
+    update_borrow_record_return_date('123456', 1, datetime.now(), late_fee=3.0)
+    return_books_bulk('123456', [2], datetime.now(), fee_for=lambda due_ts, return_ts: 1.5)
+
+    assert get_patron_counters('123456') == {'active_loans': 0, 'outstanding_fees': 4.5}
+
+def test_no_fee_without_a_loan_to_close(counters_db):
+    """Test that a return that closes no loan charges nothing."""
+    assert update_borrow_record_return_date('123456', 1, datetime.now(), late_fee=3.0) == True
+
+    assert get_patron_counters('123456')['outstanding_fees'] == 0.0
+
+def test_payments_and_refunds_move_outstanding_fees(counters_db):
+    """Test that a fee paid on an open loan isn't owed again on return, and a refund is owed again."""
+    borrowed = datetime.now() - timedelta(days=24)
+    insert_borrow_record('123456', 1, borrowed, borrowed + timedelta(days=14))
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123", "Success")
+    gateway.refund_payment.return_value = (True, "Refunded")
+
+    assert pay_late_fees('123456', 1, gateway)[0] == True
+    assert get_patron_status_report('123456')['total_late_fees'] == 0.0
+    assert pay_late_fees('123456', 1, gateway)[1] == "No late fees to pay for this book."
+
+    update_borrow_record_return_date('123456', 1, datetime.now(), late_fee=6.5)
+    assert get_patron_counters('123456')['outstanding_fees'] == 0.0
+
+    refund_late_fee_payment('txn_123', 2.0, gateway)
+    assert get_patron_counters('123456')['outstanding_fees'] == 2.0
+    assert get_patron_status_report('123456')['total_late_fees'] == 2.0
+    assert reconcile_patron_counters() == []
+
+def test_reconcile_fixes_outstanding_fees(counters_db):
+    """Test that reconciliation recounts outstanding fees from the circulation log."""
+    borrowed = datetime.now() - timedelta(days=20)
+    insert_borrow_record('123456', 1, borrowed, borrowed + timedelta(days=14))
+    update_borrow_record_return_date('123456', 1, datetime.now(), late_fee=3.0)
+    conn = database.get_db_connection()
+    conn.execute("UPDATE patrons SET outstanding_fees = 10 WHERE patron_id = '123456'")
+    conn.commit()
+    conn.close()
+
+    assert reconcile_patron_counters(fix=True) == [
+        {'patron_id': '123456', 'active_loans': 0, 'actual': 0, 'outstanding_fees': 10.0, 'actual_fees': 3.0}
+    ]
+    assert get_patron_counters('123456')['outstanding_fees'] == 3.0
+
+def test_reconcile_detects_and_fixes_drift(counters_db):
+    """Test that reconciliation reports and repairs counters that drifted."""
+    now = datetime.now()
+    insert_borrow_record('123456', 1, now, now + timedelta(days=14))
+    conn = database.get_db_connection()
+    conn.execute("UPDATE patrons SET active_loans = 4 WHERE patron_id = '123456'")
+    conn.execute("INSERT INTO patrons (patron_id, active_loans) VALUES ('654321', 1)")
+    conn.commit()
+    conn.close()
+
+    mismatches = reconcile_patron_counters()
+    assert mismatches == [
+        {'patron_id': '123456', 'active_loans': 4, 'actual': 1, 'outstanding_fees': 0.0, 'actual_fees': 0.0},
+        {'patron_id': '654321', 'active_loans': 1, 'actual': 0, 'outstanding_fees': 0.0, 'actual_fees': 0.0},
+    ]
+    assert get_patron_borrow_count('123456') == 4
+
+    reconcile_patron_counters(fix=True)
+    assert reconcile_patron_counters() == []
+    assert get_patron_borrow_count('123456') == 1
+
+def test_reconcile_command(counters_db):
+    """Test the reconcile-counters CLI command."""
+    runner = create_app().test_cli_runner()
+
+    result = runner.invoke(args=['reconcile-counters'])
+
+    assert result.exit_code == 0
+    assert 'All patron counters match' in result.output
@@ -0,0 +1,51 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from database import to_epoch
+from records import Book, Loan
+
+"""
+### Row records returned by database.py
+- Book and Loan behave like read-only dicts for services, templates and JSON
+- Loan dates are converted lazily from their stored epoch seconds
+"""
+
+def make_book():
+    return Book(1, 'The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3, 2)
+
+def test_book_dict_compatible():
+    """Test item access, get, dict() and equality with dicts."""
+    book = make_book()
+
+    assert book['title'] == 'The Great Gatsby'
+    assert book.get('isbn') == '9780743273565'
+    assert book.get('missing', 'default') == 'default'
+    assert dict(book)['available_copies'] == 2
+    assert book == dict(book)
+    with pytest.raises(KeyError):
+        book['missing']
+
+def test_book_has_no_instance_dict():
+    """Test that records use slots rather than a per-row dict."""
+    assert not hasattr(make_book(), '__dict__')
+
+def test_loan_lazy_dates():
+    """Test that loan dates are converted on first access."""
+    due = datetime(2025, 1, 15, 12, 0)
+    loan = Loan(3, '1984', 'George Orwell', to_epoch(due - timedelta(days=14)), to_epoch(due),
+                now=to_epoch(due + timedelta(days=2)))
+
+    assert loan['is_overdue'] == True
+    assert loan._due_date is None
+    assert loan['due_date'] == due
+    assert {'book_id', 'title', 'author', 'borrow_date', 'due_date', 'is_overdue'} <= set(dict(loan))
+
+def test_records_serialize_with_jsonify():
+    """Test that the app's JSON provider serializes records."""
+    app = create_app()
+
+    with app.app_context():
+        data = json.loads(app.json.dumps({'results': [make_book()]}))
+
+    assert data['results'][0]['isbn'] == '9780743273565'
@@ -1,5 +1,6 @@
 import pytest
 from library_service import (
+    borrow_book_by_patron,
     return_book_by_patron,
 )
 
@@ -14,6 +15,7 @@ The system shall provide a return interface that includes:
 
 def test_return_book_valid_input():
     """Test returning a book with valid input."""
+    borrow_book_by_patron("123456", 1)
     success, message = return_book_by_patron("123456", 1)
     
     assert success == True
@@ -0,0 +1,62 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+import database
+from database import from_epoch, init_database, to_epoch
+
+"""
+### Schema migrations
+- Databases are upgraded in place according to PRAGMA user_version
+- borrow_records dates are stored as integer epoch seconds
+"""
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """A database file in the original layout, with ISO date strings."""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+            author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL);
+        CREATE TABLE borrow_records (id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL, borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT);
+        INSERT INTO books VALUES (1, '1984', 'George Orwell', '9780451524935', 1, 0);
+        INSERT INTO borrow_records VALUES
+            (1, '123456', 1, '2025-01-01T10:00:00', '2025-01-15T10:00:00', NULL),
+            (2, '654321', 1, '2024-12-01T09:30:00.250000', '2024-12-15T09:30:00.250000', '2024-12-10T12:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DATABASE', path)
+    return path
+
+
+def test_epoch_round_trip():
+    """Test the epoch conversion helpers."""
+    moment = datetime(2025, 3, 1, 8, 30, 15)
+
+    assert isinstance(to_epoch(moment), int)
+    assert from_epoch(to_epoch(moment)) == moment
+
+def test_migration_converts_iso_dates(legacy_db):
+    """Test that a legacy database is migrated to integer dates."""
+    init_database()
+
+    conn = sqlite3.connect(legacy_db)
+    rows = conn.execute('SELECT borrow_date, due_date, return_date FROM borrow_records ORDER BY id').fetchall()
+    returned = conn.execute('SELECT return_date FROM borrow_history WHERE loan_id = 2').fetchone()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+
+    assert version == database.SCHEMA_VERSION
+    assert rows[0] == (to_epoch(datetime(2025, 1, 1, 10)), to_epoch(datetime(2025, 1, 15, 10)), None)
+    assert returned[0] == to_epoch(datetime(2024, 12, 10, 12))
+
+def test_migration_is_idempotent(legacy_db):
+    """Test that running init_database again leaves a current database alone."""
+    init_database()
+    init_database()
+
+    loans = database.get_patron_borrowed_books('123456')
+    assert loans[0]['due_date'] == datetime(2025, 1, 15, 10)
@@ -0,0 +1,65 @@
+import json
+import pytest
+from app import create_app
+
+"""
+### R6: Book Search API - pagination and streaming
+- `limit`/`cursor` return one page of results with a `next_cursor`
+- `stream=1` returns results as NDJSON, one book per line
+- Fuzzy search, ranked by match rather than ID, rejects both modes with a 400
+"""
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+def test_search_api_default_mode_unchanged(client):
+    """Test that the default search response keeps its original shape."""
+    response = client.get('/api/search?q=gatsby&type=title')
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert data['count'] == len(data['results'])
+    assert 'next_cursor' not in data
+
+def test_search_api_paginated(client):
+    """Test walking through results one page at a time."""
+    seen = []
+    cursor = 0
+    while cursor is not None:
+        response = client.get(f'/api/search?q=e&type=author&limit=1&cursor={cursor}')
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data['count'] <= 1
+        seen.extend(book['id'] for book in data['results'])
+        cursor = data['next_cursor']
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen))
+
+def test_search_api_invalid_limit(client):
+    """Test that a non-numeric or out of range limit is rejected."""
+    assert client.get('/api/search?q=a&limit=abc').status_code == 400
+    assert client.get('/api/search?q=a&limit=0').status_code == 400
+    assert client.get('/api/search?q=a&limit=1000').status_code == 400
+
+def test_search_api_stream_ndjson(client):
+    """Test that streaming mode returns one JSON book per line."""
+    response = client.get('/api/search?q=9780451524935&type=isbn&stream=1')
+    lines = [line for line in response.get_data(as_text=True).splitlines() if line]
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [(book['id'], book['title'], book['isbn']) for book in map(json.loads, lines)] == \
+        [(3, '1984', '9780451524935')]
+
+def test_search_api_fuzzy_not_paginated(client):
+    """Test that fuzzy search rejects the paginated and streaming modes instead of returning nothing."""
+    assert client.get('/api/search?q=gatsbi&type=fuzzy&limit=5').status_code == 400
+    assert client.get('/api/search?q=gatsbi&type=fuzzy&cursor=0').status_code == 400
+    response = client.get('/api/search?q=gatsbi&type=fuzzy&stream=1')
+
+    assert response.status_code == 400
+    assert 'fuzzy' in response.get_json()['error']
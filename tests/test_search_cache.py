@@ -0,0 +1,144 @@
+import pytest
+from datetime import datetime
+import database
+from app import create_app
+from services.search_cache import SearchCache, search_follower, search_key
+
+"""
+### R6: Book Search - result cache
+- Repeated searches are answered from an LRU cache with a TTL
+- New books invalidate the cache; availability changes are patched in place
+- Changes made by other processes are picked up from the circulation log
+- Hit-rate metrics are exposed at `/api/metrics`
+"""
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def books(*ids):
+    return [{'id': book_id, 'title': f'Book {book_id}', 'available_copies': 1} for book_id in ids]
+
+
+def test_search_key_normalized():
+    """Test that only differences the search itself ignores share a key."""
+    assert search_key("The GATSBY", "Title") == search_key("the gatsby", "title")
+    assert search_key("gatsby", "title", page=(0, 10)) != search_key("gatsby", "title")
+    assert search_key("great  gatsby", "title") != search_key("great gatsby", "title")
+    assert search_key("STRASSE", "author") != search_key("straße", "author")
+    assert search_key("9780743273565", "isbn") != search_key("9780743273565 ", "isbn")
+    assert search_key("Orwel,  George", "fuzzy") == search_key("orwel george", "fuzzy")
+
+def test_cached_search_shares_only_equal_results():
+    """Test that terms the search treats differently aren't answered from each other's entry."""
+    client = create_app().test_client()
+
+    assert client.get('/api/search?q=great gatsby&type=title').get_json()['count'] == 1
+    assert client.get('/api/search?q=great  gatsby&type=title').get_json()['count'] == 0
+    assert client.get('/api/search?q=GREAT GATSBY&type=Title').get_json()['count'] == 1
+
+def test_cache_hit_and_miss():
+    """Test that a second identical lookup does not recompute."""
+    cache = SearchCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return books(1, 2)
+
+    assert cache.get_or_compute(('a',), compute) == books(1, 2)
+    assert cache.get_or_compute(('a',), compute) == books(1, 2)
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['hit_rate'] == 0.5
+
+def test_cache_lru_eviction():
+    """Test that the least recently used entry is evicted."""
+    cache = SearchCache(max_entries=2)
+    cache.get_or_compute(('a',), lambda: books(1))
+    cache.get_or_compute(('b',), lambda: books(2))
+    cache.get_or_compute(('a',), lambda: books(1))
+    cache.get_or_compute(('c',), lambda: books(3))
+
+    assert cache.get_or_compute(('b',), lambda: books(9)) == books(9)
+    assert cache.stats()['evictions'] >= 1
+
+def test_cache_ttl_expiry():
+    """Test that entries expire after the TTL."""
+    clock = FakeClock()
+    cache = SearchCache(ttl=10, clock=clock)
+    cache.get_or_compute(('a',), lambda: books(1))
+
+    clock.now = 11
+    assert cache.get_or_compute(('a',), lambda: books(2)) == books(2)
+    assert cache.stats()['expirations'] == 1
+
+def test_cache_patch_and_invalidate():
+    """Test availability patches and full invalidation."""
+    cache = SearchCache()
+    cache.get_or_compute(('a',), lambda: books(1, 2))
+
+    cache.patch_availability(2, -1)
+    assert cache.get_or_compute(('a',), lambda: [])[1]['available_copies'] == 0
+
+    cache.invalidate()
+    assert cache.get_or_compute(('a',), lambda: []) == []
+
+def test_cache_skips_store_when_catalog_changes_mid_search():
+    """Test that results computed across a catalog change are not cached."""
+    cache = SearchCache()
+
+    def compute():
+        cache.patch_availability(1, -1)
+        return books(1)
+
+    cache.get_or_compute(('a',), compute)
+    assert cache.stats()['size'] == 0
+
+def test_cache_drop_books():
+    """Test that dropping a book removes only the results containing it."""
+    cache = SearchCache()
+    cache.get_or_compute(('a',), lambda: books(1, 2))
+    cache.get_or_compute(('b',), lambda: books(3))
+
+    cache.drop_books({2})
+
+    assert cache.get_or_compute(('a',), lambda: []) == []
+    assert cache.get_or_compute(('b',), lambda: []) == books(3)
+
+def test_cache_follows_changes_made_elsewhere(monkeypatch):
+    """Test that borrows and new books from another process reach cached searches."""
+    client = create_app().test_client()
+    monkeypatch.setattr(search_follower, 'interval', 0)
+    search = lambda: client.get('/api/search?q=gatsby&type=title').get_json()['results']
+    assert search()[0]['available_copies'] == 3
+
+    # Written like another worker would: no change listener in this process hears about it
+    now = database.to_epoch(datetime.now())
+    with database.transaction() as conn:
+        conn.execute('UPDATE books SET available_copies = available_copies - 1 WHERE id = 1')
+        database._log_circulation_event(conn, 'borrow', now, '111111', 1, due_date=now)
+    assert search()[0]['available_copies'] == 2
+
+    with database.transaction() as conn:
+        book_id = conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Gatsby Revisited', 'Author', '5550000000043', 1, 1)
+        ''').lastrowid
+        database._log_circulation_event(conn, 'add_book', now, book_id=book_id)
+    assert sorted(book['id'] for book in search()) == [1, book_id]
+
+def test_metrics_endpoint():
+    """Test that cache metrics are exposed."""
+    client = create_app().test_client()
+    client.get('/api/search?q=gatsby')
+    client.get('/api/search?q=gatsby')
+
+    data = client.get('/api/metrics').get_json()
+
+    assert data['search_cache']['hits'] >= 1
+    assert 0 <= data['search_cache']['hit_rate'] <= 1
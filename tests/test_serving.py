@@ -0,0 +1,52 @@
+import multiprocessing
+import os
+import sqlite3
+import pytest
+import database
+from app import create_app
+from database import disable_group_commit, enable_group_commit, group_commit_stats, insert_book
+from services.search_cache import search_cache
+
+"""
+### Production serving
+- Databases shared by several worker processes use write-ahead logging
+- Per-process state (group commit writers, caches) starts fresh in a forked worker
+"""
+
+def _forked_worker(results):
+    results.put({
+        'writers': group_commit_stats(),
+        'cache_size': search_cache.stats()['size'],
+        # Group commit still works: the worker starts its own writer thread
+        'insert': insert_book('Worker Book', 'Author', '7777777777777', 1, 1)
+    })
+
+
+def test_wal_mode(tmp_path):
+    """Test that SQLITE_WAL switches the database file to write-ahead logging."""
+    path = str(tmp_path / 'wal.db')
+    create_app({'DATABASE': path, 'SQLITE_WAL': True})
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_starts_fresh(tmp_path):
+    """Test that a forked worker doesn't inherit writer threads or cached searches."""
+    client = create_app({'DATABASE': str(tmp_path / 'forked.db'), 'SEED_SAMPLE_DATA': True}).test_client()
+    enable_group_commit()
+    insert_book('Parent Book', 'Author', '8888888888888', 1, 1)
+    client.get('/search?q=gatsby&type=title')
+    assert group_commit_stats() and search_cache.stats()['size'] > 0
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    worker = context.Process(target=_forked_worker, args=(results,))
+    worker.start()
+    result = results.get(timeout=10)
+    worker.join()
+    disable_group_commit()
+
+    assert result == {'writers': {}, 'cache_size': 0, 'insert': True}
+    assert database.get_book_by_isbn('7777777777777') is not None
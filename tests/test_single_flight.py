@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+from services.single_flight import SingleFlight
+
+"""
+### Request coalescing for identical concurrent reads
+- Concurrent calls with the same key share one computation
+- Errors are shared with every waiting caller
+- Coalesced calls are counted
+- A caller only joins a read that started after its last write, and gets its own copy
+"""
+
+def run_concurrently(flight, key, fn, count):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    """Test that identical concurrent calls run the function once."""
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_read():
+        calls.append(1)
+        release.wait(5)
+        return ['book']
+
+    threads, results, errors = run_concurrently(flight, 'catalog', slow_read, 8)
+    while flight.stats()['calls'] < 8:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [['book']] * 8
+    assert flight.stats()['coalesced'] == 7
+
+def test_errors_are_shared():
+    """Test that waiting callers receive the leader's exception."""
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing_read():
+        release.wait(5)
+        raise ValueError("database locked")
+
+    threads, results, errors = run_concurrently(flight, 'catalog', failing_read, 4)
+    while flight.stats()['calls'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 4
+    assert all("database locked" in str(e) for e in errors)
+
+def test_sequential_calls_are_not_cached():
+    """Test that a finished computation is not reused by later calls."""
+    flight = SingleFlight()
+
+    assert flight.do('k', lambda: 1) == 1
+    assert flight.do('k', lambda: 2) == 2
+    assert flight.stats()['coalesced'] == 0
+
+def test_waiting_callers_get_copies():
+    """Test that coalesced callers don't share mutable results."""
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def slow_read():
+        release.wait(5)
+        return {'books': [{'id': 1}]}
+
+    threads, results, errors = run_concurrently(flight, 'catalog', slow_read, 3)
+    while flight.stats()['calls'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    results[0]['books'][0]['id'] = 2
+
+    assert results[1:] == [{'books': [{'id': 1}]}] * 2
+    assert results[1]['books'] is not results[2]['books']
+
+def test_caller_does_not_join_read_older_than_its_write():
+    """Test that a read started before a caller's write is not shared with that caller."""
+    seq = [1]
+    flight = SingleFlight(version=lambda: seq[0])
+    started, release = threading.Event(), threading.Event()
+
+    def stale_read():
+        started.set()
+        release.wait(5)
+        return 'before write'
+
+    threads, results, errors = run_concurrently(flight, 'status', stale_read, 1)
+    started.wait(5)
+    seq[0] = 2
+    fresh = flight.do('status', lambda: 'after write')
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert fresh == 'after write'
+    assert results == ['before write']
+    assert flight.stats()['coalesced'] == 0
+    assert flight.do('status', lambda: 'next') == 'next'
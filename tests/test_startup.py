@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import pytest
+import database
+from app import create_app
+from database import get_all_books, init_database
+
+"""
+### Cold start
+- A database already at the current schema version is opened without running DDL
+- Sample data is only added when asked for
+- Startup reports how long each step took
+"""
+
+def test_current_schema_skips_ddl(monkeypatch):
+    """Test that init_database leaves a database with a current schema alone."""
+    def fail():
+        raise AssertionError('DDL ran on a current database')
+    monkeypatch.setattr(database, 'migrate_database', fail)
+
+    init_database()
+
+def test_new_database_gets_schema(tmp_path):
+    """Test that a new database file is still created and migrated."""
+    create_app({'DATABASE': str(tmp_path / 'new.db')})
+
+    assert database._schema_is_current(database.DATABASE)
+
+def test_no_sample_data_unless_asked(tmp_path):
+    """Test that create_app only seeds the catalog when SEED_SAMPLE_DATA is set."""
+    create_app({'DATABASE': str(tmp_path / 'empty.db')})
+    assert get_all_books() == []
+
+    create_app({'DATABASE': str(tmp_path / 'seeded.db'), 'SEED_SAMPLE_DATA': True})
+    assert len(get_all_books()) == 3
+
+def test_startup_timings_reported():
+    """Test the startup breakdown in the app and the startup-report command."""
+    app = create_app()
+    timings = app.extensions['startup_timings']
+
+    assert {'imports', 'database_init', 'indexes', 'blueprints', 'create_app'} <= set(timings)
+    result = app.test_cli_runner().invoke(args=['startup-report'])
+    assert 'database_init' in result.output
+    assert app.test_client().get('/api/metrics').get_json()['startup'] == timings
+
+def test_app_import_does_not_load_requests():
+    """Test that importing the app doesn't pull in the HTTP client library."""
+    check = "import sys, app; print('requests' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == 'False'
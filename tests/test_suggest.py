@@ -0,0 +1,89 @@
+import pytest
+from datetime import datetime
+import database
+from app import create_app
+from services.fuzzy_index import fuzzy_follower, fuzzy_search_books
+from services.library_service import add_book_to_catalog
+from services.suggest_index import SuggestIndex, normalize, suggest, suggest_follower
+
+"""
+### R6: Book Search - prefix autocomplete
+- GET `/api/suggest?q=` returns top title/author suggestions for a prefix
+- Matching is case/accent-insensitive and works from any word of a title
+- New books are suggested as soon as they are added
+- Books added by other worker processes are picked up from the circulation log
+"""
+
+BOOKS = [
+    {'title': 'The Great Gatsby', 'author': 'F. Scott Fitzgerald'},
+    {'title': 'Great Expectations', 'author': 'Charles Dickens'},
+    {'title': 'Les Misérables', 'author': 'Victor Hugo'},
+]
+
+def test_normalize():
+    """Test that normalization folds case, accents and punctuation."""
+    assert normalize("  Les MISÉRABLES! ") == "les miserables"
+    assert normalize("F. Scott") == "f scott"
+
+def test_suggest_prefix_from_any_word():
+    """Test that a prefix matches the start of any word."""
+    index = SuggestIndex()
+    index.build(BOOKS)
+
+    texts = [s['text'] for s in index.suggest("gre")]
+
+    assert texts == ['Great Expectations', 'The Great Gatsby']
+    assert index.suggest("fitz") == [{'text': 'F. Scott Fitzgerald', 'type': 'author'}]
+    assert index.suggest("miser")[0]['text'] == 'Les Misérables'
+
+def test_suggest_limit_and_empty_prefix():
+    """Test the result limit and that an empty prefix suggests nothing."""
+    index = SuggestIndex()
+    index.build(BOOKS)
+
+    assert len(index.suggest("g", limit=1)) == 1
+    assert index.suggest("   ") == []
+
+def test_suggest_memory_bound():
+    """Test that the index stops growing at its entry cap."""
+    index = SuggestIndex(max_entries=4)
+    index.build(BOOKS)
+
+    assert len(index) <= 4
+    assert index.truncated == True
+
+def test_suggest_updates_on_insert_book():
+    """Test that a newly added book is suggested without a rebuild."""
+    create_app()
+    add_book_to_catalog("Zyzzyva Field Guide", "Quentin Quokka", "5550000000029", 1)
+
+    assert {'text': 'Zyzzyva Field Guide', 'type': 'title'} in suggest("zyzz")
+
+def test_indexes_follow_books_added_elsewhere(monkeypatch):
+    """Test that books added by another process reach the suggest and fuzzy indexes."""
+    create_app()
+    fuzzy_search_books("gatsby")
+    monkeypatch.setattr(suggest_follower, 'interval', 0)
+    monkeypatch.setattr(fuzzy_follower, 'interval', 0)
+
+    # Written like another worker would: no change listener in this process hears about it
+    with database.transaction() as conn:
+        book_id = conn.execute('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES ('Quixotic Quagmires', 'Xavier Xylo', '5550000000036', 1, 1)
+        ''').lastrowid
+        database._log_circulation_event(conn, 'add_book', database.to_epoch(datetime.now()), book_id=book_id)
+
+    assert {'text': 'Quixotic Quagmires', 'type': 'title'} in suggest("quix")
+    assert [book['id'] for book in fuzzy_search_books("Xavier Xilo")] == [book_id]
+    assert suggest_follower.refresh() == 0
+
+def test_suggest_api():
+    """Test the autocomplete endpoint."""
+    client = create_app().test_client()
+
+    response = client.get('/api/suggest?q=gats')
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert {'text': 'The Great Gatsby', 'type': 'title'} in data['suggestions']
@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import pytest
+import database
+import services.fuzzy_index as fuzzy_index
+from app import create_app
+from database import configure_database, get_db_connection, init_database
+from services.task_executor import TaskExecutor, register_task, task_executor
+
+"""
+### Background task executor
+- Registered tasks run on worker threads fed by a bounded queue (inline with workers=0)
+- Failed tasks are saved to task_retries and retried with backoff until they are dead
+- A full queue spills tasks to task_retries instead of blocking the caller
+- Shutdown finishes queued tasks, or saves them when it runs out of time
+- A preloading parent starts no threads; each forked worker starts its own and runs what was queued
+- An idle retry poller only reads
+"""
+
+calls = []
+gate = threading.Event()
+
+@register_task('test_record')
+def _record(value):
+    calls.append(value)
+
+@register_task('test_fail')
+def _fail(value):
+    raise RuntimeError(f'failed {value}')
+
+@register_task('test_wait')
+def _wait(value):
+    gate.wait(5)
+    calls.append(value)
+
+@register_task('test_pid')
+def _pid(value):
+    calls.append((value, os.getpid()))
+
+@pytest.fixture(autouse=True)
+def reset_tasks():
+    calls.clear()
+    gate.clear()
+    yield
+    gate.set()
+
+@pytest.fixture
+def file_database(tmp_path):
+    """Worker threads write retries, so use a database file rather than shared-cache memory."""
+    configure_database(str(tmp_path / 'tasks.db'))
+    init_database()
+
+def _retry_rows():
+    conn = get_db_connection()
+    rows = [dict(row) for row in conn.execute('SELECT * FROM task_retries ORDER BY id')]
+    conn.close()
+    return rows
+
+def _make_due():
+    conn = get_db_connection()
+    conn.execute('UPDATE task_retries SET run_after = 0')
+    conn.commit()
+    conn.close()
+
+
+def test_inline_task_runs():
+    """Test that with workers=0 a task runs during submit."""
+    executor = TaskExecutor(workers=0)
+
+    assert executor.submit('test_record', value=1) == True
+    assert calls == [1]
+    assert executor.stats()['completed'] == 1
+
+def test_unknown_task_rejected():
+    """Test that submitting an unregistered task name raises."""
+    with pytest.raises(ValueError):
+        TaskExecutor(workers=0).submit('no_such_task')
+
+def test_failed_task_saved_for_retry():
+    """Test that a failure is recorded with its error and a later run time, then retried."""
+    executor = TaskExecutor(workers=0, retry_delay=60)
+    executor.submit('test_fail', value=1)
+
+    row, = _retry_rows()
+    assert row['task'] == 'test_fail' and row['attempts'] == 1 and row['status'] == 'pending'
+    assert 'RuntimeError: failed 1' in row['last_error']
+    assert executor.run_due_retries() == 0
+
+    _make_due()
+    assert executor.run_due_retries() == 1
+    assert _retry_rows()[0]['attempts'] == 2
+
+def test_task_dead_after_max_attempts():
+    """Test that a task that keeps failing is kept as dead and no longer retried."""
+    executor = TaskExecutor(workers=0, max_attempts=2)
+    executor.submit('test_fail', value=1)
+    _make_due()
+    executor.run_due_retries()
+    _make_due()
+
+    assert executor.run_due_retries() == 0
+    assert _retry_rows()[0]['status'] == 'dead'
+    assert executor.stats()['dead'] == 1 and executor.stats()['retry_table'] == {'dead': 1}
+
+def test_retry_succeeds_and_is_removed():
+    """Test that a retried task that now succeeds is deleted from task_retries."""
+    executor = TaskExecutor(workers=0)
+    conn = get_db_connection()
+    conn.execute("INSERT INTO task_retries (task, payload, attempts, run_after) VALUES ('test_record', '{\"value\": 7}', 1, 0)")
+    conn.commit()
+    conn.close()
+
+    assert executor.run_due_retries() == 1
+    assert calls == [7]
+    assert _retry_rows() == []
+
+def test_worker_threads_run_tasks(file_database):
+    """Test tasks run on worker threads and report wait and run latency."""
+    executor = TaskExecutor(workers=2)
+    for value in range(20):
+        executor.submit('test_record', value=value)
+    executor.shutdown()
+
+    stats = executor.stats()
+    assert sorted(calls) == list(range(20))
+    assert stats['completed'] == 20 and stats['queue_depth'] == 0
+    assert stats['run_ms']['p95'] >= 0 and stats['wait_ms']['avg'] >= 0
+
+def test_full_queue_spills_to_table(file_database):
+    """Test that a submit that finds the queue full saves the task instead of waiting."""
+    executor = TaskExecutor(workers=1, max_queue=1, submit_timeout=0.01)
+    results = [executor.submit('test_wait', value=value) for value in range(4)]
+
+    assert False in results
+    assert executor.stats()['spilled'] >= 1
+    assert any(row['task'] == 'test_wait' for row in _retry_rows())
+    gate.set()
+    executor.shutdown()
+
+def test_shutdown_saves_unfinished_tasks(file_database):
+    """Test that tasks still queued when shutdown times out are saved for later."""
+    executor = TaskExecutor(workers=1, max_queue=10)
+    for value in range(3):
+        executor.submit('test_wait', value=value)
+    executor.shutdown(timeout=0.2)
+    gate.set()
+
+    saved = [row for row in _retry_rows() if row['task'] == 'test_wait']
+    assert len(saved) >= 2 and all(row['status'] == 'pending' for row in saved)
+
+def test_app_warms_fuzzy_index_and_reports_tasks():
+    """Test that create_app builds the fuzzy index as a task and /api/metrics shows the executor."""
+    app = create_app()
+
+    assert fuzzy_index._built == True
+    metrics = app.test_client().get('/api/metrics').get_json()
+    assert metrics['tasks']['workers'] == 0 and metrics['tasks']['completed'] >= 1
+
+def _task_threads():
+    return {thread for thread in threading.enumerate() if thread.name.startswith('task-')}
+
+def _forked_worker(results):
+    task_executor.shutdown()
+    results.put({'calls': calls, 'pid': os.getpid()})
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_threads_start_only_in_forked_workers(file_database):
+    """Test that a parent set to start after fork runs nothing, and its forked worker runs the queued task."""
+    # Threads left over from other tests' executors aren't this one's
+    earlier = _task_threads()
+    task_executor.configure(workers=1)
+    task_executor.start_after_fork()
+    try:
+        task_executor.submit('test_pid', value=1)
+        assert calls == [] and _task_threads() == earlier
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        worker = context.Process(target=_forked_worker, args=(results,))
+        worker.start()
+        result = results.get(timeout=10)
+        worker.join()
+    finally:
+        task_executor.configure(workers=0)
+
+    assert result['calls'] == [(1, result['pid'])]
+    assert calls == [] and _task_threads() <= earlier
+
+def test_idle_poll_only_reads(file_database):
+    """Test that a poll with nothing due doesn't wait for the write lock."""
+    executor = TaskExecutor(workers=0)
+    writer = sqlite3.connect(database.DATABASE)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        assert executor.run_due_retries() == 0
+    finally:
+        writer.rollback()
+        writer.close()
@@ -0,0 +1,18 @@
+"""
+Production WSGI entry point for the Library Management System.
+
+Serve it with gunicorn and the settings in gunicorn.conf.py:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app the master process imports this module once, so migrations
+run and the in-memory indexes are built before workers are forked. Each
+worker then starts its own group commit writers, background task threads
+(none run in the master; see gunicorn.conf.py), search cache and
+single-flight table (see the os.register_at_fork hooks). SQLite connections
+are opened per operation, so none is shared across the fork.
+"""
+
+from app import create_app
+
+# Several worker processes share the database files, so use write-ahead logging
+app = create_app({'SQLITE_WAL': True})